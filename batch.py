@@ -0,0 +1,166 @@
+"""
+Generates bmidi keyframes without the user interface, for render farms and other batch jobs
+
+Usage:
+
+```sh
+blender -b song.blend --python batch.py -- [options]
+blender -b --python batch.py -- --files first.blend second.blend [options]
+```
+
+Options (after `--`):
+
+- `--files`: the .blend files to process (defaults to the file Blender was started with)
+- `--config`: a JSON file with a `"midi_file"` (relative to the config file) and a list of `"items"` to generate instead of each scene's items
+- `--midi`: the MIDI file to use instead of the scene's (or the config's) MIDI file
+- `--no-save`: don't save the .blend files after generating
+- `--workers`: processes used to compute keyframes in parallel (defaults to every CPU)
+- `--force`: regenerate every item, even those unchanged since they were last generated
+- `--window`: only replace the keyframes between these start and end frames, keeping the rest
+- `--cache-dir`: where to cache key plans (defaults to a `bmidi_cache` folder next to each .blend file)
+- `--cache-size`: how many megabytes the key plan cache may use before old plans are evicted (defaults to 256, like the panel)
+- `--no-cache`: don't read or write the key plan cache
+- `--report`: write the timings of every file and item to this JSON file
+- `--profile`: write a profile of the run to this file, as JSON for a `.json` file or as cProfile statistics (pstats) otherwise
+
+Items in a config use the same setting names as the panel, for example:
+
+```json
+{
+    "midi_file": "track.mid",
+    "items": [
+        {"type": "hammer_composition", "object_prefix": "Key", "object_property": "rotation_euler.x", "pullback_amount": 5, "channel": 1}
+    ]
+}
+```
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import bpy
+import main
+from src.bpy_instancing import instance_items
+from src.generate import generate_items, item_from_dict
+from src.plan_cache import DEFAULT_CACHE_MB, PlanCache
+from src.profiling import profiler_for
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    argv = argv[argv.index("--") + 1:] if "--" in argv else []
+
+    parser = argparse.ArgumentParser(prog="batch.py", description="Generate bmidi keyframes without the user interface")
+    parser.add_argument("--files", nargs="+", default=[], help="the .blend files to process")
+    parser.add_argument("--config", help="a JSON file with the MIDI file and items to generate")
+    parser.add_argument("--midi", help="the MIDI file to use instead of the scene's MIDI file")
+    parser.add_argument("--no-save", action="store_true", help="don't save the .blend files after generating")
+    parser.add_argument("--workers", type=int, default=0, help="processes used to compute keyframes (0 uses every CPU)")
+    parser.add_argument("--force", action="store_true", help="regenerate items even if they are unchanged")
+    parser.add_argument("--window", nargs=2, type=int, metavar=("START", "END"), help="only replace the keyframes between these frames")
+    parser.add_argument("--cache-dir", help="where to cache key plans (defaults to next to each .blend file)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_MB, help="megabytes the key plan cache may use")
+    parser.add_argument("--no-cache", action="store_true", help="don't read or write the key plan cache")
+    parser.add_argument("--report", help="write timings to this JSON file")
+    parser.add_argument("--profile", help="write a profile to this file (JSON for .json, pstats otherwise)")
+
+    return parser.parse_args(argv)
+
+def load_config(path: str):
+    with open(path) as f:
+        config = json.load(f)
+
+    midi_file = config.get("midi_file")
+
+    if midi_file:
+        midi_file = os.path.join(os.path.dirname(os.path.abspath(path)), midi_file)
+
+    return midi_file, [item_from_dict(data) for data in config.get("items", [])]
+
+def run(args: argparse.Namespace) -> bool:
+    if not hasattr(bpy.types.Scene, "bmidi_items"):
+        main.register()
+
+    config_midi = load_config(args.config)[0] if args.config else None
+    files = args.files or [bpy.data.filepath]
+    profiler = profiler_for(args.profile)
+    report = []
+    ok = True
+
+    for path in files:
+        if not path:
+            print("bmidi: no .blend file to process (pass one to blender or use --files)")
+            return False
+
+        if os.path.abspath(path) != os.path.abspath(bpy.data.filepath or ""):
+            bpy.ops.wm.open_mainfile(filepath=path)
+
+        scene = bpy.context.scene
+        # config items are loaded again for every file, as generating stores each item's fingerprint on it
+        items = load_config(args.config)[1] if args.config else list(scene.bmidi_items)
+        midi_file = args.midi or config_midi or bpy.path.abspath(scene.bmidi_midi_file)
+
+        if not midi_file:
+            print(f"bmidi: {path}: no MIDI file selected")
+            report.append({"file": path, "error": "No MIDI file selected"})
+            ok = False
+            continue
+
+        cache = None
+        if not args.no_cache:
+            cache = PlanCache(args.cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), "bmidi_cache"), args.cache_size * 1024 * 1024)
+
+        started = time.perf_counter()
+
+        try:
+            scene.frame_set(-1)
+
+            with profiler.run():
+                instanced = instance_items(items, midi_file, scene, args.force)
+                timings = generate_items(
+                    items,
+                    midi_file,
+                    scene.render.fps,
+                    workers=args.workers,
+                    force=args.force,
+                    window=tuple(args.window) if args.window else None,
+                    profiler=profiler,
+                    cache=cache,
+                )
+        except Exception as e:
+            print(f"bmidi: {path}: {e}")
+            report.append({"file": path, "error": str(e)})
+            ok = False
+            continue
+
+        elapsed = time.perf_counter() - started
+
+        if not args.no_save:
+            bpy.ops.wm.save_mainfile()
+
+        print(f"bmidi: {path}: generated {len(timings)} items ({instanced} instanced) in {elapsed:.2f}s")
+        for timing in timings:
+            if timing["skipped"]:
+                print(f"bmidi:     {timing['object_prefix']} ({timing['type']}): unchanged")
+            else:
+                print(f"bmidi:     {timing['object_prefix']} ({timing['type']}): {timing['keys']} keys, {timing['seconds']:.2f}s{' (cached)' if timing['cached'] else ''}")
+
+        report.append({"file": path, "midi_file": midi_file, "seconds": elapsed, "items": timings})
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=4)
+
+    if args.profile:
+        profiler.dump(args.profile)
+
+    return ok
+
+if __name__ == "__main__":
+    if not run(parse_args(sys.argv)):
+        sys.exit(1)
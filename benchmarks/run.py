@@ -0,0 +1,261 @@
+"""
+Benchmarks the MIDI parse, event pairing, key planning and key application phases of keyframe generation
+
+Runs against the bundled example tracks and a synthetic stress track, applying keys to an in-memory scene
+so no Blender install is needed. Results can be written as JSON and compared against an earlier run.
+
+Usage:
+
+```sh
+python benchmarks/run.py --output after.json --compare before.json
+python benchmarks/run.py --notes 100000 --repeat 1 # a quicker stress track
+```
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.midi import MidiData, read_note_messages
+from src.plan import build_plan, np
+from src.scene import MemoryScene
+from src.smf import PARALLEL_DECODE_BYTES, read_messages
+
+EXAMPLES = {
+    "piano": os.path.join(ROOT, "examples", "piano", "track.mid"),
+    "drum_set": os.path.join(ROOT, "examples", "drum_set", "track.mid"),
+}
+FPS = 24
+
+
+def _varlen(value: int) -> bytes:
+    out = [value & 0x7F]
+    value >>= 7
+
+    while value:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+
+    return bytes(reversed(out))
+
+def _track(events: list[tuple[int, bytes]]) -> bytes:
+    data = bytearray()
+    last_tick = 0
+
+    for tick, message in sorted(events, key=lambda e: e[0]):
+        data += _varlen(tick - last_tick) + message
+        last_tick = tick
+
+    data += b"\x00\xff\x2f\x00" # end of track
+
+    return b"MTrk" + len(data).to_bytes(4, "big") + bytes(data)
+
+def write_synthetic_midi(path: str, notes: int, channels: int = 16, seed: int = 0, ticks_per_beat: int = 480) -> None:
+    """
+    Writes a type 1 MIDI file with `notes` random notes spread evenly over `channels` tracks (one channel per track),
+    plus a tempo track that changes tempo every few bars
+
+    A note is never started again on its channel while it's still sounding, as pairing would drop the overlapping note
+    """
+    rng = random.Random(seed)
+    per_channel = -(-notes // channels)
+    tracks = []
+    length = 0
+
+    for channel in range(channels):
+        events = []
+        released = {} # the tick each note stops sounding at
+        tick = 0
+
+        for _ in range(min(per_channel, notes - channel * per_channel)):
+            tick += rng.randrange(0, ticks_per_beat // 2)
+            note = rng.randrange(21, 109)
+
+            while released.get(note, 0) > tick:
+                note = rng.randrange(21, 109)
+
+            duration = rng.randrange(ticks_per_beat // 8, ticks_per_beat * 2)
+
+            events.append((tick, bytes((0x90 | channel, note, rng.randrange(1, 128)))))
+            events.append((tick + duration, bytes((0x90 | channel, note, 0))))
+            released[note] = tick + duration
+
+        length = max(length, tick + ticks_per_beat * 2)
+        tracks.append(_track(events))
+
+    tempo_events = []
+    for tick in range(0, length, ticks_per_beat * 16):
+        tempo = 60_000_000 // rng.randrange(70, 180)
+        tempo_events.append((tick, b"\xff\x51\x03" + tempo.to_bytes(3, "big")))
+
+    tracks.insert(0, _track(tempo_events))
+
+    with open(path, "wb") as f:
+        f.write(b"MThd" + (6).to_bytes(4, "big"))
+        f.write((1).to_bytes(2, "big") + len(tracks).to_bytes(2, "big") + ticks_per_beat.to_bytes(2, "big"))
+        for track in tracks:
+            f.write(track)
+
+def measure(fn, repeat: int):
+    times = []
+
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+
+    return result, {"best": min(times), "mean": sum(times) / len(times)}
+
+def plan_args(planner: str, targets: dict[int, tuple[float, float, float]]) -> dict:
+    return {
+        "hammer": {"prop": "rotation_euler.x", "base": 0.0, "pullback": 0.6, "overshoot": 0.05},
+        "movement": {"prop": "location.z", "base": 0.0, "final": -0.1},
+        "light": {"target": "data", "data_path": "energy", "initial": 10.0, "final": 1000.0, "fade_effect": False},
+        "effect": {"effect": "bounce", "prop": "location.z", "base": 0.0, "amount": 0.1},
+        "positional": {"prop": "location.x", "min_position": -1.0, "max_position": 1.0},
+        "robotic": {"base": (0.0, 0.0, 0.0), "targets": targets, "pullback": 0.2, "axis": "z"},
+    }[planner]
+
+def bench_midi(path: str, repeat: int) -> dict:
+    phases = {}
+
+    messages, phases["parse"] = measure(lambda: list(read_note_messages(path)), repeat)
+    data, phases["pair"] = measure(lambda: MidiData(messages), repeat)
+
+    buckets = [table for (channel, _), table in data.buckets.items() if channel is not None]
+    targets = {note: (float(note), 0.0, 0.0) for note in set(data.events.note)}
+    jobs = [
+        (planner, table)
+        for planner in ("hammer", "movement", "light", "effect")
+        for table in buckets
+    ] + [
+        ("positional", data.events),
+        ("robotic", data.events),
+    ]
+
+    plans = []
+    keys = 0
+
+    for planner in ("hammer", "movement", "light", "effect", "positional", "robotic"):
+        tables = [table for name, table in jobs if name == planner]
+        args = plan_args(planner, targets)
+        result, phases[f"plan.{planner}"] = measure(lambda: [build_plan(planner, table, FPS, args) for table in tables], repeat)
+
+        plans.extend(result)
+        keys += sum(plan.key_count() for plan in result)
+
+    def apply():
+        scene = MemoryScene(FPS)
+
+        for i, plan in enumerate(plans):
+            obj = scene.add_object(f"Object{i}")
+            scene.apply_plan(plan, {"object": obj, "data": obj.data})
+
+        return scene
+
+    _, phases["apply"] = measure(apply, repeat)
+
+    return {
+        "path": os.path.relpath(path, ROOT) if path.startswith(ROOT) else os.path.basename(path),
+        "messages": len(messages),
+        "notes": len(data.events),
+        "keys": keys,
+        "phases": phases,
+    }
+
+def bench_decode(tmp: str, sizes: list[int], channels: int, workers: int, repeat: int) -> list[dict]:
+    """
+    Times decoding synthetic tracks of `sizes` notes in this process and over `workers` worker processes, to find the file
+    size where starting the processes pays off (see `src.smf.PARALLEL_DECODE_BYTES`)
+    """
+    results = []
+
+    for notes in sizes:
+        path = os.path.join(tmp, f"decode{notes}.mid")
+        write_synthetic_midi(path, notes, channels)
+
+        _, serial = measure(lambda: list(read_messages(path)), repeat)
+        _, parallel = measure(lambda: list(read_messages(path, workers=workers, parallel_bytes=0)), repeat)
+
+        results.append({"notes": notes, "bytes": os.path.getsize(path), "serial": serial, "parallel": parallel})
+
+    return results
+
+def compare(results: dict, baseline: dict) -> None:
+    print()
+    print("compared to baseline (best times, lower is better):")
+
+    for name, source in results["sources"].items():
+        old = baseline.get("sources", {}).get(name)
+
+        if old is None:
+            continue
+
+        for phase, timing in source["phases"].items():
+            old_timing = old["phases"].get(phase)
+
+            if old_timing is None or not old_timing["best"]:
+                continue
+
+            ratio = timing["best"] / old_timing["best"]
+            print(f"  {name:<10} {phase:<16} {old_timing['best']:>10.4f}s -> {timing['best']:>10.4f}s ({ratio:.2f}x)")
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark bmidi keyframe generation phases")
+    parser.add_argument("--notes", type=int, default=1_000_000, help="notes in the synthetic stress track (0 skips it)")
+    parser.add_argument("--channels", type=int, default=16, help="channels in the synthetic stress track")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per phase, the best and mean times are reported")
+    parser.add_argument("--decode-notes", type=int, nargs="*", default=[25_000, 50_000, 100_000, 200_000, 400_000], help="notes in the tracks decoded with and without worker processes (none skips it)")
+    parser.add_argument("--decode-workers", type=int, default=0, help="worker processes for the parallel decode (0 uses every CPU)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="a JSON file from an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    sources = dict(EXAMPLES)
+    results = {
+        "python": platform.python_version(),
+        "numpy": np is not None,
+        "fps": FPS,
+        "cpus": os.cpu_count(),
+        "sources": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.notes > 0:
+            stress = os.path.join(tmp, "stress.mid")
+            write_synthetic_midi(stress, args.notes, args.channels)
+            sources["stress"] = stress
+
+        for name, path in sources.items():
+            result = results["sources"][name] = bench_midi(path, args.repeat)
+
+            print(f"{name}: {result['notes']} notes, {result['keys']} keys")
+            for phase, timing in result["phases"].items():
+                print(f"  {phase:<16} best {timing['best']:.4f}s  mean {timing['mean']:.4f}s")
+
+        if args.decode_notes:
+            results["decode"] = bench_decode(tmp, args.decode_notes, args.channels, args.decode_workers, args.repeat)
+
+            print(f"decode (parallel above {PARALLEL_DECODE_BYTES / 1024 / 1024:.1f} MB, {os.cpu_count()} CPUs):")
+            for result in results["decode"]:
+                serial, parallel = result["serial"]["best"], result["parallel"]["best"]
+                print(f"  {result['bytes'] / 1024 / 1024:>6.2f} MB  serial {serial:.4f}s  parallel {parallel:.4f}s ({parallel / serial:.2f}x)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -7,13 +7,49 @@ def initialize():
     if str(ROOT) not in sys.path:
         sys.path.insert(0, str(ROOT))
 
+    import src.profiling
+    import src.events
+    import src.tempo
+    import src.processes
+    import src.smf
+    import src.midi
+    import src.plan
+    import src.plan_cache
+    import src.instancing
+    import src.scene
+    import src.live
+    import src.rename
+    import src.keyframes
+    import src.bpy_scene
+    import src.performer
     import src.instrument
     import src.composition
     import src.controller
-
+    import src.pipeline
+    import src.generate
+    import src.bpy_instancing
+
+    importlib.reload(src.profiling)
+    importlib.reload(src.events)
+    importlib.reload(src.tempo)
+    importlib.reload(src.processes)
+    importlib.reload(src.smf)
+    importlib.reload(src.midi)
+    importlib.reload(src.plan)
+    importlib.reload(src.plan_cache)
+    importlib.reload(src.instancing)
+    importlib.reload(src.scene)
+    importlib.reload(src.live)
+    importlib.reload(src.rename)
+    importlib.reload(src.keyframes)
+    importlib.reload(src.bpy_scene)
+    importlib.reload(src.performer)
     importlib.reload(src.instrument)
     importlib.reload(src.composition)
     importlib.reload(src.controller)
+    importlib.reload(src.pipeline)
+    importlib.reload(src.generate)
+    importlib.reload(src.bpy_instancing)
 
 initialize()
 
@@ -28,12 +64,18 @@ bl_info = {
 }
 
 import bpy
-import math
-from src.instrument import get_channel_items, get_midi_channel_ranges
-from src.composition import EffectComposition, HammerComposition, LightComposition, MovementComposition
-from src.controller import PositionalController, RoboticController
+import os
+import time
+from src.bpy_instancing import instance_items
+from src.instrument import clear_channel_cache, get_channel_items, get_midi_channel_ranges
+from src.generate import Generation, process_note_list
+from src.instancing import can_instance
+from src.live import LivePlayer
+from src.midi import prefetch_midi
+from src.plan_cache import DEFAULT_CACHE_MB, PlanCache
+from src.profiling import profiler_for
+from src.rename import apply_renames, plan_renames, rename_conflicts
 
-ROTATION_PROPERTIES = ("rotation_euler.x", "rotation_euler.y", "rotation_euler.z")
 LOCATION_PROPERTIES = ("location.x", "location.y", "location.z")
 SCALE_PROPERTIES = ("scale.x", "scale.y", "scale.z")
 OBJECT_PROPERTIES = [
@@ -53,18 +95,47 @@ LIGHT_PROPERTIES = [
     ("data.spot_size", "Spotlight Angle", "Applies only to spot light objects"),
 ]
 
-def process_note_list(expr: str) -> list[int]:
-    notes = []
+GENERATE_TIME_SLICE = 0.05 # seconds of work per timer event when generating in the background
+RENAME_PREVIEW_ROWS = 10 # renames listed in the rename preview
 
-    for i in expr.strip().split(","):
-        if "-" in i:
-            start, end = i.split("-")
-            notes.extend(range(int(start), int(end) + 1))
-        else:
-            notes.append(int(i))
+last_profile = None # the profiler of the last generation, shown in the panel
+live_player = None # plays the items back while live preview is on
+rename_preview = None # (renames as (old name, new name), conflicting names) of the last rename preview
+
+def plan_cache(scene) -> PlanCache | None:
+    # plans are cached next to the .blend, so unsaved files don't get a cache
+    if not scene.bmidi_plan_cache or not bpy.data.filepath:
+        return None
+
+    return PlanCache(
+        os.path.join(os.path.dirname(bpy.data.filepath), "bmidi_cache"),
+        scene.bmidi_plan_cache_size * 1024 * 1024,
+    )
+
+def live_frame_handler(scene, depsgraph=None):
+    if live_player is not None:
+        live_player.evaluate(scene.frame_current + scene.frame_subframe)
+
+@bpy.app.handlers.persistent
+def live_load_handler(*args):
+    # the objects of the player belong to the file being closed
+    stop_live(restore=False)
+
+@bpy.app.handlers.persistent
+def live_save_handler(*args):
+    # save the objects with their own animation, not muted and posed by the player
+    stop_live()
 
-    return notes
+def stop_live(restore: bool = True) -> None:
+    global live_player
 
+    if live_player is not None and restore:
+        live_player.restore()
+
+    live_player = None
+
+    if live_frame_handler in bpy.app.handlers.frame_change_pre:
+        bpy.app.handlers.frame_change_pre.remove(live_frame_handler)
 
 class BMIDI_Item(bpy.types.PropertyGroup):
     enabled: bpy.props.BoolProperty(
@@ -147,6 +218,15 @@ class BMIDI_Item(bpy.types.PropertyGroup):
         ]
     )
 
+    use_instancing: bpy.props.BoolProperty(
+        name="Geometry Nodes Instancing",
+        description="Draw the objects as instances of one Geometry Nodes object that animates them from the current frame, instead of keying every object",
+        default=False
+    )
+
+    # hash of everything the item's keyframes were last generated from (see `src.generate.item_fingerprint`)
+    fingerprint: bpy.props.StringProperty(options={'HIDDEN'})
+
 class BMIDI_UL_items(bpy.types.UIList):
     def draw_item(
         self, context, layout, data, item, icon,
@@ -205,6 +285,7 @@ class VIEW_3D_OT_duplicate_item(bpy.types.Operator):
             setattr(dst, prop.identifier, getattr(src, prop.identifier))
 
         dst.object_prefix = f"{src.object_prefix} (COPY)"
+        dst.fingerprint = ""
 
         # move it right after the original
         items.move(len(items) - 1, idx + 1)
@@ -214,12 +295,60 @@ class VIEW_3D_OT_duplicate_item(bpy.types.Operator):
 
 class VIEW_3D_OT_generate_keyframes(bpy.types.Operator):
     """
-    Clears object animation data and generates the keyframes for all instruments and compositions
+    Generates the keyframes for every item whose settings, objects or MIDI file changed since it was last generated
     """
     bl_idname = "bmidi.generate_keyframes"
     bl_label = "Generate Keyframes"
 
+    force: bpy.props.BoolProperty(
+        name="Force",
+        description="Regenerate every item, even if nothing changed since it was last generated",
+        default=False,
+        options={'SKIP_SAVE'}
+    )
+    use_window: bpy.props.BoolProperty(
+        name="Frame Range Only",
+        description="Only replace the keyframes between the start and end frames, keeping the rest",
+        default=False,
+        options={'SKIP_SAVE'}
+    )
+    window_start: bpy.props.IntProperty(name="Start", options={'SKIP_SAVE'})
+    window_end: bpy.props.IntProperty(name="End", options={'SKIP_SAVE'})
+
+    def generation(self, context, midi_file: str) -> Generation:
+        scene = context.scene
+        self.instanced = instance_items(scene.bmidi_items, midi_file, scene, self.force)
+        self.profile_path = bpy.path.abspath(scene.bmidi_profile_path) if scene.bmidi_profile and scene.bmidi_profile_path else None
+
+        return Generation(
+            scene.bmidi_items,
+            midi_file,
+            scene.render.fps,
+            workers=scene.bmidi_workers,
+            force=self.force,
+            window=(self.window_start, self.window_end) if self.use_window else None,
+            profiler=profiler_for(self.profile_path),
+            cache=plan_cache(scene),
+        )
+
+    def finish(self, context, generation: Generation) -> None:
+        global last_profile
+
+        profiler = generation.profiler
+        last_profile = profiler if context.scene.bmidi_profile else None
+
+        if self.profile_path:
+            profiler.dump(self.profile_path)
+
+        if generation.finished:
+            skipped = sum(timing["skipped"] for timing in generation.timings)
+            instanced = f", {self.instanced} instanced" if self.instanced else ""
+            self.report({'INFO'}, f"Generated {len(generation.timings) - skipped} items ({skipped} unchanged{instanced}) in {profiler.seconds:.2f}s")
+        else:
+            self.report({'WARNING'}, f"Cancelled, {generation.finished_items} items were generated")
+
     def execute(self, context):
+        stop_live()
         context.scene.frame_set(-1)
         midi_file = context.scene.bmidi_midi_file
 
@@ -227,92 +356,138 @@ class VIEW_3D_OT_generate_keyframes(bpy.types.Operator):
             self.report({'ERROR'}, "No MIDI file selected")
             return {'CANCELLED'}
 
-        for item in context.scene.bmidi_items:
-            if not item.enabled:
-                continue
+        generation = self.generation(context, midi_file)
 
-            needs_radians = (
-                (True if item.object_property in ROTATION_PROPERTIES else False) or
-                (item.type == "light_composition" and item.light_object_property == "data.spot_size") or
-                (item.type == "effect_composition" and item.effect == "swing")
-            )
-
-            pullback_amount = math.radians(item.pullback_amount) if needs_radians else item.pullback_amount
-            overshoot_amount = math.radians(item.overshoot_amount) if needs_radians else item.overshoot_amount
-            channel = int(item.channel) - 1
-
-            note_start = item.note_range_start
-            note_end = item.note_range_end + 1 # 0 - 128
-            blocked_notes = process_note_list(item.blocked_notes) if item.use_block_list else []
-            notes = [i for i in range(note_start, note_end) if i not in blocked_notes]
-
-            if item.type == "hammer_composition":
-                composition = HammerComposition(
-                    midi_file,
-                    item.object_prefix,
-                    item.object_property,
-                    pullback_amount,
-                    notes,
-                    overshoot_amount=overshoot_amount,
-                    channel=channel,
-                )
-                composition.generate_keyframes()
-            elif item.type == "movement_composition":
-                composition = MovementComposition(
-                    midi_file,
-                    item.object_prefix,
-                    item.object_property,
-                    pullback_amount,
-                    notes,
-                    channel=channel,
-                )
-                composition.generate_keyframes()
-            elif item.type == "light_composition":
-                composition = LightComposition(
-                    midi_file,
-                    item.object_prefix,
-                    item.light_object_property,
-                    pullback_amount,
-                    overshoot_amount,
-                    notes,
-                    mode="light" if item.light_object_property != "emission.emission" else "emission",
-                    fade_effect=item.light_object_fade_effect,
-                    channel=channel,
-                )
-                composition.generate_keyframes()
-            elif item.type == "effect_composition":
-                composition = EffectComposition(
-                    midi_file,
-                    item.object_prefix,
-                    pullback_amount,
-                    item.axis,
-                    item.effect,
-                    notes,
-                    channel=channel,
-                )
-                composition.generate_keyframes()
-            elif item.type == "robotic_controller":
-                instrument = RoboticController(
-                    midi_file,
-                    item.object_prefix,
-                    item.robot_target_object_name,
-                    pullback_amount,
-                    item.axis,
-                    notes=notes,
-                    channel=channel,
-                )
-                instrument.generate_keyframes()
-            elif item.type == "position_controller":
-                instrument = PositionalController(
-                    midi_file,
-                    item.object_prefix,
-                    item.object_property,
-                    pullback_amount,
-                    overshoot_amount,
-                    notes=notes,
-                    channel=channel,
-                )
-                instrument.generate_keyframes()
+        with generation.profiler.run():
+            generation.run()
+
+        self.finish(context, generation)
+
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        if not context.scene.bmidi_background:
+            return self.execute(context)
+
+        stop_live()
+        context.scene.frame_set(-1)
+        midi_file = context.scene.bmidi_midi_file
+
+        if not midi_file:
+            self.report({'ERROR'}, "No MIDI file selected")
+            return {'CANCELLED'}
+
+        # parse the MIDI file off the main thread while Blender stays responsive, unless it's decoded over worker processes
+        # (only started from the main thread) in the first step
+        self.prefetch = prefetch_midi(midi_file) if context.scene.bmidi_workers == 1 else None
+        self.midi_file = midi_file
+        self.steps = None
+
+        wm = context.window_manager
+        self.timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        wm.progress_begin(0, 100)
+
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.stop(context)
+            return {'CANCELLED'}
+
+        if event.type != 'TIMER' or (self.prefetch is not None and self.prefetch.is_alive()):
+            return {'PASS_THROUGH'}
+
+        deadline = time.perf_counter() + GENERATE_TIME_SLICE
+
+        try:
+            if self.steps is None:
+                # also builds the instancers, which raises for items that can't be instanced
+                self.current = self.generation(context, self.midi_file)
+                self.steps = self.current.steps(wait=False)
+                self.progress = 0.0
+
+            with self.current.profiler.run():
+                for progress in self.steps:
+                    # a key plan is still being built, check again on the next timer event
+                    if progress is None:
+                        break
+
+                    self.progress = progress
+
+                    if time.perf_counter() >= deadline:
+                        break
+        except Exception as e:
+            self.stop(context, report=False)
+            self.report({'ERROR'}, f"Generating keyframes failed: {e}")
+            return {'CANCELLED'}
+
+        if not self.current.finished:
+            context.window_manager.progress_update(int(self.progress * 100))
+            context.workspace.status_text_set(f"bmidi: generating keyframes {self.progress:.0%} (Esc to cancel)")
+            return {'RUNNING_MODAL'}
+
+        self.stop(context)
+
+        return {'FINISHED'}
+
+    def stop(self, context, report: bool = True) -> None:
+        wm = context.window_manager
+        wm.event_timer_remove(self.timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+
+        if self.steps is not None:
+            self.steps.close()
+
+            if report:
+                self.finish(context, self.current)
+
+class VIEW_3D_OT_live_preview(bpy.types.Operator):
+    """
+    Plays every item back live while scrubbing or playing the timeline, without writing keyframes (press again to stop)
+    """
+    bl_idname = "bmidi.live_preview"
+    bl_label = "Live Preview"
+
+    def execute(self, context):
+        global live_player
+
+        if live_player is not None:
+            stop_live()
+            self.report({'INFO'}, "Stopped live preview")
+            return {'FINISHED'}
+
+        scene = context.scene
+        midi_file = scene.bmidi_midi_file
+
+        if not midi_file:
+            self.report({'ERROR'}, "No MIDI file selected")
+            return {'CANCELLED'}
+
+        frame = scene.frame_current
+        scene.frame_set(-1)
+
+        player = LivePlayer()
+        generation = Generation(
+            scene.bmidi_items,
+            midi_file,
+            scene.render.fps,
+            workers=scene.bmidi_workers,
+            cache=plan_cache(scene),
+            player=player,
+        )
+        try:
+            generation.run()
+        except Exception:
+            player.restore() # unmute the objects muted so far
+            raise
+
+        live_player = player
+        bpy.app.handlers.frame_change_pre.append(live_frame_handler)
+        scene.frame_set(frame)
+
+        self.report({'INFO'}, f"Live preview of {len(generation.timings)} items, generate keyframes to bake them")
 
         return {'FINISHED'}
 
@@ -323,24 +498,38 @@ class VIEW_3D_OT_rename_selected(bpy.types.Operator):
     bl_idname = "bmidi.rename_selected"
     bl_label = "Rename Selected"
 
+    dry_run: bpy.props.BoolProperty(
+        name="Preview",
+        description="Only show what the selected objects would be renamed to",
+        default=False,
+        options={'SKIP_SAVE'}
+    )
+
     def execute(self, context):
+        global rename_preview
+
         scene = context.scene
-        prefix = scene.bmidi_rename_prefix
-        rename_type = scene.bmidi_rename_type
-        notes = process_note_list(scene.bmidi_rename_notes)
-        obj_list = bpy.context.selected_objects
-
-        if rename_type == "location_smallest":
-            obj_list.sort(key=lambda o: o.location.length)
-        elif rename_type == "location_biggest":
-            obj_list.sort(key=lambda o: o.location.length, reverse=True)
-        elif rename_type == "scale_smallest":
-            obj_list.sort(key=lambda o: (o.scale.x, o.scale.y, o.location.z))
-        elif rename_type == "scale_biggest":
-            obj_list.sort(key=lambda o: (o.scale.x, o.scale.y, o.location.z), reverse=True)
-
-        for note, obj in zip(notes, obj_list):
-            obj.name = f"{prefix}{note}"
+        renames = plan_renames(
+            context.selected_objects,
+            scene.bmidi_rename_prefix,
+            process_note_list(scene.bmidi_rename_notes),
+            scene.bmidi_rename_type,
+            tuple(scene.bmidi_rename_axis),
+        )
+        conflicts = rename_conflicts(renames, bpy.data.objects.keys())
+
+        if self.dry_run:
+            rename_preview = ([(obj.name, name) for obj, name in renames], conflicts)
+            self.report({'INFO'}, f"{len(renames)} objects would be renamed")
+            return {'FINISHED'}
+
+        if conflicts:
+            self.report({'ERROR'}, f"Names already used by other objects: {', '.join(conflicts[:5])}{'...' if len(conflicts) > 5 else ''}")
+            return {'CANCELLED'}
+
+        renamed = apply_renames(renames)
+        rename_preview = None
+        self.report({'INFO'}, f"Renamed {renamed} objects")
 
         return {'FINISHED'}
 
@@ -363,7 +552,7 @@ class VIEW_3D_PT_bmidi_panel(bpy.types.Panel):
             box.label(text="MIDI Information", icon="INFO")
 
             if midi_path:
-                channel_ranges = get_midi_channel_ranges(midi_path)
+                channel_ranges = get_midi_channel_ranges(midi_path, scene.bmidi_workers)
 
                 if channel_ranges:
                     for ch in sorted(channel_ranges):
@@ -438,8 +627,72 @@ class VIEW_3D_PT_bmidi_panel(bpy.types.Panel):
             layout.separator()
             layout.prop(item, "channel")
 
+            if can_instance(item):
+                layout.prop(item, "use_instancing")
+
+        layout.separator()
+        layout.prop(scene, "bmidi_workers")
+        layout.prop(scene, "bmidi_background")
+        row = layout.row(align=True)
+        row.prop(scene, "bmidi_plan_cache")
+
+        if scene.bmidi_plan_cache:
+            row.prop(scene, "bmidi_plan_cache_size", text="MB")
+
+        layout.prop(scene, "bmidi_use_window")
+
+        if scene.bmidi_use_window:
+            row = layout.row(align=True)
+            row.prop(scene, "bmidi_window_start")
+            row.prop(scene, "bmidi_window_end")
+
+        row = layout.row(align=True)
+        generate = row.operator("bmidi.generate_keyframes", icon="MODIFIER")
+        regenerate = row.operator("bmidi.generate_keyframes", icon="FILE_REFRESH", text="")
+        generate.force = False
+        regenerate.force = True
+
+        for op in (generate, regenerate):
+            op.use_window = scene.bmidi_use_window
+            op.window_start = scene.bmidi_window_start
+            op.window_end = scene.bmidi_window_end
+
+        layout.operator(
+            "bmidi.live_preview",
+            icon="PAUSE" if live_player is not None else "PLAY",
+            text="Stop Live Preview" if live_player is not None else "Live Preview",
+            depress=live_player is not None,
+        )
+
         layout.separator()
-        layout.operator("bmidi.generate_keyframes", icon="MODIFIER")
+        layout.prop(scene, "bmidi_profile")
+
+        if scene.bmidi_profile:
+            layout.prop(scene, "bmidi_profile_path")
+
+            if last_profile is not None:
+                box = layout.box()
+                box.label(text=f"Last Run: {last_profile.seconds:.3f}s, {last_profile.counts.get('keys', 0)} keys", icon="TIME")
+
+                for phase, seconds in last_profile.phases.items():
+                    box.label(text=f"{phase.title()}: {seconds:.3f}s")
+
+                if last_profile.midi.get("cached"):
+                    for phase, seconds in last_profile.midi["phases"].items():
+                        box.label(text=f"{phase.title()}: {seconds:.3f}s (before this run)")
+
+                box.separator()
+
+                for timing in last_profile.slowest_items():
+                    if timing["skipped"]:
+                        continue
+
+                    slowest = max(timing["phases"], key=timing["phases"].get)
+                    box.label(
+                        text=f"{timing['object_prefix']}: {timing['seconds']:.3f}s ({slowest} {timing['phases'][slowest]:.3f}s), "
+                             f"{timing['events']} events, {timing['keys']} keys",
+                        icon="SOUND",
+                    )
 
 class VIEW_3D_PT_bmidi_rename_panel(bpy.types.Panel):
     bl_space_type = "VIEW_3D"
@@ -453,10 +706,29 @@ class VIEW_3D_PT_bmidi_rename_panel(bpy.types.Panel):
 
         layout.prop(scene, "bmidi_rename_prefix")
         layout.prop(scene, "bmidi_rename_type")
+
+        if scene.bmidi_rename_type == "axis_projection":
+            layout.prop(scene, "bmidi_rename_axis")
+
         layout.prop(scene, "bmidi_rename_notes")
 
         layout.separator()
-        layout.operator("bmidi.rename_selected", icon="TEXT")
+        row = layout.row(align=True)
+        row.operator("bmidi.rename_selected", icon="TEXT").dry_run = False
+        row.operator("bmidi.rename_selected", icon="HIDE_OFF", text="").dry_run = True
+
+        if rename_preview is not None:
+            renames, conflicts = rename_preview
+            box = layout.box()
+
+            for name in conflicts[:RENAME_PREVIEW_ROWS]:
+                box.label(text=f"{name} is already used", icon="ERROR")
+
+            for old, new in renames[:RENAME_PREVIEW_ROWS]:
+                box.label(text=f"{old} -> {new}")
+
+            if len(renames) > RENAME_PREVIEW_ROWS:
+                box.label(text=f"...and {len(renames) - RENAME_PREVIEW_ROWS} more")
 
 def register():
     bpy.utils.register_class(BMIDI_Item)
@@ -470,6 +742,52 @@ def register():
     bpy.types.Scene.bmidi_midi_file = bpy.props.StringProperty(
         name="MIDI File",
         subtype="FILE_PATH",
+        update=clear_channel_cache,
+    )
+    bpy.types.Scene.bmidi_workers = bpy.props.IntProperty(
+        name="Worker Processes",
+        description="Processes used to compute keyframes in parallel (0 uses every CPU, 1 computes them in Blender)",
+        min=0,
+        default=1,
+    )
+    bpy.types.Scene.bmidi_use_window = bpy.props.BoolProperty(
+        name="Frame Range Only",
+        description="Only replace the keyframes between the start and end frames, keeping the rest (for previewing part of a song)",
+        default=False,
+    )
+    bpy.types.Scene.bmidi_window_start = bpy.props.IntProperty(
+        name="Start",
+        default=1,
+    )
+    bpy.types.Scene.bmidi_window_end = bpy.props.IntProperty(
+        name="End",
+        default=250,
+    )
+    bpy.types.Scene.bmidi_background = bpy.props.BoolProperty(
+        name="Generate In Background",
+        description="Keep Blender responsive while generating and show the progress, press Esc to cancel (finished items keep their keyframes)",
+        default=True,
+    )
+    bpy.types.Scene.bmidi_plan_cache = bpy.props.BoolProperty(
+        name="Cache Key Plans",
+        description="Save the computed keyframes of every item in a bmidi_cache folder next to the .blend file, so unchanged items are keyed without recomputing them",
+        default=True,
+    )
+    bpy.types.Scene.bmidi_plan_cache_size = bpy.props.IntProperty(
+        name="Cache Size (MB)",
+        description="How large the key plan cache may grow before the least recently used plans are removed",
+        min=1,
+        default=DEFAULT_CACHE_MB,
+    )
+    bpy.types.Scene.bmidi_profile = bpy.props.BoolProperty(
+        name="Profile Generation",
+        description="Time every phase and item of keyframe generation and show the results here",
+        default=False,
+    )
+    bpy.types.Scene.bmidi_profile_path = bpy.props.StringProperty(
+        name="Profile Output",
+        description="Also save the timings here, as JSON for a .json file or as cProfile statistics (pstats) for any other file",
+        subtype="FILE_PATH",
     )
 
     # rename elements
@@ -483,8 +801,15 @@ def register():
             ("location_biggest", "Location (Biggest -> Smallest)", "Rename items based on their location (biggest to smallest)"),
             ("scale_smallest", "Scale (Smallest -> Biggest)", "Rename items based on their scale (smallest to biggest)"),
             ("scale_biggest", "Scale (Biggest -> Smallest)", "Rename items based on their scale (biggest to smallest)"),
+            ("axis_projection", "Along Axis", "Rename items in the order they lie along an axis (e.g. left to right along X)"),
         ]
     )
+    bpy.types.Scene.bmidi_rename_axis = bpy.props.FloatVectorProperty(
+        name="Axis",
+        description="The direction objects are ordered along, flip it to reverse the order",
+        size=3,
+        default=(1.0, 0.0, 0.0),
+    )
     bpy.types.Scene.bmidi_rename_notes = bpy.props.StringProperty(
         name="Rename To Notes",
         description="Comma separated MIDI notes",
@@ -496,8 +821,12 @@ def register():
     bpy.utils.register_class(VIEW_3D_OT_remove_item)
     bpy.utils.register_class(VIEW_3D_OT_duplicate_item)
     bpy.utils.register_class(VIEW_3D_OT_generate_keyframes)
+    bpy.utils.register_class(VIEW_3D_OT_live_preview)
     bpy.utils.register_class(VIEW_3D_OT_rename_selected)
 
+    bpy.app.handlers.load_pre.append(live_load_handler)
+    bpy.app.handlers.save_pre.append(live_save_handler)
+
 def unregister():
     bpy.utils.unregister_class(BMIDI_UL_items)
     bpy.utils.unregister_class(VIEW_3D_PT_bmidi_panel)
@@ -506,7 +835,16 @@ def unregister():
     bpy.utils.unregister_class(VIEW_3D_OT_remove_item)
     bpy.utils.unregister_class(VIEW_3D_OT_duplicate_item)
     bpy.utils.unregister_class(VIEW_3D_OT_generate_keyframes)
+    bpy.utils.unregister_class(VIEW_3D_OT_live_preview)
     bpy.utils.unregister_class(VIEW_3D_OT_rename_selected)
 
+    stop_live()
+
+    if live_load_handler in bpy.app.handlers.load_pre:
+        bpy.app.handlers.load_pre.remove(live_load_handler)
+
+    if live_save_handler in bpy.app.handlers.save_pre:
+        bpy.app.handlers.save_pre.remove(live_save_handler)
+
 if __name__ == "__main__":
     register()
@@ -0,0 +1,436 @@
+import bpy
+from array import array
+from contextlib import contextmanager
+from src.generate import create_item, item_fingerprint, item_instruments
+from src.instancing import INSTANCED_ROTATION_MODES, NEWTON_STEPS, InstanceSegments, composition_segments, is_instanced
+from src.keyframes import ensure_fcurve, write_keyframes
+from src.midi import file_hash
+
+# point attributes of the instancer, read by its node tree
+SEGMENT_ATTRIBUTES = (
+    ("bmidi_group", "INT", "group"),
+    ("bmidi_start", "FLOAT", "start"),
+    ("bmidi_end", "FLOAT", "end"),
+    ("bmidi_offset", "FLOAT", "offset"),
+    ("bmidi_frame_curve", "FLOAT_VECTOR", "frame_curve"),
+    ("bmidi_offset_curve", "FLOAT_VECTOR", "offset_curve"),
+    ("bmidi_first", "INT", "first"),
+)
+
+# custom property of every source object, holding the names of the collections it was moved out of (one per line,
+# an empty line for the scene's own collection)
+ORIGINAL_COLLECTIONS = "bmidi_collections"
+
+
+def instancer_name(object_prefix: str) -> str:
+    return f"bmidi {object_prefix}"
+
+def sources_name(name: str) -> str:
+    return f"{name} Sources"
+
+def scene_instancers(scene) -> set[str]:
+    """
+    Returns the names of the instancers built in `scene`, found from their objects and from their sources collections
+    (whose objects all carry `ORIGINAL_COLLECTIONS`), so instancers no item owns anymore can still be removed
+    """
+    names = set()
+
+    for obj in scene.objects:
+        modifier = obj.modifiers.get("bmidi")
+
+        if obj.name.startswith("bmidi ") and modifier is not None and modifier.type == 'NODES':
+            names.add(obj.name)
+
+    for collection in scene.collection.children_recursive:
+        name = collection.name.removesuffix(" Sources")
+
+        if name != collection.name and name.startswith("bmidi ") and all(ORIGINAL_COLLECTIONS in obj for obj in collection.objects):
+            names.add(name)
+
+    return names
+
+def _layer_collection(layer_collection, collection):
+    if layer_collection.collection == collection:
+        return layer_collection
+
+    for child in layer_collection.children:
+        found = _layer_collection(child, collection)
+
+        if found is not None:
+            return found
+
+    return None
+
+def _exclude(scene, collection, exclude: bool) -> None:
+    for view_layer in scene.view_layers:
+        layer_collection = _layer_collection(view_layer.layer_collection, collection)
+
+        if layer_collection is not None:
+            layer_collection.exclude = exclude
+
+def restore_source(scene, obj, collection) -> None:
+    """
+    Moves `obj` out of the sources `collection` back into the collections it was in before (see `source_collection`),
+    or into the scene's collection if none of them are left
+    """
+    names = obj.get(ORIGINAL_COLLECTIONS, "").split("\n")
+    originals = [scene.collection if not name else bpy.data.collections.get(name) for name in names]
+    originals = [other for other in originals if other is not None and other != collection] or [scene.collection]
+
+    for other in originals:
+        if obj.name not in other.objects:
+            other.objects.link(obj)
+
+    collection.objects.unlink(obj)
+
+    if ORIGINAL_COLLECTIONS in obj:
+        del obj[ORIGINAL_COLLECTIONS]
+
+def source_collection(scene, name: str, objects: list):
+    """
+    Moves `objects` into their own collection, linked in instance order and excluded from the view layers so only the
+    instances are drawn
+
+    The collections every object was in are stored on it, so `restore_source` can put it back
+    """
+    collection = bpy.data.collections.get(name) or bpy.data.collections.new(name)
+
+    if collection not in scene.collection.children_recursive:
+        scene.collection.children.link(collection)
+
+    keep = {obj.name for obj in objects}
+
+    for obj in list(collection.objects):
+        if obj.name in keep:
+            collection.objects.unlink(obj) # linked again below, in instance order
+        else:
+            restore_source(scene, obj, collection) # no longer part of the composition
+
+    for obj in objects:
+        # objects still in the collection from the last build were unlinked above and already have their collections stored
+        if ORIGINAL_COLLECTIONS not in obj:
+            obj[ORIGINAL_COLLECTIONS] = "\n".join("" if other == scene.collection else other.name for other in obj.users_collection)
+
+        for other in list(obj.users_collection):
+            other.objects.unlink(obj)
+
+        collection.objects.link(obj)
+
+    _exclude(scene, collection, True)
+
+    return collection
+
+@contextmanager
+def scratch_fcurve():
+    """
+    Yields an F-Curve of a temporary object, removed with its action afterwards
+    """
+    obj = bpy.data.objects.new("bmidi Handles", None)
+
+    try:
+        yield ensure_fcurve(obj, "location", 0)
+    finally:
+        action = obj.animation_data.action
+        bpy.data.objects.remove(obj)
+        bpy.data.actions.remove(action)
+
+def key_handles(fcurve, frames, values) -> tuple[array, array]:
+    """
+    Returns the left and right handles Blender gives the keys `frames`/`values`, written to `fcurve` in place of its keys
+    """
+    fcurve.keyframe_points.clear()
+    write_keyframes(fcurve, frames, values)
+
+    handles = []
+    for side in ("handle_left", "handle_right"):
+        points = array("f", [0.0]) * (len(frames) * 2)
+        fcurve.keyframe_points.foreach_get(side, points)
+        handles.append(points)
+
+    return handles[0], handles[1]
+
+def segment_mesh(name: str, segments: InstanceSegments):
+    """
+    Writes `segments` as the point attributes of a mesh of loose points, one point per segment
+    """
+    mesh = bpy.data.meshes.get(name) or bpy.data.meshes.new(name)
+    mesh.clear_geometry()
+    mesh.vertices.add(len(segments))
+
+    # one lookup per instance, on the first points
+    first = array("i", segments.first)
+    first.extend([0] * (len(segments) - len(first)))
+
+    for attribute, data_type, field in SEGMENT_ATTRIBUTES:
+        values = first if field == "first" else getattr(segments, field)
+        mesh.attributes.new(attribute, data_type, "POINT").data.foreach_set("vector" if data_type == "FLOAT_VECTOR" else "value", values)
+
+    mesh.update()
+
+    return mesh
+
+def _node(tree, kind: str, location: tuple[float, float], **settings):
+    node = tree.nodes.new(kind)
+    node.location = location
+
+    for key, value in settings.items():
+        setattr(node, key, value)
+
+    return node
+
+def _socket(sockets, *names: str, nth: int = 0):
+    """
+    Returns the `nth` available socket called any of `names`, since nodes keep sockets of their other data types
+    (unavailable, under the same names) and some sockets were renamed between Blender versions
+    """
+    found = [socket for socket in sockets if socket.name in names and socket.enabled]
+
+    if len(found) <= nth:
+        raise KeyError(f"No available {' or '.join(names)} socket")
+
+    return found[nth]
+
+def _attribute(tree, name: str, data_type: str, location: tuple[float, float]):
+    node = _node(tree, "GeometryNodeInputNamedAttribute", location, data_type=data_type)
+    _socket(node.inputs, "Name").default_value = name
+
+    return _socket(node.outputs, "Attribute")
+
+def _math(tree, operation: str, location: tuple[float, float], *inputs, clamp: bool = False):
+    """
+    Adds a Math node applying `operation` to `inputs` (sockets to link, or numbers), returning its output
+    """
+    node = _node(tree, "ShaderNodeMath", location, operation=operation, use_clamp=clamp)
+
+    for i, value in enumerate(inputs):
+        socket = _socket(node.inputs, "Value", nth=i)
+
+        if isinstance(value, (int, float)):
+            socket.default_value = value
+        else:
+            tree.links.new(value, socket)
+
+    return _socket(node.outputs, "Value")
+
+def _polynomial(tree, coefficients: tuple, t, location: tuple[float, float]):
+    """
+    Evaluates the polynomial in `t` with `coefficients` (highest power first) with Horner's method, returning its output
+    """
+    value = coefficients[0]
+
+    for i, coefficient in enumerate(coefficients[1:]):
+        value = _math(tree, "MULTIPLY_ADD", (location[0] + 100 * i, location[1] - 50 * i), value, t, coefficient)
+
+    return value
+
+def _separate(tree, vector, location: tuple[float, float]) -> list:
+    node = _node(tree, "ShaderNodeSeparateXYZ", location)
+    tree.links.new(vector, _socket(node.inputs, "Vector"))
+
+    return [_socket(node.outputs, axis) for axis in "XYZ"]
+
+def instancing_tree(name: str, collection, segments: InstanceSegments):
+    """
+    Builds the node tree of an instancer: every instance of `collection` is offset by the value of its active segment
+    for the current frame, found with an Accumulate Field over the segment points and two Sample Index lookups
+
+    Segments are evaluated along their Bézier curves, so instances move like their objects would with the keys baked
+
+    Run `tests/blender/check_instancing.py` in Blender after changing it
+    """
+    tree = bpy.data.node_groups.get(name) or bpy.data.node_groups.new(name, "GeometryNodeTree")
+    tree.nodes.clear()
+    tree.interface.clear()
+    tree.interface.new_socket("Geometry", in_out="INPUT", socket_type="NodeSocketGeometry")
+    tree.interface.new_socket("Geometry", in_out="OUTPUT", socket_type="NodeSocketGeometry")
+    tree.is_modifier = True
+
+    link = tree.links.new
+    points = _socket(_node(tree, "NodeGroupInput", (-2800, 1100)).outputs, "Geometry")
+    frame = _socket(_node(tree, "GeometryNodeInputSceneTime", (-2800, 900)).outputs, "Frame")
+
+    attributes = {
+        attribute: _attribute(tree, attribute, data_type, (-2800, 700 - 150 * i))
+        for i, (attribute, data_type, _) in enumerate(SEGMENT_ATTRIBUTES)
+    }
+
+    # the offset of each segment at the current frame, zero unless the frame is within the segment
+    after = _node(tree, "FunctionNodeCompare", (-2400, 1000), data_type="FLOAT", operation="GREATER_EQUAL")
+    link(frame, _socket(after.inputs, "A"))
+    link(attributes["bmidi_start"], _socket(after.inputs, "B"))
+
+    before = _node(tree, "FunctionNodeCompare", (-2400, 800), data_type="FLOAT", operation="LESS_THAN")
+    link(frame, _socket(before.inputs, "A"))
+    link(attributes["bmidi_end"], _socket(before.inputs, "B"))
+
+    active = _node(tree, "FunctionNodeBooleanMath", (-2200, 900), operation="AND")
+    link(_socket(after.outputs, "Result"), _socket(active.inputs, "Boolean"))
+    link(_socket(before.outputs, "Result"), _socket(active.inputs, "Boolean", nth=1))
+
+    # the Bézier curve of the segment, solving its frame polynomial for the curve parameter `t` of the current frame
+    # with Newton steps from where `t` would be if the frame moved evenly, then evaluating its offset polynomial at `t`
+    frame_curve = _separate(tree, attributes["bmidi_frame_curve"], (-2400, 300))
+    offset_curve = _separate(tree, attributes["bmidi_offset_curve"], (-2400, -100))
+    behind = _math(tree, "SUBTRACT", (-2200, 500), attributes["bmidi_start"], frame) # the frame polynomial plus this is zero at `t`
+    slope_2 = _math(tree, "MULTIPLY", (-2200, 300), frame_curve[1], 2.0)
+    slope_3 = _math(tree, "MULTIPLY", (-2200, 150), frame_curve[2], 3.0)
+
+    even = _node(tree, "ShaderNodeMapRange", (-2200, -100), data_type="FLOAT", clamp=True)
+    link(frame, _socket(even.inputs, "Value"))
+    link(attributes["bmidi_start"], _socket(even.inputs, "From Min"))
+    link(attributes["bmidi_end"], _socket(even.inputs, "From Max"))
+    t = _socket(even.outputs, "Result")
+
+    for step in range(NEWTON_STEPS):
+        x = -2000 + 500 * step
+        error = _polynomial(tree, (frame_curve[2], frame_curve[1], frame_curve[0], behind), t, (x, 400))
+        slope = _polynomial(tree, (slope_3, slope_2, frame_curve[0]), t, (x, 0))
+        t = _math(tree, "SUBTRACT", (x + 400, 200), t, _math(tree, "DIVIDE", (x + 200, 200), error, slope), clamp=True)
+
+    value = _polynomial(tree, (offset_curve[2], offset_curve[1], offset_curve[0], attributes["bmidi_offset"]), t, (-2000 + 500 * NEWTON_STEPS, 0))
+    masked = _node(tree, "ShaderNodeMath", (-400, 300), operation="MULTIPLY")
+    link(value, _socket(masked.inputs, "Value"))
+    link(_socket(active.outputs, "Boolean"), _socket(masked.inputs, "Value", nth=1))
+
+    # only one segment of each instance is active, so the total of its group is the instance's offset
+    total = _node(tree, "GeometryNodeAccumulateField", (-200, 300), data_type="FLOAT", domain="POINT")
+    link(_socket(masked.outputs, "Value"), _socket(total.inputs, "Value"))
+    link(attributes["bmidi_group"], _socket(total.inputs, "Group ID", "Group Index"))
+
+    first = _node(tree, "GeometryNodeSampleIndex", (0, -100), data_type="INT", domain="POINT")
+    link(points, _socket(first.inputs, "Geometry"))
+    link(attributes["bmidi_first"], _socket(first.inputs, "Value"))
+    link(_socket(_node(tree, "GeometryNodeInputIndex", (-200, -300)).outputs, "Index"), _socket(first.inputs, "Index"))
+
+    offset = _node(tree, "GeometryNodeSampleIndex", (200, 200), data_type="FLOAT", domain="POINT")
+    link(points, _socket(offset.inputs, "Geometry"))
+    link(_socket(total.outputs, "Total"), _socket(offset.inputs, "Value"))
+    link(_socket(first.outputs, "Value"), _socket(offset.inputs, "Index"))
+
+    vector = _node(tree, "ShaderNodeCombineXYZ", (400, 200))
+    for axis in "XYZ":
+        _socket(vector.inputs, axis).default_value = 1.0 if segments.root == "scale" else 0.0
+    link(_socket(offset.outputs, "Value"), _socket(vector.inputs, "XYZ"[segments.index]))
+
+    instances = _node(tree, "GeometryNodeCollectionInfo", (400, -100), transform_space="ORIGINAL")
+    _socket(instances.inputs, "Collection").default_value = collection
+    _socket(instances.inputs, "Separate Children").default_value = True
+    _socket(instances.inputs, "Reset Children").default_value = False
+
+    if segments.root == "location":
+        transform = _node(tree, "GeometryNodeTranslateInstances", (600, 0))
+        link(_socket(vector.outputs, "Vector"), _socket(transform.inputs, "Translation"))
+        _socket(transform.inputs, "Local Space").default_value = False
+    elif segments.root == "rotation_euler":
+        # the offset turns each instance about its own X axis, the Euler component applied first (see `INSTANCED_ROTATIONS`)
+        transform = _node(tree, "GeometryNodeRotateInstances", (600, 0))
+        link(_socket(vector.outputs, "Vector"), _socket(transform.inputs, "Rotation"))
+        _socket(transform.inputs, "Local Space").default_value = True
+    else:
+        transform = _node(tree, "GeometryNodeScaleInstances", (600, 0))
+        link(_socket(vector.outputs, "Vector"), _socket(transform.inputs, "Scale"))
+        _socket(transform.inputs, "Local Space").default_value = True
+
+    link(_socket(instances.outputs, "Instances"), _socket(transform.inputs, "Instances"))
+    link(_socket(transform.outputs, "Instances"), _socket(_node(tree, "NodeGroupOutput", (800, 0)).inputs, "Geometry"))
+
+    return tree
+
+def build_instancer(composition, name: str, scene=None):
+    """
+    Draws the objects of `composition` as instances of a single object called `name`, whose Geometry Nodes tree
+    offsets every instance for the current frame instead of keying the objects
+
+    The objects are moved into a `<name> Sources` collection excluded from the view layers (`remove_instancer` moves them
+    back), and their animation is removed
+    """
+    scene = scene or bpy.context.scene
+
+    # the keys' handles are read back from an F-Curve, as Blender smooths them over the whole curve
+    with scratch_fcurve() as fcurve:
+        objects, segments = composition_segments(composition, scene.render.fps, lambda frames, values: key_handles(fcurve, frames, values))
+
+    if segments.root == "rotation_euler":
+        for obj in objects:
+            if obj.rotation_mode not in INSTANCED_ROTATION_MODES:
+                raise ValueError(f"{obj.name} can't be instanced, its rotation mode must be XYZ or XZY")
+
+    for obj in objects:
+        obj.animation_data_clear()
+
+    collection = source_collection(scene, sources_name(name), objects)
+    mesh = segment_mesh(name, segments)
+    instancer = bpy.data.objects.get(name)
+
+    if instancer is None:
+        instancer = bpy.data.objects.new(name, mesh)
+        scene.collection.objects.link(instancer)
+    else:
+        instancer.data = mesh
+
+    modifier = instancer.modifiers.get("bmidi") or instancer.modifiers.new("bmidi", "NODES")
+    modifier.node_group = instancing_tree(name, collection, segments)
+
+    return instancer
+
+def remove_instancer(name: str, scene=None) -> None:
+    """
+    Removes the instancer called `name`, with its mesh and node tree, and moves its source objects back into their
+    original collections
+    """
+    scene = scene or bpy.context.scene
+    instancer = bpy.data.objects.get(name)
+
+    if instancer is not None:
+        bpy.data.objects.remove(instancer)
+
+    for data in (bpy.data.meshes, bpy.data.node_groups):
+        if data.get(name) is not None:
+            data.remove(data[name])
+
+    collection = bpy.data.collections.get(sources_name(name))
+
+    if collection is not None:
+        for obj in list(collection.objects):
+            restore_source(scene, obj, collection)
+
+        bpy.data.collections.remove(collection)
+
+def instance_items(items, midi_file: str, scene=None, force: bool = False) -> int:
+    """
+    Builds the instancer of every enabled item set to use instancing (see `src.instancing.is_instanced`), and removes every
+    other instancer of the scene (of items that no longer use instancing, were disabled, renamed or deleted), returning
+    how many instancers were built
+
+    Instancers whose item's fingerprint (see `src.generate.item_fingerprint`) matches their last build are kept as they are,
+    unless `force` is set
+    """
+    scene = scene or bpy.context.scene
+    instanced = [item for item in items if item.enabled and is_instanced(item)]
+    owned = {instancer_name(item.object_prefix) for item in instanced}
+    removed = scene_instancers(scene) - owned
+
+    for name in removed:
+        remove_instancer(name, scene)
+
+    for item in items:
+        if instancer_name(item.object_prefix) in removed:
+            item.fingerprint = "" # its objects have no keys
+
+    midi_hash = None
+    built = 0
+
+    for item in instanced:
+        name = instancer_name(item.object_prefix)
+        composition = create_item(item, midi_file)
+        midi_hash = midi_hash or file_hash(midi_file)
+        fingerprint = item_fingerprint(item, midi_hash, scene.render.fps, item_instruments(composition))
+
+        if not force and item.fingerprint == fingerprint and bpy.data.objects.get(name) is not None:
+            continue
+
+        build_instancer(composition, name, scene)
+        item.fingerprint = fingerprint
+        built += 1
+
+    return built
@@ -0,0 +1,61 @@
+import bpy
+from src.keyframes import apply_plan, remove_keyframes
+from src.plan import KeyPlan
+from src.scene import SceneAdapter
+
+
+class BpyScene(SceneAdapter):
+    """
+    Drives the objects of the active Blender scene, writing key plans to F-Curves in bulk
+    """
+    def fps(self) -> float:
+        return bpy.context.scene.render.fps
+
+    def get_object(self, name: str):
+        return bpy.data.objects[name]
+
+    def has_object(self, name: str) -> bool:
+        return bpy.data.objects.get(name) is not None
+
+    def named_objects(self):
+        return ((obj.name, obj) for obj in bpy.data.objects)
+
+    def clear_animation(self, owner, window: tuple[float, float] | None = None) -> None:
+        if window is None:
+            owner.animation_data_clear()
+        else:
+            remove_keyframes(owner, *window)
+
+    def mute_animation(self, owner):
+        animation_data = owner.animation_data
+
+        if animation_data is None:
+            return None
+
+        action = animation_data.action
+        muted = (action, animation_data.action_slot, action.use_fake_user if action else False, animation_data.use_nla)
+
+        # the fake user keeps the action in the file while nothing else uses it
+        if action is not None:
+            action.use_fake_user = True
+
+        animation_data.action = None
+        animation_data.use_nla = False
+
+        return muted
+
+    def unmute_animation(self, owner, muted) -> None:
+        if muted is None:
+            return
+
+        action, slot, fake_user, use_nla = muted
+        animation_data = owner.animation_data or owner.animation_data_create()
+        animation_data.use_nla = use_nla
+
+        if action is not None:
+            animation_data.action = action
+            animation_data.action_slot = slot
+            action.use_fake_user = fake_user
+
+    def apply_plan(self, plan: KeyPlan, targets: dict[str, object]) -> None:
+        apply_plan(plan, targets)
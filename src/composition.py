@@ -1,5 +1,7 @@
-import bpy
 from src.instrument import EffectInstrument, HammerInstrument, LightInstrument, MovementInstrument
+from src.events import EventTable
+from src.midi import demultiplex
+from src.scene import ObjectIndex, SceneAdapter, default_scene
 
 class Composition:
     def __init__(
@@ -10,10 +12,12 @@ class Composition:
         start_range: int = 0,
         end_range: int = 127,
         channel: int | None = None,
+        scene: SceneAdapter | None = None,
+        objects: ObjectIndex | None = None,
     ):
         pass
 
-    def generate_keyframes(self) -> None:
+    def generate_keyframes(self, window: tuple[float, float] | None = None) -> None:
         pass
 
 class HammerComposition(Composition):
@@ -31,31 +35,37 @@ class HammerComposition(Composition):
         notes: list[int],
         overshoot_amount: float = 0,
         channel: int | None = None,
+        scene: SceneAdapter | None = None,
+        objects: ObjectIndex | None = None,
     ):
+        scene = scene or default_scene()
         self.instruments: list[HammerInstrument] = []
 
+        buckets = demultiplex(midi_file)
+        found = (objects or ObjectIndex(scene.named_objects())).notes(object_prefix)
+
         for i in notes:
-            object_name = f"{object_prefix}{i}"
+            obj = found.get(i)
 
-            try:
-                bpy.data.objects[object_name]
-            except:
+            if obj is None:
                 continue
 
             instrument = HammerInstrument(
                 midi_file,
-                object_name,
+                obj,
                 object_property,
                 pullback_amount,
                 overshoot_amount=overshoot_amount,
                 note=i,
                 channel=channel,
+                events=buckets.get((channel, i), EventTable()),
+                scene=scene,
             )
             self.instruments.append(instrument)
 
-    def generate_keyframes(self):
+    def generate_keyframes(self, window: tuple[float, float] | None = None):
         for instrument in self.instruments:
-            instrument.generate_keyframes()
+            instrument.generate_keyframes(window)
 
 class MovementComposition(Composition):
     """
@@ -71,30 +81,36 @@ class MovementComposition(Composition):
         final_amount: float,
         notes: list[int],
         channel: int | None = None,
+        scene: SceneAdapter | None = None,
+        objects: ObjectIndex | None = None,
     ):
+        scene = scene or default_scene()
         self.instruments: list[MovementInstrument] = []
 
+        buckets = demultiplex(midi_file)
+        found = (objects or ObjectIndex(scene.named_objects())).notes(object_prefix)
+
         for i in notes:
-            object_name = f"{object_prefix}{i}"
+            obj = found.get(i)
 
-            try:
-                bpy.data.objects[object_name]
-            except:
+            if obj is None:
                 continue
 
             instrument = MovementInstrument(
                 midi_file,
-                object_name,
+                obj,
                 object_property,
                 final_amount,
                 note=i,
                 channel=channel,
+                events=buckets.get((channel, i), EventTable()),
+                scene=scene,
             )
             self.instruments.append(instrument)
 
-    def generate_keyframes(self):
+    def generate_keyframes(self, window: tuple[float, float] | None = None):
         for instrument in self.instruments:
-            instrument.generate_keyframes()
+            instrument.generate_keyframes(window)
 
 class LightComposition(Composition):
     """
@@ -113,20 +129,24 @@ class LightComposition(Composition):
         mode: str = "light",
         fade_effect: bool = False,
         channel: int | None = None,
+        scene: SceneAdapter | None = None,
+        objects: ObjectIndex | None = None,
     ):
+        scene = scene or default_scene()
         self.instruments: list[LightInstrument] = []
 
+        buckets = demultiplex(midi_file)
+        found = (objects or ObjectIndex(scene.named_objects())).notes(object_prefix)
+
         for i in notes:
-            object_name = f"{object_prefix}{i}"
+            obj = found.get(i)
 
-            try:
-                bpy.data.objects[object_name]
-            except:
+            if obj is None:
                 continue
 
             instrument = LightInstrument(
                 midi_file,
-                object_name,
+                obj,
                 light_property,
                 initial_amount,
                 final_amount,
@@ -134,12 +154,14 @@ class LightComposition(Composition):
                 fade_effect=fade_effect,
                 note=i,
                 channel=channel,
+                events=buckets.get((channel, i), EventTable()),
+                scene=scene,
             )
             self.instruments.append(instrument)
 
-    def generate_keyframes(self):
+    def generate_keyframes(self, window: tuple[float, float] | None = None):
         for instrument in self.instruments:
-            instrument.generate_keyframes()
+            instrument.generate_keyframes(window)
 
 class EffectComposition(Composition):
     """
@@ -156,28 +178,34 @@ class EffectComposition(Composition):
         effect: str,
         notes: list[int],
         channel: int | None = None,
+        scene: SceneAdapter | None = None,
+        objects: ObjectIndex | None = None,
     ):
+        scene = scene or default_scene()
         self.instruments: list[EffectInstrument] = []
 
+        buckets = demultiplex(midi_file)
+        found = (objects or ObjectIndex(scene.named_objects())).notes(object_prefix)
+
         for i in notes:
-            object_name = f"{object_prefix}{i}"
+            obj = found.get(i)
 
-            try:
-                bpy.data.objects[object_name]
-            except:
+            if obj is None:
                 continue
 
             instrument = EffectInstrument(
                 midi_file,
-                object_name,
+                obj,
                 effected_amount,
                 effected_axis,
                 effect,
                 note=i,
                 channel=channel,
+                events=buckets.get((channel, i), EventTable()),
+                scene=scene,
             )
             self.instruments.append(instrument)
 
-    def generate_keyframes(self):
+    def generate_keyframes(self, window: tuple[float, float] | None = None):
         for instrument in self.instruments:
-            instrument.generate_keyframes()
+            instrument.generate_keyframes(window)
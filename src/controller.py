@@ -1,62 +1,33 @@
-import mido
-import bpy
-import mathutils
-from src.instrument import get_prop, set_prop
-
-class Controller:
-    def __init__(self, midi_file: str, notes: list[int] = [], channel: int | None = None):
-        self._events = []
-        self._notes = notes
-
-        midi = mido.MidiFile(midi_file)
-        current_time = 0.0
-        active_notes = {} # start_time, velocity
-
-        for msg in midi:
-            current_time += msg.time
-
-            if msg.type == "note_on" and msg.velocity > 0:
-                if msg.note not in notes:
-                    continue
-
-                if channel is not None and msg.channel != channel:
-                    continue
-
-                active_notes[(msg.note, msg.channel)] = ( current_time, msg.velocity / 127.0 )
-
-            elif msg.type in ("note_off", "note_on") and msg.velocity == 0:
-                if msg.note not in notes:
-                    continue
-
-                if channel is not None and msg.channel != channel:
-                    continue
+from src.midi import load_midi
+from src.performer import Performer
+from src.scene import ObjectIndex, SceneAdapter
 
-                key = (msg.note, msg.channel)
-                if key in active_notes:
-                    start_time, velocity = active_notes.pop(key)
-
-                    self._events.append({
-                        "note": msg.note,
-                        "start": start_time,
-                        "duration": current_time - start_time,
-                        "velocity": velocity,
-                    })
+class Controller(Performer):
+    """
+    A controller keying objects from the events of several notes (or every note) of a channel (or every channel)
+    """
+    def __init__(
+        self,
+        midi_file: str,
+        notes: list[int] = [],
+        channel: int | None = None,
+        scene: SceneAdapter | None = None,
+    ):
+        super().__init__(midi_file, load_midi(midi_file).events.filter(notes, channel), scene)
 
-    def events(self) -> list[dict[str, float]]:
-        return self._events
+        self._notes = notes
 
     def notes(self) -> list[int]:
         return self._notes
 
-    def generate_keyframes(self) -> None:
-        pass
-
 class RoboticController(Controller):
     """
     Represents a robotic arm that will move to hit specified targets (notes)
 
     Targets are represented with the format `<object_prefix><note_number>`, for example, a drum head might be named `Snare25`
     """
+    planner = "robotic"
+
     def __init__(
         self,
         midi_file: str,
@@ -66,113 +37,48 @@ class RoboticController(Controller):
         pullback_axis: str,
         notes: list[int] = [],
         channel: int | None = None,
+        scene: SceneAdapter | None = None,
+        objects: ObjectIndex | None = None,
     ):
-        super().__init__(midi_file, notes, channel)
+        super().__init__(midi_file, notes, channel, scene)
 
-        self.control_object = bpy.data.objects[control_object]
+        self.objects = objects
+        self.control_object = self.scene.resolve(control_object)
         self.target_object_prefix = target_object_prefix
         self.pullback_amount = pullback_amount
         self.pullback_axis = pullback_axis
 
-        self.control_object.animation_data_clear()
-
-    def generate_keyframes(self):
-        events = self.events()
-        fps = bpy.context.scene.render.fps
-        control = self.control_object
-        target_object_prefix = self.target_object_prefix
-        pullback = self.pullback_amount
-        axis = self.pullback_axis
-        base = control.location.copy()
-
-        offset_vec = mathutils.Vector(
-            (
-                pullback if axis == "x" else 0,
-                pullback if axis == "y" else 0,
-                pullback if axis == "z" else 0,
-            )
-        )
-
-        first_frame = True
-
-        for i, e in enumerate(events):
-            next_event = events[i + 1] if i + 1 < len(events) else None
-
-            target = bpy.data.objects[f"{target_object_prefix}{e['note']}"]
-            start = e["start"] * fps
-            # velocity = 1 + (1 - e["velocity"]) * 1.5
-
-            if next_event:
-                duration = (next_event["start"] * fps) - start
-            else:
-                duration = e["duration"] * fps
-
-            pullback_frames = duration * 0.2
-            strike_frames = duration * 0.3
-            rebound_frames = duration * 0.2
-            pullback_start = start - pullback_frames
-            strike_mid = start - (strike_frames * 0.5)
-            impact = start
-            rebound_end = start + rebound_frames
-
-            if first_frame:
-                first_frame = False
-
-                # initial
-                control.location = base
-                control.keyframe_insert(
-                    data_path="location",
-                    frame=pullback_start - duration
-                )
-
-            # move up
-            control.location = control.location + offset_vec
-            control.keyframe_insert(
-                data_path="location",
-                frame=pullback_start
-            )
-
-            # across
-            control.location = target.location + offset_vec
-            control.keyframe_insert(
-                data_path="location",
-                frame=strike_mid
-            )
-
-            # hit
-            control.location = target.location
-            control.keyframe_insert(
-                data_path="location",
-                frame=impact
-            )
-
-            rebound_end = start + rebound_frames
-
-            # look ahead for the next event and animate the transition (if no next event, return to base)
-            if next_event:
-                next_target = bpy.data.objects[f"{target_object_prefix}{next_event['note']}"]
-                next_start = next_event["start"] * fps
-
-                next_hover_pos = next_target.location + offset_vec
-
-                control.location = target.location + offset_vec
-                control.keyframe_insert(
-                    data_path="location",
-                    frame=rebound_end
-                )
-
-                next_pullback_frames = (next_event["duration"] * fps) * 0.2
-                next_pullback_start = next_start - next_pullback_frames
-
-                control.location = next_hover_pos
-                control.keyframe_insert(
-                    data_path="location",
-                    frame=next_pullback_start
-                )
-            else:
-                # final reset
-                control.location = base
-                control.keyframe_insert(data_path="location", frame=rebound_end + (fps * 1.0))
+    def target_objects(self) -> dict[int, object]:
+        """
+        Returns the target object of every note played, raising `KeyError` if one is missing
+        """
+        notes = set(self.events().note)
+
+        if self.objects is None:
+            return {note: self.scene.get_object(f"{self.target_object_prefix}{note}") for note in notes}
+
+        found = self.objects.notes(self.target_object_prefix)
+        missing = notes - found.keys()
+
+        if missing:
+            raise KeyError(f"{self.target_object_prefix}{min(missing)}")
+
+        return {note: found[note] for note in notes}
+
+    def plan_args(self) -> dict:
+        return {
+            "base": tuple(self.control_object.location),
+            "targets": {note: tuple(obj.location) for note, obj in self.target_objects().items()},
+            "pullback": self.pullback_amount,
+            "axis": self.pullback_axis,
+        }
+
+    def animation_owners(self) -> list:
+        return [self.control_object]
+
+    def keyframe_targets(self) -> dict[str, object]:
+        return {"object": self.control_object}
+
 
 class PositionalController(Controller):
     """
@@ -180,6 +86,8 @@ class PositionalController(Controller):
 
     Targets are represented with the format `<object_prefix><note_number>`, for example, a drum head might be named `Snare25`
     """
+    planner = "positional"
+
     def __init__(
         self,
         midi_file: str,
@@ -189,60 +97,24 @@ class PositionalController(Controller):
         max_position: float,
         notes: list[int] = [],
         channel: int | None = None,
+        scene: SceneAdapter | None = None,
     ):
-        super().__init__(midi_file, notes, channel)
+        super().__init__(midi_file, notes, channel, scene)
 
-        self.object = bpy.data.objects[object_name]
+        self.object = self.scene.resolve(object_name)
         self.object_property = object_property
         self.min_position = min_position
         self.max_position = max_position
 
-        self.object.animation_data_clear()
-
-    def generate_keyframes(self):
-        events = self.events()
-        fps = bpy.context.scene.render.fps
-        obj = self.object
-        prop = self.object_property
-        keyframe_prop = prop.split(".")[0]
-        min = self.min_position
-        max = self.max_position
-
-        first_frame = True
-
-        for i, e in enumerate(events):
-            next_event = events[i + 1] if i + 1 < len(events) else None
-            start = e["start"] * fps
-            duration = e["duration"] * fps
-            velocity_scale = 1 + (1 - e["velocity"]) * 1.5
-
-            note = e["note"]
-            position = min + (note / 127) * (max - min)
-
-            if first_frame:
-                first_frame = False
-
-                set_prop(obj, prop, min + (63.5 / 127) * (max - min))
-                obj.keyframe_insert(
-                    data_path=keyframe_prop,
-                    frame=start - (duration * velocity_scale)
-                )
-
-            if next_event:
-                set_prop(obj, prop, position)
-                obj.keyframe_insert(
-                    data_path=keyframe_prop,
-                    frame=start
-                )
-
-                # hold position ~until next event
-                obj.keyframe_insert(
-                    data_path=keyframe_prop,
-                    frame=(next_event["start"] * fps) - (duration * 0.5)
-                )
-            else:
-                set_prop(obj, prop, min + (63.5 / 127) * (max - min))
-                obj.keyframe_insert(
-                    data_path=keyframe_prop,
-                    frame=start + (duration * velocity_scale)
-                )
+    def plan_args(self) -> dict:
+        return {
+            "prop": self.object_property,
+            "min_position": self.min_position,
+            "max_position": self.max_position,
+        }
+
+    def animation_owners(self) -> list:
+        return [self.object]
+
+    def keyframe_targets(self) -> dict[str, object]:
+        return {"object": self.object}
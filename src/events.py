@@ -0,0 +1,218 @@
+from array import array
+from bisect import bisect_right
+from collections.abc import Sequence
+
+
+class IntervalIndex:
+    """
+    A centered interval tree over `[start, end]` intervals, finding the intervals containing a time (stabbing queries) or
+    overlapping a range in O(log n + k) for k results, after an O(n log n) build
+
+    Every node holds the intervals containing its center, sorted by start and by end, so a query only reads the intervals it
+    returns plus one node per level
+
+    `starts`: the start of every interval, by row
+    `ends`: the end of every interval, by row
+
+    ## Example:
+
+    ```python
+    index = load_midi("track.mid").events.intervals()
+    index.at(12.5) # rows of the notes sounding 12.5 seconds in
+    index.overlapping(10.0, 20.0) # rows of the notes sounding at any time between 10 and 20 seconds
+    ```
+    """
+    __slots__ = ("_starts", "_ends", "_centers", "_by_start", "_by_end", "_left", "_right")
+
+    def __init__(self, starts, ends):
+        self._starts = starts
+        self._ends = ends
+        self._centers: list[float] = []
+        self._by_start: list[list[int]] = []
+        self._by_end: list[list[int]] = []
+        self._left: list[int] = []
+        self._right: list[int] = []
+
+        order = sorted(range(len(starts)), key=starts.__getitem__)
+        pending = [(order, -1, self._left)] if order else [] # (rows by start, parent node, parent's child links)
+
+        while pending:
+            rows, parent, links = pending.pop()
+
+            # the median start splits the rows so neither side holds more than half of them
+            center = starts[rows[len(rows) // 2]]
+            split = bisect_right(rows, center, key=starts.__getitem__)
+            higher = rows[split:] # the rows are sorted by start, so the ones starting after the center are a suffix
+            lower = []
+            here = []
+
+            for i in rows[:split]:
+                if ends[i] < center:
+                    lower.append(i)
+                else:
+                    here.append(i)
+
+            node = len(self._centers)
+            self._centers.append(center)
+            self._by_start.append(here)
+            self._by_end.append(sorted(here, key=ends.__getitem__, reverse=True))
+            self._left.append(-1)
+            self._right.append(-1)
+
+            if parent >= 0:
+                links[parent] = node
+
+            if lower:
+                pending.append((lower, node, self._left))
+            if higher:
+                pending.append((higher, node, self._right))
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def at(self, time: float) -> list[int]:
+        """
+        Returns the rows of the intervals containing `time` in row order, counting an interval's start but not its end
+        (a note ending at `time` is no longer sounding)
+        """
+        starts = self._starts
+        ends = self._ends
+        rows = []
+        node = 0 if self._centers else -1
+
+        while node >= 0:
+            if time < self._centers[node]:
+                for i in self._by_start[node]:
+                    if starts[i] > time:
+                        break
+                    rows.append(i)
+
+                node = self._left[node]
+            else:
+                for i in self._by_end[node]:
+                    if ends[i] <= time:
+                        break
+                    rows.append(i)
+
+                node = self._right[node]
+
+        rows.sort()
+
+        return rows
+
+    def overlapping(self, start: float, end: float) -> list[int]:
+        """
+        Returns the rows of the intervals overlapping `start` to `end` (both included) in row order
+        """
+        starts = self._starts
+        ends = self._ends
+        rows = []
+        pending = [0] if self._centers else []
+
+        while pending:
+            node = pending.pop()
+            center = self._centers[node]
+
+            if end < center:
+                for i in self._by_start[node]:
+                    if starts[i] > end:
+                        break
+                    rows.append(i)
+            elif start > center:
+                for i in self._by_end[node]:
+                    if ends[i] < start:
+                        break
+                    rows.append(i)
+            else:
+                rows.extend(self._by_start[node])
+
+            if start < center and self._left[node] >= 0:
+                pending.append(self._left[node])
+            if end > center and self._right[node] >= 0:
+                pending.append(self._right[node])
+
+        rows.sort()
+
+        return rows
+
+class EventTable(Sequence):
+    """
+    Columnar storage for paired note events, one `array` per field
+
+    Indexing or iterating the table yields `{"note", "channel", "start", "duration", "velocity"}` dicts for compatibility,
+    while hot paths should read the `note`, `channel`, `start`, `duration` and `velocity` columns directly
+    """
+    __slots__ = ("note", "channel", "start", "duration", "velocity", "_intervals")
+
+    def __init__(self):
+        self.note = array("B")
+        self.channel = array("B")
+        self.start = array("d")
+        self.duration = array("d")
+        self.velocity = array("d")
+        self._intervals = None
+
+    def append(self, note: int, channel: int, start: float, duration: float, velocity: float) -> None:
+        self.note.append(note)
+        self.channel.append(channel)
+        self.start.append(start)
+        self.duration.append(duration)
+        self.velocity.append(velocity)
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def __getitem__(self, i: int) -> dict[str, float]:
+        if isinstance(i, slice):
+            return self.take(range(*i.indices(len(self))))
+
+        return {
+            "note": self.note[i],
+            "channel": self.channel[i],
+            "start": self.start[i],
+            "duration": self.duration[i],
+            "velocity": self.velocity[i],
+        }
+
+    def take(self, rows) -> "EventTable":
+        table = EventTable()
+
+        for i in rows:
+            table.append(self.note[i], self.channel[i], self.start[i], self.duration[i], self.velocity[i])
+
+        return table
+
+    def filter(self, notes=None, channel: int | None = None) -> "EventTable":
+        """
+        Returns the events played on any of `notes` (all notes if `None`) and on `channel` (all channels if `None`)
+        """
+        note_set = None if notes is None else set(notes)
+
+        return self.take(
+            i for i in range(len(self))
+            if (note_set is None or self.note[i] in note_set) and (channel is None or self.channel[i] == channel)
+        )
+
+    def intervals(self) -> IntervalIndex:
+        """
+        Returns an `IntervalIndex` over the start and end (in seconds) of every event, built on first use and rebuilt after appends
+        """
+        cached = self._intervals
+
+        if cached is None or cached[0] != len(self):
+            ends = array("d", (start + duration for start, duration in zip(self.start, self.duration)))
+            cached = self._intervals = (len(self), IntervalIndex(self.start, ends))
+
+        return cached[1]
+
+    def active(self, time: float) -> "EventTable":
+        """
+        Returns the events sounding at `time` (in seconds), keeping the table's order
+        """
+        return self.take(self.intervals().at(time))
+
+    def window(self, start: float, end: float) -> "EventTable":
+        """
+        Returns the events sounding at any time between `start` and `end` (in seconds), keeping the table's order
+        """
+        return self.take(self.intervals().overlapping(start, end))
@@ -0,0 +1,466 @@
+import hashlib
+import json
+import math
+import time
+from types import SimpleNamespace
+from src.composition import EffectComposition, HammerComposition, LightComposition, MovementComposition
+from src.controller import PositionalController, RoboticController
+from src.live import LivePlayer
+from src.midi import file_hash, load_midi
+from src.instancing import is_instanced
+from src.pipeline import iter_plans
+from src.plan_cache import PlanCache, plan_cache_key
+from src.profiling import Profiler
+from src.scene import ObjectIndex, SceneAdapter, default_scene
+
+ROTATION_PROPERTIES = ("rotation_euler.x", "rotation_euler.y", "rotation_euler.z")
+
+# mirrors the defaults of `BMIDI_Item` in main.py, used for items loaded from JSON
+ITEM_DEFAULTS = {
+    "enabled": True,
+    "type": "hammer_composition",
+    "object_prefix": "",
+    "object_property": "location.x",
+    "pullback_amount": 0.0,
+    "overshoot_amount": 0.0,
+    "note_range_start": 0,
+    "note_range_end": 127,
+    "use_block_list": False,
+    "blocked_notes": "",
+    "channel": "1",
+    "light_object_property": "data.energy",
+    "light_object_fade_effect": False,
+    "robot_target_object_name": "",
+    "effect": "bounce",
+    "axis": "x",
+    "use_instancing": False,
+    "fingerprint": "",
+}
+
+# settings that don't change an item's keyframes
+UNKEYED_SETTINGS = ("enabled", "fingerprint")
+
+def process_note_list(expr: str) -> list[int]:
+    notes = []
+
+    for i in expr.strip().split(","):
+        if "-" in i:
+            start, end = i.split("-")
+            notes.extend(range(int(start), int(end) + 1))
+        else:
+            notes.append(int(i))
+
+    return notes
+
+def item_from_dict(data: dict) -> SimpleNamespace:
+    """
+    Creates an item with the same settings as a `BMIDI_Item` from a plain dict, filling in defaults for missing settings
+    """
+    unknown = set(data) - set(ITEM_DEFAULTS)
+
+    if unknown:
+        raise ValueError(f"Unknown item settings: {', '.join(sorted(unknown))}")
+
+    item = SimpleNamespace(**{**ITEM_DEFAULTS, **data})
+    item.channel = str(item.channel)
+
+    return item
+
+def item_notes(item) -> list[int]:
+    note_start = item.note_range_start
+    note_end = item.note_range_end + 1 # 0 - 128
+    blocked_notes = process_note_list(item.blocked_notes) if item.use_block_list else []
+
+    return [i for i in range(note_start, note_end) if i not in blocked_notes]
+
+def create_item(item, midi_file: str, scene: SceneAdapter | None = None, objects: ObjectIndex | None = None):
+    """
+    Creates the composition or controller described by `item` (a `BMIDI_Item` or an item from `item_from_dict`),
+    finding its objects through `objects` when given
+    """
+    needs_radians = (
+        (True if item.object_property in ROTATION_PROPERTIES else False) or
+        (item.type == "light_composition" and item.light_object_property == "data.spot_size") or
+        (item.type == "effect_composition" and item.effect == "swing")
+    )
+
+    pullback_amount = math.radians(item.pullback_amount) if needs_radians else item.pullback_amount
+    overshoot_amount = math.radians(item.overshoot_amount) if needs_radians else item.overshoot_amount
+    channel = int(item.channel) - 1
+    notes = item_notes(item)
+
+    if item.type == "hammer_composition":
+        return HammerComposition(
+            midi_file,
+            item.object_prefix,
+            item.object_property,
+            pullback_amount,
+            notes,
+            overshoot_amount=overshoot_amount,
+            channel=channel,
+            scene=scene,
+            objects=objects,
+        )
+    elif item.type == "movement_composition":
+        return MovementComposition(
+            midi_file,
+            item.object_prefix,
+            item.object_property,
+            pullback_amount,
+            notes,
+            channel=channel,
+            scene=scene,
+            objects=objects,
+        )
+    elif item.type == "light_composition":
+        return LightComposition(
+            midi_file,
+            item.object_prefix,
+            item.light_object_property,
+            pullback_amount,
+            overshoot_amount,
+            notes,
+            mode="light" if item.light_object_property != "emission.emission" else "emission",
+            fade_effect=item.light_object_fade_effect,
+            channel=channel,
+            scene=scene,
+            objects=objects,
+        )
+    elif item.type == "effect_composition":
+        return EffectComposition(
+            midi_file,
+            item.object_prefix,
+            pullback_amount,
+            item.axis,
+            item.effect,
+            notes,
+            channel=channel,
+            scene=scene,
+            objects=objects,
+        )
+    elif item.type == "robotic_controller":
+        return RoboticController(
+            midi_file,
+            item.object_prefix,
+            item.robot_target_object_name,
+            pullback_amount,
+            item.axis,
+            notes=notes,
+            channel=channel,
+            scene=scene,
+            objects=objects,
+        )
+    elif item.type == "position_controller":
+        return PositionalController(
+            midi_file,
+            item.object_prefix,
+            item.object_property,
+            pullback_amount,
+            overshoot_amount,
+            notes=notes,
+            channel=channel,
+            scene=scene,
+        )
+
+    return None
+
+def item_instruments(target) -> list:
+    return getattr(target, "instruments", [target])
+
+def _owner_key(owner):
+    # blender hands out a new python wrapper on every access, so compare the data behind it
+    return owner.as_pointer() if hasattr(owner, "as_pointer") else id(owner)
+
+def item_fingerprint(item, midi_hash: str, fps: float, instruments: list) -> str:
+    """
+    Hashes everything the keyframes of an item depend on: its settings, the MIDI file contents, the frame rate,
+    and the objects and base values of its instruments
+    """
+    settings = {key: getattr(item, key) for key in ITEM_DEFAULTS if key not in UNKEYED_SETTINGS}
+    state = [
+        (instrument.planner, [getattr(owner, "name", "") for owner in instrument.animation_owners()], instrument.plan_args())
+        for instrument in instruments
+    ]
+    payload = json.dumps([settings, midi_hash, fps, state], sort_keys=True, default=str)
+
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+class Generation:
+    """
+    A keyframe generation run split into small steps, so it can be spread over timer events and cancelled part way
+    (see `generate_items` for what is generated)
+
+    Items are keyed one after another, clearing their objects just before their first keys are written, so cancelling
+    leaves finished items keyed and untouched items as they were. Items cut short, or whose objects were cleared
+    for another item, get their fingerprint reset so the next run regenerates them
+
+    ## Example:
+
+    ```python
+    generation = Generation(scene.bmidi_items, "track.mid", 24)
+
+    for progress in generation.steps(wait=False):
+        ... # update a progress bar, return to the event loop while a key plan is built (`None`), etc.
+
+    generation.timings # what `generate_items` returns
+    ```
+    """
+    def __init__(
+        self,
+        items,
+        midi_file: str,
+        fps: float,
+        workers: int = 1,
+        scene: SceneAdapter | None = None,
+        force: bool = False,
+        window: tuple[float, float] | None = None,
+        profiler: Profiler | None = None,
+        cache: PlanCache | None = None,
+        player: LivePlayer | None = None,
+    ):
+        self.items = items
+        self.midi_file = midi_file
+        self.fps = fps
+        self.workers = workers
+        self.scene = scene or default_scene()
+        self.force = force
+        self.window = window
+        self.profiler = profiler or Profiler()
+        self.cache = cache
+        self.player = player
+        self.timings: list[dict] = []
+        self.finished = False
+        self.finished_items = 0
+
+    def _prepare(self) -> list[tuple[int, object]]:
+        profiler = self.profiler
+        data = load_midi(self.midi_file, profiler, self.workers)
+        entries = self._entries = []
+
+        with profiler.phase("hash"):
+            midi_hash = file_hash(self.midi_file)
+
+        with profiler.phase("index"):
+            objects = ObjectIndex(self.scene.named_objects()) # shared by every item
+
+        with profiler.phase("items"):
+            for index, item in enumerate(self.items):
+                # instanced items are drawn by their instancer (see `src.bpy_instancing`) and have no keys
+                if not item.enabled or is_instanced(item):
+                    continue
+
+                started = time.perf_counter()
+                target = create_item(item, self.midi_file, self.scene, objects)
+                members = item_instruments(target) if target is not None else []
+                lookup = time.perf_counter() - started
+
+                started = time.perf_counter()
+                fingerprint = item_fingerprint(item, midi_hash, self.fps, members)
+                owners = {_owner_key(owner) for instrument in members for owner in instrument.animation_owners()}
+                hashing = time.perf_counter() - started
+
+                entries.append((item, members, fingerprint, owners))
+                self.timings.append({
+                    "item": index,
+                    "type": item.type,
+                    "object_prefix": item.object_prefix,
+                    "instruments": len(members),
+                    "events": sum(len(instrument.events()) for instrument in members),
+                    "keys": 0,
+                    "skipped": False,
+                    "cached": False,
+                    "seconds": lookup + hashing,
+                    "phases": {"lookup": lookup, "fingerprint": hashing, "clear": 0.0, "plan": 0.0, "apply": 0.0},
+                })
+
+        dirty = {
+            i for i, (item, _, fingerprint, _) in enumerate(entries)
+            if self.force or self.player is not None or item.fingerprint != fingerprint
+        }
+
+        # clearing an object removes all of its animation, so unchanged items keying a cleared object are keyed again
+        changed = True
+        while changed:
+            cleared = set().union(*(entries[i][3] for i in dirty))
+            shared = {i for i, entry in enumerate(entries) if i not in dirty and entry[3] & cleared}
+            dirty |= shared
+            changed = bool(shared)
+
+        for i, timing in enumerate(self.timings):
+            timing["skipped"] = i not in dirty
+
+        profiler.count("events", len(data.events))
+        profiler.count("items", len(entries))
+        profiler.count("skipped", len(entries) - len(dirty))
+
+        return [(i, instrument) for i in sorted(dirty) for instrument in entries[i][1]]
+
+    def _finish_item(self, i: int) -> None:
+        item, _, fingerprint, _ = self._entries[i]
+        timing = self.timings[i]
+        phases = timing["phases"]
+
+        timing["seconds"] += phases["clear"] + phases["plan"] + phases["apply"]
+        # a live preview leaves the keys as they were
+        if self.player is None:
+            item.fingerprint = fingerprint if self.window is None else ""
+
+        self.profiler.items.append(timing)
+        self.profiler.count("keys", timing["keys"])
+        self.finished_items += 1
+
+    def steps(self, wait: bool = True):
+        """
+        Generates the keyframes step by step, yielding the progress (0 to 1) after every instrument is keyed
+
+        With `wait=False`, `None` is yielded while waiting for a key plan instead of blocking, so the caller can return to its
+        event loop until the plan is ready
+        """
+        profiler = self.profiler
+        yield 0.0
+
+        instruments = self._prepare()
+        remaining = {}
+        for i, _ in instruments:
+            remaining[i] = remaining.get(i, 0) + 1
+
+        for i, timing in enumerate(self.timings):
+            if timing["skipped"]:
+                profiler.items.append(timing)
+            elif i not in remaining:
+                self._finish_item(i) # no instruments
+
+        profiler.count("instruments", len(instruments))
+        cached = {}
+
+        if self.cache is not None:
+            with profiler.phase("cache"):
+                for i in remaining:
+                    plans = self.cache.get(plan_cache_key(self._entries[i][2], self.window))
+
+                    if plans is not None and len(plans) == remaining[i]:
+                        cached[i] = iter(plans)
+                        self.timings[i]["cached"] = True
+
+            profiler.count("cached", len(cached))
+
+        with profiler.phase("plan"):
+            jobs = [
+                (instrument.planner, instrument.events(), self.fps, instrument.plan_args(), self.window)
+                for i, instrument in instruments
+                if i not in cached
+            ]
+
+        plans = iter_plans(jobs, self.workers, wait)
+        planned = {} # plans of each item, written to the cache once the item is done
+        cleared = set()
+        done = 0
+
+        try:
+            for i, instrument in instruments:
+                if i in cached:
+                    plan = next(cached[i])
+                else:
+                    with profiler.phase("plan"):
+                        plan = next(plans)
+
+                    while plan is None:
+                        yield None
+
+                        with profiler.phase("plan"):
+                            plan = next(plans)
+
+                    if self.cache is not None:
+                        planned.setdefault(i, []).append(plan)
+
+                phases = self.timings[i]["phases"]
+                started = time.perf_counter()
+
+                with profiler.phase("clear"):
+                    for owner in instrument.animation_owners():
+                        key = _owner_key(owner)
+
+                        # an object keyed by several instruments is cleared (or muted) once, before the first writes to it
+                        if key in cleared:
+                            continue
+
+                        if self.player is not None:
+                            self.player.mute(self.scene, owner)
+                        else:
+                            self.scene.clear_animation(owner, self.window)
+
+                        cleared.add(key)
+
+                phases["clear"] += time.perf_counter() - started
+                started = time.perf_counter()
+
+                with profiler.phase("apply"):
+                    if self.player is not None:
+                        self.player.add(plan, instrument.keyframe_targets())
+                    else:
+                        instrument.apply_keyframes(plan)
+
+                phases["apply"] += time.perf_counter() - started
+                phases["plan"] += plan.seconds
+                self.timings[i]["keys"] += plan.key_count()
+
+                done += 1
+                remaining[i] -= 1
+
+                if not remaining[i]:
+                    self._finish_item(i)
+
+                    if i in planned:
+                        with profiler.phase("cache"):
+                            self.cache.put(plan_cache_key(self._entries[i][2], self.window), planned.pop(i))
+
+                yield done / len(instruments)
+
+            self.finished = True
+        finally:
+            plans.close()
+
+            if not self.finished and self.player is None:
+                # unfinished items whose objects were already cleared (by themselves or another item) lost their keys
+                for i, (item, _, _, owners) in enumerate(self._entries):
+                    if remaining.get(i) and owners & cleared:
+                        item.fingerprint = ""
+
+    def run(self) -> list[dict]:
+        for _ in self.steps():
+            pass
+
+        return self.timings
+
+def generate_items(
+    items,
+    midi_file: str,
+    fps: float,
+    workers: int = 1,
+    scene: SceneAdapter | None = None,
+    force: bool = False,
+    window: tuple[float, float] | None = None,
+    profiler: Profiler | None = None,
+    cache: PlanCache | None = None,
+    player: LivePlayer | None = None,
+) -> list[dict]:
+    """
+    Generates the keyframes of every enabled item, building the key plans of all their instruments in `workers` processes
+    (see `src.pipeline.iter_plans`) while only touching the scene from this thread
+
+    Items whose fingerprint (see `item_fingerprint`) matches their last successful run are skipped, unless `force` is set
+    or they key an object cleared for a changed item. Each item's `fingerprint` is updated once it is keyed
+
+    With a `window` (a `(start, end)` frame range) only the keys in that range are replaced and the keys outside it are kept,
+    the fingerprints of regenerated items are reset since the rest of their keys may be stale
+
+    Returns the time each item took (overall and per phase: object lookup, fingerprint, clearing, key planning and key insertion),
+    how many events it read and keys it wrote, and whether it was skipped. A `profiler` also gets the run-wide phases and counts
+
+    With a `cache`, the plans of items are read from and written to disk (see `src.plan_cache.PlanCache`)
+
+    With a `player`, every item's plans are handed to it for live playback (see `src.live.LivePlayer`) instead of being keyed,
+    the existing animation of their objects is muted until `player.restore()` so old keys don't override the player, and
+    their fingerprints are left as they were
+    """
+    return Generation(items, midi_file, fps, workers, scene, force, window, profiler, cache, player).run()
@@ -0,0 +1,215 @@
+import re
+from array import array
+from src.plan import AXES, EFFECT_PROPERTIES, KeyPlan, axis_index
+
+# item types that can be drawn as instances of one Geometry Nodes object instead of being keyed
+INSTANCED_TYPES = ("hammer_composition", "movement_composition", "effect_composition")
+
+# vector properties instances can be offset along
+INSTANCED_PROPERTIES = ("location", "rotation_euler", "scale")
+
+# instances are turned about their own axes, which only matches keying one Euler component for the component applied first
+# (X, in the XYZ and XZY rotation modes)
+INSTANCED_ROTATIONS = ("rotation_euler.x",)
+INSTANCED_ROTATION_MODES = ("XYZ", "XZY")
+
+# frames before and after every key, so exactly one segment of each instance covers any frame
+FOREVER = 1e9
+
+# Newton steps solving for the curve parameter of the current frame, in the node tree and in `InstanceSegments.offset_at`
+NEWTON_STEPS = 2
+
+_DIGITS = re.compile(r"(\d+)")
+
+
+def instance_order_key(name: str) -> list:
+    """
+    Sorts names the way the Collection Info node orders the objects of a collection (case-insensitive, with numbers
+    compared by value, so `Key9` comes before `Key10`)
+    """
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part.lower()) for part in _DIGITS.split(name) if part]
+
+def item_property(item) -> str | None:
+    """
+    Returns the property the instruments of a composition `item` key, e.g. `"rotation_euler.x"`
+    """
+    if item.type == "effect_composition":
+        root = EFFECT_PROPERTIES.get(item.effect)
+        return f"{root}.{item.axis}" if root is not None else None
+
+    return item.object_property
+
+def can_instance(item) -> bool:
+    """
+    Returns whether `item` can be drawn as instances: a composition offsetting a location, scale or X rotation component
+    """
+    if item.type not in INSTANCED_TYPES:
+        return False
+
+    prop = item_property(item)
+
+    return prop is not None and (not prop.startswith("rotation_euler.") or prop in INSTANCED_ROTATIONS)
+
+def is_instanced(item) -> bool:
+    """
+    Returns whether `item` (a `BMIDI_Item` or an item from `item_from_dict`) is drawn as instances instead of being keyed
+    """
+    return item.use_instancing and can_instance(item)
+
+def instance_offset(root: str, value: float, base: float) -> float:
+    """
+    Returns how far `value` is from the `base` value of a `root` property, as the difference for location and rotation
+    and as a factor for scale
+    """
+    if root == "scale":
+        return value / base if base else 1.0
+
+    return value - base
+
+
+def _cubic(p0: float, p1: float, p2: float, p3: float) -> tuple[float, float, float]:
+    """
+    Returns the coefficients of `t`, `t²` and `t³` of the cubic Bézier curve through the points `p0` to `p3`, less `p0`
+    """
+    return 3 * (p1 - p0), 3 * (p0 - 2 * p1 + p2), p3 - p0 + 3 * (p1 - p2)
+
+def _clamp(t: float) -> float:
+    return min(max(t, 0.0), 1.0)
+
+
+class InstanceSegments:
+    """
+    The keys of every instance as segments between consecutive keys, flattened into arrays that are written as point
+    attributes of the instancer and evaluated for the current frame by its Geometry Nodes tree (see `src.bpy_instancing`)
+
+    Every instance gets a segment before its first key and after its last, so exactly one segment of each instance
+    covers any frame, while `first` holds the index of each instance's first segment for looking its offset up
+
+    Segments follow the Bézier curve between their keys, stored as the coefficients of the frame (`frame_curve`, from
+    `start`) and the offset (`offset_curve`, from `offset`) in the curve parameter, three per segment
+
+    `root`: the vector property the instances are offset along (`location`, `rotation_euler` or `scale`)
+    `index`: the component of `root` that is offset
+
+    ## Example:
+
+    ```python
+    segments = InstanceSegments("location", 2)
+
+    for instrument in composition.instruments:
+        segments.add(instrument.plan_keyframes(24), instrument.plan_args()["base"])
+    ```
+    """
+    def __init__(self, root: str, index: int):
+        if root not in INSTANCED_PROPERTIES or (root == "rotation_euler" and f"{root}.{AXES[index]}" not in INSTANCED_ROTATIONS):
+            raise ValueError(f"Can't offset instances along {root}[{index}]")
+
+        self.root = root
+        self.index = index
+        self.group = array("i")
+        self.start = array("d")
+        self.end = array("d")
+        self.offset = array("d")
+        self.frame_curve = array("d")
+        self.offset_curve = array("d")
+        self.first = array("i")
+
+    def __len__(self) -> int:
+        return len(self.group)
+
+    def instance_count(self) -> int:
+        return len(self.first)
+
+    def segment(self, start: float, end: float, start_offset: float, end_offset: float, right=None, left=None) -> None:
+        """
+        Adds a segment of the last instance from `start_offset` at `start` to `end_offset` at `end`, curved by the `right`
+        handle of its first key and the `left` handle of its last (`(frame, offset)` pairs)
+
+        Without handles the segment eases like the flat handles a third of the way in from each key
+        """
+        length = end - start
+        right_frame, right_offset = right or (start + length / 3, start_offset)
+        left_frame, left_offset = left or (end - length / 3, end_offset)
+
+        self.group.append(len(self.first) - 1)
+        self.start.append(start)
+        self.end.append(end)
+        self.offset.append(start_offset)
+        self.frame_curve.extend(_cubic(0.0, right_frame - start, left_frame - start, length))
+        self.offset_curve.extend(_cubic(start_offset, right_offset, left_offset, end_offset))
+
+    def add(self, plan: KeyPlan, base: float, handles=None) -> None:
+        """
+        Adds the next instance, reading its keys from the channel of `plan` that keys `root[index]`
+
+        `handles`: the left and right Bézier handles of every key, as flat frame/value arrays (as `foreach_get` reads them),
+        defaulting to flat handles
+        """
+        frames, values = plan.channels.get(("object", self.root, self.index), ((), ()))
+        offsets = [instance_offset(self.root, value, base) for value in values]
+        rest = instance_offset(self.root, base, base)
+
+        self.first.append(len(self.group))
+
+        if not len(frames):
+            self.segment(-FOREVER, FOREVER, rest, rest)
+            return
+
+        left = right = [None] * len(frames)
+
+        if handles is not None:
+            left, right = (
+                [(points[2 * i], instance_offset(self.root, points[2 * i + 1], base)) for i in range(len(frames))]
+                for points in handles
+            )
+
+        self.segment(-FOREVER, frames[0], offsets[0], offsets[0])
+
+        for i in range(len(frames) - 1):
+            self.segment(frames[i], frames[i + 1], offsets[i], offsets[i + 1], right[i], left[i + 1])
+
+        self.segment(frames[-1], FOREVER, offsets[-1], offsets[-1])
+
+    def offset_at(self, instance: int, frame: float) -> float:
+        """
+        Returns the offset of the `instance`th instance at `frame`, worked out the way the node tree does
+        """
+        last = self.first[instance + 1] if instance + 1 < len(self.first) else len(self)
+
+        for i in range(self.first[instance], last):
+            if not self.start[i] <= frame < self.end[i]:
+                continue
+
+            position = frame - self.start[i]
+            c1, c2, c3 = self.frame_curve[3 * i:3 * i + 3]
+            d1, d2, d3 = self.offset_curve[3 * i:3 * i + 3]
+            t = _clamp(position / (self.end[i] - self.start[i]))
+
+            for _ in range(NEWTON_STEPS):
+                slope = (3 * c3 * t + 2 * c2) * t + c1
+                t = _clamp(t - (((c3 * t + c2) * t + c1) * t - position) / slope) if slope else t
+
+            return ((d3 * t + d2) * t + d1) * t + self.offset[i]
+
+        return 0.0
+
+def composition_segments(composition, fps: float, handles=None) -> tuple[list, InstanceSegments]:
+    """
+    Plans every instrument of `composition` and returns its objects in instance order, with their segments in the same order
+
+    `handles`: a function returning the handles of keys as `InstanceSegments.add` takes them, given their frames and values
+    """
+    instruments = sorted(composition.instruments, key=lambda instrument: instance_order_key(instrument.object.name))
+
+    if not instruments:
+        raise ValueError("The composition has no objects to instance")
+
+    root, index = axis_index(instruments[0].plan_args()["prop"])
+    segments = InstanceSegments(root, index)
+
+    for instrument in instruments:
+        plan = instrument.plan_keyframes(fps)
+        frames, values = plan.channels.get(("object", root, index), ((), ()))
+        segments.add(plan, instrument.plan_args()["base"], handles(frames, values) if handles is not None and len(frames) else None)
+
+    return [instrument.object for instrument in instruments], segments
@@ -1,40 +1,52 @@
-import mido
-import math
-import bpy
-import mathutils
-from collections import defaultdict
+from src.events import EventTable
+from src.midi import file_stamp, load_midi
+from src.performer import Performer
+from src.plan import EFFECT_PROPERTIES
+from src.scene import SceneAdapter
 
 
-def get_midi_channel_ranges(midi_path: str):
-    ranges = defaultdict(lambda: [127, 0])
+_channel_cache: dict[str, tuple] = {} # path -> (stamp, ranges, enum items)
 
+def _channel_summary(midi_path: str, workers: int = 1):
+    # the enum items are cached alongside the ranges so Blender always gets the same strings back, and this is usually the
+    # first decode of the file, so it uses the same `workers` as generating
     try:
-        mid = mido.MidiFile(midi_path)
+        stamp = file_stamp(midi_path)
+    except OSError:
+        stamp = None
+
+    cached = _channel_cache.get(midi_path)
+
+    if cached is not None and cached[0] == stamp:
+        return cached
+
+    try:
+        ranges = dict(load_midi(midi_path, workers=workers).channel_ranges) if stamp is not None else {}
     except Exception:
-        return {}
-
-    for track in mid.tracks:
-        for msg in track:
-            if msg.type == "note_on" and msg.velocity > 0:
-                ch = msg.channel + 1  # mido is 0–15
-                ranges[ch][0] = min(ranges[ch][0], msg.note)
-                ranges[ch][1] = max(ranges[ch][1], msg.note)
-
-    # Remove unused channels
-    return {
-        ch: (mn, mx)
-        for ch, (mn, mx) in ranges.items()
-        if mn <= mx
-    }
+        ranges = {}
+
+    summary = _channel_cache[midi_path] = (
+        stamp,
+        ranges,
+        [(str(ch), str(ch), "") for ch in sorted(ranges)],
+    )
+
+    return summary
+
+def clear_channel_cache(self=None, context=None) -> None:
+    """
+    Forgets every cached channel summary (also usable as the `update` callback of the MIDI file property)
+    """
+    _channel_cache.clear()
+
+def get_midi_channel_ranges(midi_path: str, workers: int = 1):
+    return _channel_summary(midi_path, workers)[1]
 
 def get_channel_items(self, context):
     scene = context.scene
 
     if scene.bmidi_midi_file:
-        channels = get_midi_channel_ranges(scene.bmidi_midi_file)
-
-        if channels:
-            return [(str(ch), str(ch), "") for ch in sorted(channels)]
+        return _channel_summary(scene.bmidi_midi_file, scene.bmidi_workers)[2]
 
     return []
 
@@ -69,60 +81,41 @@ def get_emission_input(mat):
     return None
 
 
-class Instrument:
-    def __init__(self, midi_file: str, note: int | None = None, channel: int | None = None):
-        self._events = []
-
-        midi = mido.MidiFile(midi_file)
-        current_time = 0.0
-        active_notes = {} # start_time, velocity
-
-        for msg in midi:
-            current_time += msg.time
-
-            if msg.type == "note_on" and msg.velocity > 0:
-                if note is not None and msg.note != note:
-                    continue
-
-                if channel is not None and msg.channel != channel:
-                    continue
-
-                active_notes[(msg.note, msg.channel)] = ( current_time, msg.velocity / 127.0 )
-
-            elif msg.type in ("note_off", "note_on") and msg.velocity == 0:
-                if note is not None and msg.note != note:
-                    continue
-
-                if channel is not None and msg.channel != channel:
-                    continue
-
-                key = (msg.note, msg.channel)
-                if key in active_notes:
-                    start_time, velocity = active_notes.pop(key)
+class Instrument(Performer):
+    """
+    An instrument keying one object from the events of a note (or every note) of a channel (or every channel)
+    """
+    def __init__(
+        self,
+        midi_file: str,
+        note: int | None = None,
+        channel: int | None = None,
+        events: EventTable | None = None,
+        scene: SceneAdapter | None = None,
+    ):
+        if events is None:
+            events = load_midi(midi_file).note_events(note, channel)
 
-                    self._events.append({
-                        "note": msg.note,
-                        "start": start_time,
-                        "duration": current_time - start_time,
-                        "velocity": velocity,
-                    })
+        super().__init__(midi_file, events, scene)
 
-    def events(self) -> list[dict[str, float]]:
-        return self._events
+    def keyframe_targets(self) -> dict[str, object]:
+        return {"object": self.object}
 
-    def generate_keyframes(self) -> None:
-        pass
+    def animation_owners(self) -> list:
+        return [self.object]
 
 class HammerInstrument(Instrument):
     """
     Represents a hammer-like instrument that pulls back and springs forward hitting a note
 
-    `object_name`: the object to control
+    `object_name`: the object to control (or its name)
     `object_property`: the blender object property to control, like `rotation_euler.x` or `location.y`
     `pullback_position`: how far the object moves from the initial position before springing back to hit the note
     `overshoot_amount`: how far past the object moves from initial position during a note hit
     `note`: what pitch (numbers 1-127) controls the object, leaving this kwarg blank will result in the object moving based on all the notes in the midi file
     `channel`: what channel (numbers 0-15) controls the object, leaving this kwarg blank will result in the object moving based on all the channels in the midi file
+    `events`: pre-demultiplexed note events to use instead of reading them from the midi file (see `src.midi.demultiplex`)
+    `scene`: the scene adapter holding the object, leaving this kwarg blank will use the running Blender scene
 
     ## Example:
 
@@ -139,6 +132,8 @@ class HammerInstrument(Instrument):
     snare_drum_hammer.generate_keyframes() # generate the keyframes
     ```
     """
+    planner = "hammer"
+
     def __init__(
         self,
         midi_file: str,
@@ -148,81 +143,38 @@ class HammerInstrument(Instrument):
         overshoot_amount: float = 0,
         note: int | None = None,
         channel: int | None = None,
+        events: EventTable | None = None,
+        scene: SceneAdapter | None = None,
     ):
-        super().__init__(midi_file, note, channel)
+        super().__init__(midi_file, note, channel, events, scene)
 
-        self.object = bpy.data.objects[object_name]
+        self.object = self.scene.resolve(object_name)
         self.object_property = object_property
         self.pullback_amount = pullback_amount
         self.overshoot_amount = overshoot_amount
 
-        self.object.animation_data_clear()
-
-    def generate_keyframes(self):
-        scene = bpy.context.scene
-        fps = scene.render.fps
+    def plan_args(self) -> dict:
         obj = self.object
-        pullback = self.pullback_amount
-        overshoot = self.overshoot_amount
         prop = self.object_property
-        keyframe_prop = prop.split(".")[0]
-        base = get_base_position(obj, prop)
-
-        for e in self.events():
-            start = e["start"] * fps
-            duration = 0.08 * fps # ~80ms time
-            velocity_scale = 1 + (1 - e["velocity"]) * 1.5
-
-            frame_start = start - (duration * velocity_scale)
-            frame_pullback = start - duration
-            frame_hit = start
-            frame_oscillate = start + duration
-            frame_end = start + (duration * velocity_scale)
-
-            # start
-            set_prop(obj, prop, base)
-            obj.keyframe_insert(
-                data_path=keyframe_prop,
-                frame=frame_start
-            )
-
-            # pullback
-            set_prop(obj, prop, base + pullback)
-            obj.keyframe_insert(
-                data_path=keyframe_prop,
-                frame=frame_pullback
-            )
-
-            # hit
-            set_prop(obj, prop, base + overshoot)
-            obj.keyframe_insert(
-                data_path=keyframe_prop,
-                frame=frame_hit
-            )
-
-            # oscillate
-            set_prop(obj, prop, base - (overshoot * 0.75))
-            obj.keyframe_insert(
-                data_path=keyframe_prop,
-                frame=frame_oscillate
-            )
-
-            # end
-            set_prop(obj, prop, base)
-            obj.keyframe_insert(
-                data_path=keyframe_prop,
-                frame=frame_end
-            )
+
+        return {
+            "prop": prop,
+            "base": get_base_position(obj, prop),
+            "pullback": self.pullback_amount,
+            "overshoot": self.overshoot_amount,
+        }
 
 class MovementInstrument(Instrument):
     """
     Represents a movement-like instrument that moves when notes are played
 
-    `object_name`: the object to control
+    `object_name`: the object to control (or its name)
     `object_property`: the blender object property to control, like `rotation_euler.x` or `location.y`
     `final_amount`: where the object moves to when a note is hit (the origin is assumed as the object's initial position)
     `note`: what pitch (numbers 1-127) controls the object, leaving this kwarg blank will result in the object moving based on all the notes in the midi file
     `channel`: what channel (numbers 0-15) controls the object, leaving this kwarg blank will result in the object moving based on all the channels in the midi file
+    `events`: pre-demultiplexed note events to use instead of reading them from the midi file (see `src.midi.demultiplex`)
+    `scene`: the scene adapter holding the object, leaving this kwarg blank will use the running Blender scene
 
     ## Example:
 
@@ -238,6 +190,8 @@ class MovementInstrument(Instrument):
     trumpet_horn.generate_keyframes() # generate the keyframes
     ```
     """
+    planner = "movement"
+
     def __init__(
         self,
         midi_file: str,
@@ -246,66 +200,30 @@ class MovementInstrument(Instrument):
         final_amount: float,
         note: int | None = None,
         channel: int | None = None,
+        events: EventTable | None = None,
+        scene: SceneAdapter | None = None,
     ):
-        super().__init__(midi_file, note, channel)
+        super().__init__(midi_file, note, channel, events, scene)
 
-        self.object = bpy.data.objects[object_name]
+        self.object = self.scene.resolve(object_name)
         self.object_property = object_property
         self.final_amount = final_amount
 
-        self.object.animation_data_clear()
-
-    def generate_keyframes(self):
-        fps = bpy.context.scene.render.fps
+    def plan_args(self) -> dict:
         obj = self.object
-        final = self.final_amount
         prop = self.object_property
-        keyframe_prop = prop.split(".")[0]
-        base = get_base_position(obj, prop)
-
-        for e in self.events():
-            start = e["start"] * fps
-            end = (e["start"] + e["duration"]) * fps
-            duration = 1 # 1 frame
-            velocity_scale = 1 + (1 - e["velocity"]) * 1.5
-
-            frame_start = start - (duration * velocity_scale)
-            frame_played = start
-            frame_hold = end
-            frame_end = end + (duration * velocity_scale)
-
-            # start
-            set_prop(obj, prop, base)
-            obj.keyframe_insert(
-                data_path=keyframe_prop,
-                frame=frame_start
-            )
-
-            # note played
-            set_prop(obj, prop, base + final)
-            obj.keyframe_insert(
-                data_path=keyframe_prop,
-                frame=frame_played
-            )
-
-            # hold final position until note ends
-            obj.keyframe_insert(
-                data_path=keyframe_prop,
-                frame=frame_hold
-            )
-
-            # return to original after note ends
-            set_prop(obj, prop, base)
-            obj.keyframe_insert(
-                data_path=keyframe_prop,
-                frame=frame_end
-            )
+
+        return {
+            "prop": prop,
+            "base": get_base_position(obj, prop),
+            "final": self.final_amount,
+        }
 
 class LightInstrument(Instrument):
     """
     Represents a light-like instrument that changes light properties when notes are played
 
-    `object_name`: the light object to control
+    `object_name`: the light object to control (or its name)
     `light_property`: the light property to control, like `data.energy` or `data.spot_size` (for spot lights)
     `initial_amount`: where the light object initializes before and after a note is hit
     `final_amount`: where the light object stays at while a note is hit
@@ -313,6 +231,8 @@ class LightInstrument(Instrument):
     `fade_effect`: add a fade effect at the end of each note
     `note`: what pitch (numbers 1-127) controls the object, leaving this kwarg blank will result in the object moving based on all the notes in the midi file
     `channel`: what channel (numbers 0-15) controls the object, leaving this kwarg blank will result in the object moving based on all the channels in the midi file
+    `events`: pre-demultiplexed note events to use instead of reading them from the midi file (see `src.midi.demultiplex`)
+    `scene`: the scene adapter holding the object, leaving this kwarg blank will use the running Blender scene
 
     ## Example:
 
@@ -330,6 +250,8 @@ class LightInstrument(Instrument):
     synth_glow.generate_keyframes() # generate the keyframes
     ```
     """
+    planner = "light"
+
     def __init__(
         self,
         midi_file: str,
@@ -341,27 +263,32 @@ class LightInstrument(Instrument):
         fade_effect: bool = False,
         note: int | None = None,
         channel: int | None = None,
+        events: EventTable | None = None,
+        scene: SceneAdapter | None = None,
     ):
-        super().__init__(midi_file, note, channel)
+        super().__init__(midi_file, note, channel, events, scene)
 
-        self.object = bpy.data.objects[object_name]
+        self.object = self.scene.resolve(object_name)
         self.light_property = light_property
         self.initial_amount = initial_amount
         self.final_amount = final_amount
         self.mode = mode
         self.fade_effect = fade_effect
 
-        self.object.data.animation_data_clear()
+    def plan_args(self) -> dict:
+        return {
+            "target": "emission" if self.mode == "emission" else "data",
+            "data_path": "default_value" if self.mode == "emission" else self.light_property.split(".")[1],
+            "initial": self.initial_amount,
+            "final": self.final_amount,
+            "fade_effect": self.fade_effect,
+        }
 
-    def generate_keyframes(self):
-        fps = bpy.context.scene.render.fps
+    def animation_owners(self) -> list:
+        return [self.object.data]
+
+    def keyframe_targets(self) -> dict[str, object]:
         obj = self.object
-        initial = self.initial_amount
-        final = self.final_amount
-        fade_effect = self.fade_effect
-        prop = self.light_property
-        target = obj.data
-        keyframe_prop = prop.split(".")[1]
 
         if self.mode == "emission":
             mat = next((m for m in obj.data.materials if m), None)
@@ -370,67 +297,22 @@ class LightInstrument(Instrument):
             if socket is None:
                 raise ValueError("No emission input found.")
 
-            target = socket
-            keyframe_prop = "default_value"
-
-        for e in self.events():
-            start = e["start"] * fps
-            end = (e["start"] + e["duration"]) * fps
-            duration = 1 # 1 frame
-            velocity_scale = 1 + (1 - e["velocity"]) * 1.5
-
-            frame_start = start - (duration * velocity_scale)
-            frame_played = start
-            frame_hold = end
-            frame_end = end + (duration * velocity_scale)
-
-            # start
-            if self.mode == "emission":
-                target.default_value = initial
-            else:
-                 set_prop(obj, prop, initial)
-            target.keyframe_insert(
-                data_path=keyframe_prop,
-                frame=frame_start
-            )
-
-            # note played
-            if self.mode == "emission":
-                target.default_value = initial + final
-            else:
-                 set_prop(obj, prop, initial + final)
-            target.keyframe_insert(
-                data_path=keyframe_prop,
-                frame=frame_played
-            )
-
-            if not fade_effect:
-                # hold final position until note ends
-                target.keyframe_insert(
-                    data_path=keyframe_prop,
-                    frame=frame_hold
-                )
-
-            # return to original after note ends
-            if self.mode == "emission":
-                target.default_value = initial
-            else:
-                 set_prop(obj, prop, initial)
-            target.keyframe_insert(
-                data_path=keyframe_prop,
-                frame=frame_end
-            )
+            return {"emission": socket}
+
+        return {"data": obj.data}
 
 class EffectInstrument(Instrument):
     """
     Represents an effect-like instrument that is effected when notes are played (used in combo with other instruments to create physics like effects)
 
-    `object_name`: the object to control
+    `object_name`: the object to control (or its name)
     `effected_amount`: the amount the object is effected
     `effected_axis`: what axis is effected
     `effect`: effect on the object ("bounce" for a bounce-like effect, "swing" for a swing-like effect, or "expand" for a expand-like effect)
     `note`: what pitch (numbers 1-127) controls the object, leaving this kwarg blank will result in the object moving based on all the notes in the midi file
     `channel`: what channel (numbers 0-15) controls the object, leaving this kwarg blank will result in the object moving based on all the channels in the midi file
+    `events`: pre-demultiplexed note events to use instead of reading them from the midi file (see `src.midi.demultiplex`)
+    `scene`: the scene adapter holding the object, leaving this kwarg blank will use the running Blender scene
 
     ## Example:
 
@@ -447,6 +329,8 @@ class EffectInstrument(Instrument):
     kick_drum_effect.generate_keyframes() # generate the keyframes
     """
 
+    planner = "effect"
+
     def __init__(self,
         midi_file: str,
         object_name: str,
@@ -454,88 +338,25 @@ class EffectInstrument(Instrument):
         effected_axis: str,
         effect: str,
         note: int | None = None,
-        channel: int | None = None
+        channel: int | None = None,
+        events: EventTable | None = None,
+        scene: SceneAdapter | None = None,
     ):
-        super().__init__(midi_file, note, channel)
+        super().__init__(midi_file, note, channel, events, scene)
 
-        self.object = bpy.data.objects[object_name]
+        self.object = self.scene.resolve(object_name)
         self.effected_axis = effected_axis
         self.effected_amount = effected_amount
         self.effect = effect
 
-        self.object.animation_data_clear()
-
-    def generate_keyframes(self):
-        events = self.events()
-        fps = bpy.context.scene.render.fps
+    def plan_args(self) -> dict:
         obj = self.object
-        amount = self.effected_amount
-        axis = self.effected_axis
-        effect = self.effect
-
-        base_location = get_prop(obj, f"location.{axis}")
-        base_rotation = get_prop(obj, f"rotation_euler.{axis}")
-        base_scale = get_prop(obj, f"scale.{axis}")
-
-        for e in events:
-            start = e["start"] * fps
-            duration = 0.5 * fps # ~100ms
-            # velocity = 1 + (1 - e["velocity"]) * 1.5
-
-            frame_initial = start - (duration * 0.1)
-            frame_hit = start
-            frame_return = start + duration
-
-            if effect == "bounce":
-                base = base_location
-
-                frames = [
-                    (frame_initial, base),
-                    (frame_hit, base + amount),
-                    (frame_hit + duration * 0.15, base - amount * 0.5),
-                    (frame_hit + duration * 0.3, base + amount * 0.25),
-                    (frame_hit + duration * 0.45, base),
-                    (frame_return, base),
-                ]
-
-                for f, value in frames:
-                    set_prop(obj, f"location.{axis}", value)
-                    obj.keyframe_insert(
-                        data_path="location",
-                        frame=f
-                    )
-            elif effect == "swing":
-                base = base_rotation
-
-                frames = [
-                    (frame_initial, base),
-                    (frame_hit, base + amount),
-                    (frame_hit + duration * 0.2, base - amount * 0.6),
-                    (frame_hit + duration * 0.4, base + amount * 0.3),
-                    (frame_hit + duration * 0.6, base),
-                    (frame_return, base),
-                ]
-
-                for f, value in frames:
-                    set_prop(obj, f"rotation_euler.{axis}", value)
-                    obj.keyframe_insert(
-                        data_path="rotation_euler",
-                        frame=f
-                    )
-            elif effect == "expand":
-                base = base_scale
-
-                frames = [
-                    (frame_initial, base),
-                    (frame_hit, base + amount),
-                    (frame_hit + duration * 0.2, base - amount * 0.3),
-                    (frame_hit + duration * 0.4, base),
-                    (frame_return, base),
-                ]
-
-                for f, value in frames:
-                    set_prop(obj, f"scale.{axis}", value)
-                    obj.keyframe_insert(
-                        data_path="scale",
-                        frame=f
-                    )
+        root = EFFECT_PROPERTIES.get(self.effect)
+        prop = f"{root}.{self.effected_axis}" if root is not None else None
+
+        return {
+            "effect": self.effect,
+            "prop": prop,
+            "base": get_prop(obj, prop) if prop is not None else 0.0,
+            "amount": self.effected_amount,
+        }
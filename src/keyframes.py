@@ -0,0 +1,192 @@
+import bpy
+from array import array
+from bpy_extras import anim_utils
+from src.plan import KeyPlan
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def ensure_fcurve(id_data, data_path: str, index: int):
+    anim_data = id_data.animation_data or id_data.animation_data_create()
+
+    if anim_data.action is None:
+        anim_data.action = bpy.data.actions.new(f"{id_data.name}Action")
+
+    if anim_data.action_slot is None:
+        anim_data.action_slot = anim_data.action.slots.new(id_data.id_type, id_data.name)
+
+    channelbag = anim_utils.action_ensure_channelbag_for_slot(anim_data.action, anim_data.action_slot)
+    fcurve = channelbag.fcurves.find(data_path, index=index)
+
+    if fcurve is None:
+        fcurve = channelbag.fcurves.new(data_path, index=index)
+
+    return fcurve
+
+def owner_fcurves(id_data) -> list:
+    anim_data = id_data.animation_data
+
+    if anim_data is None or anim_data.action is None or anim_data.action_slot is None:
+        return []
+
+    channelbag = anim_utils.action_get_channelbag_for_slot(anim_data.action, anim_data.action_slot)
+
+    return list(channelbag.fcurves) if channelbag is not None else []
+
+def remove_keyframes(id_data, start: float, end: float) -> None:
+    """
+    Removes the keys between frames `start` and `end` from every F-Curve of `id_data`, keeping the keys outside that range
+    """
+    for fcurve in owner_fcurves(id_data):
+        points = fcurve.keyframe_points
+        count = len(points)
+
+        if not count:
+            continue
+
+        co = np.empty(count * 2, dtype=np.float32) if np is not None else array("f", [0.0]) * (count * 2)
+        points.foreach_get("co", co)
+
+        if np is not None:
+            inside = np.flatnonzero((co[0::2] >= start) & (co[0::2] <= end)).tolist()
+        else:
+            inside = [i for i in range(count) if start <= co[i * 2] <= end]
+
+        if not inside:
+            continue
+
+        # removed in place, as rewriting the kept keys from `co` would lose their interpolation, handles and easing
+        for i in reversed(inside):
+            points.remove(points[i], fast=True)
+
+        fcurve.update()
+
+def _merge_keys(existing, frames, values):
+    """
+    Gives the keys of `existing` (a flat `co` array) on the same frame as a new key that key's value, returning
+    `(existing, added)` where `added` holds the other new keys
+    """
+    # later keys win on equal frames, like `keyframe_insert` replacing a key
+    if np is not None:
+        frames = np.asarray(frames, dtype=np.float32)
+        values = np.asarray(values, dtype=np.float32)
+
+        order = np.argsort(frames, kind="stable")
+        frames = frames[order]
+        values = values[order]
+        last = np.append(frames[1:] != frames[:-1], True)
+        frames = frames[last]
+        values = values[last]
+
+        replaced = np.zeros(len(frames), dtype=bool)
+
+        if len(existing):
+            existing_frames = existing[0::2]
+            by_frame = np.argsort(existing_frames, kind="stable")
+            sorted_frames = existing_frames[by_frame]
+            found = np.minimum(np.searchsorted(sorted_frames, frames), len(sorted_frames) - 1)
+            replaced = sorted_frames[found] == frames
+            existing[by_frame[found[replaced]] * 2 + 1] = values[replaced]
+
+        added = np.empty(int((~replaced).sum()) * 2, dtype=np.float32)
+        added[0::2] = frames[~replaced]
+        added[1::2] = values[~replaced]
+
+        return existing, added
+
+    keys = dict(zip(array("f", frames), array("f", values)))
+
+    for i in range(0, len(existing), 2):
+        if existing[i] in keys:
+            existing[i + 1] = keys.pop(existing[i])
+
+    added = array("f")
+    for frame in sorted(keys):
+        added.append(frame)
+        added.append(keys[frame])
+
+    return existing, added
+
+def write_keyframes(fcurve, frames, values) -> None:
+    """
+    Writes all `frames`/`values` pairs to `fcurve` at once, replacing the values of any existing keys on the same frames
+
+    Existing keys stay in place, so they keep their interpolation, handles and easing
+    """
+    points = fcurve.keyframe_points
+    count = len(points)
+    existing = np.empty(count * 2, dtype=np.float32) if np is not None else array("f", [0.0]) * (count * 2)
+
+    if count:
+        points.foreach_get("co", existing)
+
+    existing, added = _merge_keys(existing, frames, values)
+
+    points.add(len(added) // 2)
+    points.foreach_set("co", np.concatenate((existing, added)) if np is not None else existing + added)
+    fcurve.update()
+
+class KeyframeSink:
+    """
+    Collects keyframes per `(ID, data_path, array_index)` and writes each F-Curve in one bulk call,
+    avoiding the per-key cost of `keyframe_insert`
+
+    ## Example:
+
+    ```python
+    sink = KeyframeSink()
+    sink.add(obj, "location", 2, [10, 20], [1.0, 0.0]) # keys location.z at frames 10 and 20
+    sink.add(obj.data, "energy", 0, [10], [1000]) # keys a single value
+    sink.flush() # write the keyframes
+    ```
+    """
+    def __init__(self):
+        self._curves: dict[tuple[int, str, int], tuple[object, str, int, list, list]] = {}
+
+    def add(self, owner, data_path: str, index: int, frames, values) -> None:
+        """
+        Queues `frames`/`values` for `owner.<data_path>[index]`, where `owner` is any Blender struct (an object, light data, node socket, etc.)
+        """
+        if not len(frames):
+            return
+
+        id_data = owner.id_data
+        full_path = data_path if owner == id_data else owner.path_from_id(data_path)
+        key = (id_data.as_pointer(), full_path, index)
+        curve = self._curves.get(key)
+
+        if curve is None:
+            curve = self._curves[key] = (id_data, full_path, index, [], [])
+
+        curve[3].append(frames)
+        curve[4].append(values)
+
+    def key_count(self) -> int:
+        return sum(len(frames) for curve in self._curves.values() for frames in curve[3])
+
+    def flush(self) -> None:
+        for id_data, data_path, index, frames, values in self._curves.values():
+            if len(frames) == 1:
+                frames, values = frames[0], values[0]
+            elif np is not None:
+                frames, values = np.concatenate(frames), np.concatenate(values)
+            else:
+                frames, values = sum(frames, array("d")), sum(values, array("d"))
+
+            write_keyframes(ensure_fcurve(id_data, data_path, index), frames, values)
+
+        self._curves.clear()
+
+def apply_plan(plan: KeyPlan, targets: dict[str, object]) -> None:
+    """
+    `SceneAdapter.apply_plan` for Blender, writing all of the plan's F-Curves with one `KeyframeSink`
+    """
+    sink = KeyframeSink()
+
+    for (target, data_path, index), (frames, values) in plan.channels.items():
+        sink.add(targets[target], data_path, index, frames, values)
+
+    sink.flush()
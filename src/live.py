@@ -0,0 +1,112 @@
+from array import array
+from bisect import bisect_right
+from src.plan import KeyPlan
+from src.scene import SceneAdapter
+
+
+def sample_keys(frames, values, frame: float) -> float:
+    """
+    Returns the value of the keys `frames`/`values` (sorted by frame, as `build_plan` leaves them) at `frame`, holding the
+    first and last values outside the keys
+
+    Keys are eased in and out, like the Bézier keys Blender writes with auto clamped handles (which are flat at every
+    peak and rest of an envelope)
+    """
+    i = bisect_right(frames, frame)
+
+    if i == 0:
+        return values[0]
+
+    if i == len(frames):
+        return values[-1]
+
+    t = (frame - frames[i - 1]) / (frames[i] - frames[i - 1])
+    t = t * t * (3 - 2 * t)
+
+    return values[i - 1] + (values[i] - values[i - 1]) * t
+
+def get_value(owner, data_path: str, index: int) -> float:
+    value = getattr(owner, data_path)
+
+    return value[index] if hasattr(value, "__getitem__") else value
+
+def set_value(owner, data_path: str, index: int, value: float) -> None:
+    container = getattr(owner, data_path)
+
+    if hasattr(container, "__setitem__"):
+        container[index] = value
+    else:
+        setattr(owner, data_path, value)
+
+
+class LivePlayer:
+    """
+    Plays key plans back by setting properties directly for the current frame, instead of writing them to F-Curves,
+    so instruments can be previewed without baking their keys (see `generate_items` with a `player`)
+
+    Every channel is sampled with a binary search over its keys, so a frame costs O(log n) per channel however long
+    the song is, and properties are only written when their value changes
+
+    The existing animation of the objects is muted while they're played (see `mute`) and brought back by `restore`
+
+    ## Example:
+
+    ```python
+    player = LivePlayer()
+    generate_items(items, "track.mid", 24, player=player) # plans every item without keying it
+
+    player.evaluate(120) # poses the objects for frame 120, e.g. from a `frame_change_pre` handler
+    player.restore() # puts every property back to its value before playback and unmutes its animation
+    ```
+    """
+    def __init__(self):
+        self._channels: list[tuple[object, str, int, array, array]] = []
+        self._last: list[float | None] = []
+        self._rest: dict[tuple[int, str, int], tuple[object, str, int, float]] = {}
+        self._muted: list[tuple[SceneAdapter, object, object]] = []
+
+    def __len__(self) -> int:
+        return len(self._channels)
+
+    def add(self, plan: KeyPlan, targets: dict[str, object]) -> None:
+        """
+        Adds every channel of `plan`, resolving each channel's target name through `targets` (see `Instrument.keyframe_targets`)
+        """
+        for (target, data_path, index), (frames, values) in plan.channels.items():
+            if not len(frames):
+                continue
+
+            owner = targets[target]
+            key = (id(owner), data_path, index)
+
+            if key not in self._rest:
+                self._rest[key] = (owner, data_path, index, get_value(owner, data_path, index))
+
+            self._channels.append((owner, data_path, index, array("d", frames), array("d", values)))
+            self._last.append(None)
+
+    def mute(self, scene: SceneAdapter, owner) -> None:
+        """
+        Mutes the animation of `owner` in `scene` until `restore`, so its keys don't override the player
+        """
+        self._muted.append((scene, owner, scene.mute_animation(owner)))
+
+    def evaluate(self, frame: float) -> None:
+        last = self._last
+
+        for i, (owner, data_path, index, frames, values) in enumerate(self._channels):
+            value = sample_keys(frames, values, frame)
+
+            if value != last[i]:
+                set_value(owner, data_path, index, value)
+                last[i] = value
+
+    def restore(self) -> None:
+        for owner, data_path, index, value in self._rest.values():
+            set_value(owner, data_path, index, value)
+
+        for scene, owner, muted in reversed(self._muted):
+            scene.unmute_animation(owner, muted)
+
+        self._muted = []
+        self._last = [None] * len(self._channels)
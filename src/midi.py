@@ -0,0 +1,181 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from src.events import EventTable
+from src.profiling import Profiler
+from src.smf import read_messages
+from src.tempo import TempoMap
+
+MIDI_CACHE_SIZE = 8
+
+_cache: "OrderedDict[str, tuple[tuple[int, int], MidiData]]" = OrderedDict()
+_hashes: dict[str, tuple[tuple[int, int], str]] = {}
+
+
+def read_note_messages(midi_file: str, tempo_map: TempoMap | None = None, workers: int = 1):
+    """
+    Yields `(time, channel, note, velocity)` for every note message of `midi_file` in playback order,
+    with `time` in seconds and a `velocity` of 0 marking the end of a note (see `src.smf.read_messages`)
+    """
+    return read_messages(midi_file, tempo_map, workers)
+
+
+class MidiData:
+    """
+    A MIDI file decoded once into paired note events
+
+    `events`: every paired note event in the file, in the order the notes ended
+    `buckets`: the same events demultiplexed by `(channel, note)`, with `(None, note)` holding a note's events across all channels
+    `channel_ranges`: the lowest and highest note played on each channel (channels numbered 1-16)
+    `tempo_map`: the tempo changes of the file, for converting between ticks and seconds (see `src.tempo.TempoMap`)
+    `phases`: how long decoding the file took, set by `load_midi` (`parse` and `pair`, or `decode` for both when they were streamed together)
+    """
+    def __init__(self, messages, tempo_map: TempoMap | None = None):
+        self.tempo_map = tempo_map if tempo_map is not None else TempoMap()
+        self.phases: dict[str, float] = {}
+        self.events = EventTable()
+        self.buckets: dict[tuple[int | None, int], EventTable] = {}
+        self.channel_ranges: dict[int, tuple[int, int]] = {}
+        self._channels: dict[int | None, EventTable] = {None: self.events}
+
+        active_notes = {} # start_time, velocity
+
+        for current_time, channel, note, velocity in messages:
+            if velocity > 0:
+                active_notes[(note, channel)] = ( current_time, velocity / 127.0 )
+
+                ch = channel + 1  # channels are 0–15
+                low, high = self.channel_ranges.get(ch, (127, 0))
+                self.channel_ranges[ch] = (min(low, note), max(high, note))
+
+            else:
+                key = (note, channel)
+                if key in active_notes:
+                    start_time, start_velocity = active_notes.pop(key)
+
+                    event = (note, channel, start_time, current_time - start_time, start_velocity)
+                    self.events.append(*event)
+
+                    for bucket in ((channel, note), (None, note)):
+                        table = self.buckets.get(bucket)
+                        if table is None:
+                            table = self.buckets[bucket] = EventTable()
+                        table.append(*event)
+
+    def note_events(self, note: int | None = None, channel: int | None = None) -> EventTable:
+        """
+        Returns the events of `note` on `channel` (either of them `None` for all), see `EventTable.intervals` for finding
+        the events sounding at a time
+        """
+        if note is not None:
+            return self.buckets.get((channel, note), EventTable())
+
+        # kept so each channel's interval index is only built once
+        table = self._channels.get(channel)
+
+        if table is None:
+            table = self._channels[channel] = self.events.filter(channel=channel)
+
+        return table
+
+def file_stamp(midi_file: str) -> tuple[int, int]:
+    stat = os.stat(midi_file)
+
+    return (stat.st_mtime_ns, stat.st_size)
+
+def file_hash(midi_file: str) -> str:
+    """
+    Returns a SHA-1 of the contents of `midi_file`, only reading the file again if its modification time or size changed
+    """
+    path = os.path.abspath(midi_file)
+    stamp = file_stamp(path)
+    cached = _hashes.get(path)
+
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+
+    _hashes[path] = (stamp, digest)
+
+    return digest
+
+def load_midi(midi_file: str, profiler: Profiler | None = None, workers: int = 1) -> MidiData:
+    """
+    Returns the decoded MIDI data for `midi_file`, parsing the file only if it changed since it was last loaded
+
+    Files are keyed by path, modification time and size, and the least recently used files are evicted once more than `MIDI_CACHE_SIZE` are cached
+
+    A `profiler` records the parse and pairing phases when the file is decoded, or the phases of the earlier decode (see
+    `Profiler.midi`) when it was already cached. Large files are decoded over `workers` processes (see `src.smf.read_messages`)
+    """
+    path = os.path.abspath(midi_file)
+    stamp = file_stamp(path)
+    cached = _cache.get(path)
+
+    if cached is not None and cached[0] == stamp:
+        _cache.move_to_end(path)
+
+        if profiler is not None:
+            profiler.midi = {"cached": True, "phases": cached[1].phases}
+
+        return cached[1]
+
+    tempo_map = TempoMap()
+
+    if profiler is None:
+        started = time.perf_counter()
+        data = MidiData(read_note_messages(path, tempo_map, workers), tempo_map)
+        data.phases["decode"] = time.perf_counter() - started
+    else:
+        # decode up front so parsing and pairing are timed separately
+        started = time.perf_counter()
+        with profiler.phase("parse"):
+            messages = list(read_note_messages(path, tempo_map, workers))
+
+        paired = time.perf_counter()
+        with profiler.phase("pair"):
+            data = MidiData(messages, tempo_map)
+
+        data.phases = {"parse": paired - started, "pair": time.perf_counter() - paired}
+        profiler.midi = {"cached": False, "phases": data.phases}
+
+    _cache[path] = (stamp, data)
+    _cache.move_to_end(path)
+
+    while len(_cache) > MIDI_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+    return data
+
+def prefetch_midi(midi_file: str) -> threading.Thread:
+    """
+    Starts loading `midi_file` into the cache on a background thread, so parsing overlaps with work on the main thread
+    (join the thread, or poll `is_alive()`, before using the file)
+
+    The file is decoded in that thread without worker processes, as those are only started from the main thread, so
+    only prefetch when `load_midi` would decode with one worker anyway
+    """
+    def load():
+        try:
+            load_midi(midi_file)
+        except Exception:
+            pass # raised again when the file is loaded on the main thread
+
+    thread = threading.Thread(target=load, daemon=True)
+    thread.start()
+
+    return thread
+
+def demultiplex(midi_file: str) -> dict[tuple[int | None, int], EventTable]:
+    """
+    Returns the note events of `midi_file` bucketed by `(channel, note)`, so a composition can build all of its instruments from one scan of the file
+    """
+    return load_midi(midi_file).buckets
+
+def clear_midi_cache() -> None:
+    _cache.clear()
+    _hashes.clear()
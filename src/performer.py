@@ -0,0 +1,71 @@
+from src.events import EventTable
+from src.midi import load_midi
+from src.plan import KeyPlan, build_plan
+from src.scene import SceneAdapter, default_scene
+from src.tempo import TempoMap
+
+
+class Performer:
+    """
+    Something keyed from the note events of a MIDI file, the shared base of instruments (`src.instrument`) and
+    controllers (`src.controller`)
+
+    Subclasses name their `planner` (see `src.plan.PLANNERS`) and supply its settings (`plan_args`), the structs its
+    channels are written to (`keyframe_targets`) and the data blocks whose animation they replace (`animation_owners`)
+    """
+    planner: str | None = None
+
+    def __init__(self, midi_file: str, events: EventTable, scene: SceneAdapter | None = None):
+        self.midi_file = midi_file
+        self._events = events
+        self.scene = scene or default_scene()
+
+    def events(self) -> EventTable:
+        return self._events
+
+    def sounding(self, frame: float) -> EventTable:
+        """
+        Returns the events sounding at `frame` of the scene (see `EventTable.active`)
+        """
+        return self.events().active(frame / self.scene.fps())
+
+    def tempo_map(self) -> TempoMap:
+        """
+        Returns the tempo map of the MIDI file, for converting between MIDI ticks and the seconds events are timed in
+        """
+        return load_midi(self.midi_file).tempo_map
+
+    def plan_args(self) -> dict:
+        """
+        Returns the settings and base values `planner` needs, read from the scene up front so planning itself never touches Blender
+        """
+        return {}
+
+    def plan_keyframes(self, fps: float, window: tuple[float, float] | None = None) -> KeyPlan:
+        return build_plan(self.planner, self.events(), fps, self.plan_args(), window)
+
+    def keyframe_targets(self) -> dict[str, object]:
+        """
+        Returns the struct each channel target name of the plan is written to (e.g. `{"object": obj, "data": obj.data}`)
+        """
+        raise NotImplementedError
+
+    def animation_owners(self) -> list:
+        """
+        Returns the data blocks whose animation is replaced when the keyframes are generated
+        """
+        raise NotImplementedError
+
+    def clear_keyframes(self, window: tuple[float, float] | None = None) -> None:
+        for owner in self.animation_owners():
+            self.scene.clear_animation(owner, window)
+
+    def apply_keyframes(self, plan: KeyPlan) -> None:
+        self.scene.apply_plan(plan, self.keyframe_targets())
+
+    def generate_keyframes(self, window: tuple[float, float] | None = None) -> None:
+        """
+        Replaces the keyframes, or with a `window` (a `(start, end)` frame range) only the keys in that range
+        """
+        self.clear_keyframes(window)
+        self.apply_keyframes(self.plan_keyframes(self.scene.fps(), window))
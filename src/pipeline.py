@@ -0,0 +1,94 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from src.events import EventTable
+from src.plan import KeyPlan, build_plan
+from src.processes import detached_main
+
+# never import bpy here, this module is imported by the worker processes
+
+PlanJob = tuple[str | None, EventTable, float, dict, tuple[float, float] | None] # planner, events, fps, plan args, window
+
+
+def _plan_chunk(jobs: list[PlanJob]) -> list[KeyPlan]:
+    plans = []
+
+    for planner, events, fps, args, window in jobs:
+        started = time.perf_counter()
+        plan = build_plan(planner, events, fps, args, window)
+        plan.seconds = time.perf_counter() - started
+        plans.append(plan)
+
+    return plans
+
+def plan_jobs(jobs: list[PlanJob], workers: int = 1) -> list[KeyPlan]:
+    """
+    Builds the key plan of every job, spreading them over `workers` processes (all CPUs if `0`)
+
+    Falls back to planning in this process when there is only one worker or the process pool can't be started
+    """
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+
+    if workers <= 1:
+        return _plan_chunk(jobs)
+
+    # several chunks per worker so one large item doesn't leave the other workers idle
+    size = max(1, -(-len(jobs) // (workers * 4)))
+    chunks = [jobs[i:i + size] for i in range(0, len(jobs), size)]
+
+    try:
+        with detached_main(), ProcessPoolExecutor(workers, mp_context=get_context("spawn")) as pool:
+            futures = [pool.submit(_plan_chunk, chunk) for chunk in chunks]
+
+        return [plan for future in futures for plan in future.result()]
+    except (BrokenProcessPool, OSError):
+        return _plan_chunk(jobs)
+
+def iter_plans(jobs: list[PlanJob], workers: int = 1, wait: bool = True):
+    """
+    Yields the key plan of every job in order, like `plan_jobs`, but one at a time so the caller can do other work in between
+
+    With `wait=False`, `None` is yielded while the next plan is still being built instead of blocking. A single worker then
+    plans in a thread, so the caller isn't held up by one large plan. Closing the iterator cancels the plans that haven't started
+    """
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+
+    if workers <= 1 and wait:
+        for job in jobs:
+            yield _plan_chunk([job])[0]
+        return
+
+    if workers <= 1:
+        # the planners never touch the scene, so they can share the caller's process
+        chunks = [[job] for job in jobs]
+        pool = ThreadPoolExecutor(1)
+        futures = [pool.submit(_plan_chunk, chunk) for chunk in chunks]
+    else:
+        size = max(1, -(-len(jobs) // (workers * 4)))
+        chunks = [jobs[i:i + size] for i in range(0, len(jobs), size)]
+
+        try:
+            with detached_main():
+                pool = ProcessPoolExecutor(workers, mp_context=get_context("spawn"))
+                futures = [pool.submit(_plan_chunk, chunk) for chunk in chunks]
+        except OSError:
+            yield from iter_plans(jobs, 1, wait)
+            return
+
+    try:
+        for i, future in enumerate(futures):
+            while not wait and not future.done():
+                yield None
+
+            try:
+                plans = future.result()
+            except BrokenProcessPool:
+                plans = _plan_chunk(chunks[i])
+
+            yield from plans
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,478 @@
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+from src.events import EventTable
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+AXES = ("x", "y", "z")
+EFFECT_PROPERTIES = {
+    "bounce": "location",
+    "swing": "rotation_euler",
+    "expand": "scale",
+}
+
+# envelope key anchors
+START = 0
+END = 1
+
+# seconds of events planned either side of a window, so envelopes reaching into the window are still keyed
+WINDOW_PADDING = 1.0
+
+# planners that key every event from the events before and after it (its first and last events also get rest keys), so
+# they're always planned over every event and only cropped to a window
+SEQUENTIAL_PLANNERS = ("positional", "robotic")
+
+# frames (and values) closer than this are treated as the same when decimating keys
+DECIMATE_TOLERANCE = 1e-6
+
+
+class KeyPlan:
+    """
+    The keyframes an instrument will write, as flat frame/value arrays per channel
+
+    Channels are keyed by `(target, data_path, index)`, where `target` names what is keyed (`"object"`, `"data"` or `"emission"`)
+    and is resolved to a Blender struct only when the plan is applied
+    """
+    def __init__(self):
+        self.channels: dict[tuple[str, str, int], tuple] = {}
+        self.seconds = 0.0 # time spent building the plan, set by `src.pipeline`
+
+    def add(self, target: str, data_path: str, index: int, frames, values) -> None:
+        self.channels[(target, data_path, index)] = (frames, values)
+
+    def key_count(self) -> int:
+        return sum(len(frames) for frames, _ in self.channels.values())
+
+    def crop(self, start: float, end: float) -> "KeyPlan":
+        """
+        Returns a copy of the plan with only the keys between frames `start` and `end`
+        """
+        plan = KeyPlan()
+
+        for channel, (frames, values) in self.channels.items():
+            if np is not None:
+                frames = np.asarray(frames, dtype=np.float64)
+                keep = (frames >= start) & (frames <= end)
+                plan.channels[channel] = (frames[keep], np.asarray(values, dtype=np.float64)[keep])
+            else:
+                rows = [i for i, frame in enumerate(frames) if start <= frame <= end]
+                plan.channels[channel] = (array("d", (frames[i] for i in rows)), array("d", (values[i] for i in rows)))
+
+        return plan
+
+    def decimate(self, tolerance: float = DECIMATE_TOLERANCE) -> "KeyPlan":
+        """
+        Returns a copy of the plan with every channel passed through `decimate_keys`
+        """
+        plan = KeyPlan()
+        plan.seconds = self.seconds
+
+        for channel, (frames, values) in self.channels.items():
+            plan.channels[channel] = decimate_keys(frames, values, tolerance)
+
+        return plan
+
+def axis_index(prop: str) -> tuple[str, int]:
+    """
+    Splits a component property like `location.x` into its vector property and array index (`("location", 0)`)
+    """
+    root, axis = prop.split(".")
+
+    return root, AXES.index(axis)
+
+def plan_property(plan: KeyPlan, target: str, prop: str, frames, values) -> None:
+    """
+    Adds `frames`/`values` for a component property like `location.x` to `plan`, keying only that component's F-Curve
+    """
+    root, index = axis_index(prop)
+    plan.add(target, root, index, frames, values)
+
+def merge_envelopes(frames, values, width: int):
+    """
+    Merges overlapping envelopes of `width` keys each (as returned by `plan_envelope`), dropping the first and last
+    (resting) key of an envelope when it lands inside another envelope, so back-to-back or overlapping notes don't
+    drop back to rest in between
+    """
+    count = len(frames) // width if width else 0
+
+    if width < 2 or count < 2:
+        return frames, values
+
+    if np is not None:
+        keys = np.asarray(frames, dtype=np.float64).reshape(count, width)
+        first = keys[:, 0]
+        last = keys[:, -1]
+
+        order = np.argsort(first, kind="stable")
+        starts = first[order]
+        reach = np.maximum.accumulate(last[order]) # furthest end of the envelopes starting before each one
+
+        def inside(frame):
+            i = np.searchsorted(starts, frame, "left")
+            return (i > 0) & (reach[np.maximum(i - 1, 0)] > frame)
+
+        keep = np.ones((count, width), dtype=bool)
+        keep[:, 0] = ~inside(first)
+        keep[:, -1] = ~inside(last)
+        keep = keep.ravel()
+
+        return np.asarray(frames, dtype=np.float64)[keep], np.asarray(values, dtype=np.float64)[keep]
+
+    first = [frames[i * width] for i in range(count)]
+    last = [frames[i * width + width - 1] for i in range(count)]
+    order = sorted(range(count), key=first.__getitem__)
+    starts = [first[i] for i in order]
+    reach = list(accumulate((last[i] for i in order), max))
+
+    def inside(frame):
+        i = bisect_left(starts, frame)
+        return i > 0 and reach[i - 1] > frame
+
+    merged_frames = array("d")
+    merged_values = array("d")
+
+    for i in range(count):
+        for j in range(width):
+            k = i * width + j
+
+            if (j == 0 or j == width - 1) and inside(frames[k]):
+                continue
+
+            merged_frames.append(frames[k])
+            merged_values.append(values[k])
+
+    return merged_frames, merged_values
+
+def decimate_keys(frames, values, tolerance: float = DECIMATE_TOLERANCE):
+    """
+    Returns `(frames, values)` sorted by frame with the redundant keys removed: of keys on the same frame only the last
+    one is kept (like `keyframe_insert` replacing a key), and keys in the middle of a flat run are dropped
+
+    Only flat runs are simplified, as keys are written with Bézier interpolation whose auto handles would bend if a
+    sloped key was removed, while a flat segment stays flat
+    """
+    if np is not None:
+        frames = np.asarray(frames, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+
+        if len(frames) == 0:
+            return frames, values
+
+        order = np.argsort(frames, kind="stable")
+        frames = frames[order]
+        values = values[order]
+
+        last = np.append(frames[1:] - frames[:-1] > tolerance, True)
+        frames = frames[last]
+        values = values[last]
+
+        if len(frames) < 3:
+            return frames, values
+
+        keep = np.ones(len(frames), dtype=bool)
+        keep[1:-1] = (np.abs(values[1:-1] - values[:-2]) > tolerance) | (np.abs(values[1:-1] - values[2:]) > tolerance)
+
+        return frames[keep], values[keep]
+
+    order = sorted(range(len(frames)), key=frames.__getitem__)
+    keys = []
+
+    for i in order:
+        if keys and frames[i] - keys[-1][0] <= tolerance:
+            keys[-1] = (frames[i], values[i])
+        else:
+            keys.append((frames[i], values[i]))
+
+    decimated_frames = array("d")
+    decimated_values = array("d")
+
+    for i, (frame, value) in enumerate(keys):
+        if 0 < i < len(keys) - 1 and abs(value - keys[i - 1][1]) <= tolerance and abs(value - keys[i + 1][1]) <= tolerance:
+            continue
+
+        decimated_frames.append(frame)
+        decimated_values.append(value)
+
+    return decimated_frames, decimated_values
+
+def plan_envelope(events: EventTable, fps: float, keys: list[tuple[int, float, float, float]]):
+    """
+    Computes the frames and values of an envelope for every event at once, returning flat `(frames, values)` arrays ordered event by event,
+    with the envelopes of overlapping events merged (see `merge_envelopes`)
+
+    `keys`: `(anchor, offset, velocity_offset, value)` for each key of a single event, where the key lands on frame
+    `anchor + offset + velocity_offset * velocity_scale`, `anchor` is the note's start (`START`) or end (`END`) frame
+    and `velocity_scale` grows from 1 (full velocity) to 2.5 (silent)
+    """
+    if np is not None:
+        start = np.asarray(events.start, dtype=np.float64) * fps
+        end = start + np.asarray(events.duration, dtype=np.float64) * fps
+        velocity_scale = 1 + (1 - np.asarray(events.velocity, dtype=np.float64)) * 1.5
+
+        frames = np.empty((len(events), len(keys)), dtype=np.float64)
+        for j, (anchor, offset, velocity_offset, _) in enumerate(keys):
+            frames[:, j] = (start if anchor == START else end) + offset + velocity_offset * velocity_scale
+
+        values = np.tile(np.array([key[3] for key in keys], dtype=np.float64), len(events))
+
+        return merge_envelopes(frames.ravel(), values, len(keys))
+
+    frames = array("d")
+    values = array("d")
+
+    for start_time, duration, velocity in zip(events.start, events.duration, events.velocity):
+        start = start_time * fps
+        end = (start_time + duration) * fps
+        velocity_scale = 1 + (1 - velocity) * 1.5
+
+        for anchor, offset, velocity_offset, value in keys:
+            frames.append((start if anchor == START else end) + offset + velocity_offset * velocity_scale)
+            values.append(value)
+
+    return merge_envelopes(frames, values, len(keys))
+
+def hammer_plan(events: EventTable, fps: float, base: float, pullback: float, overshoot: float):
+    duration = 0.08 * fps # ~80ms time
+
+    return plan_envelope(events, fps, [
+        (START, 0, -duration, base), # start
+        (START, -duration, 0, base + pullback), # pullback
+        (START, 0, 0, base + overshoot), # hit
+        (START, duration, 0, base - (overshoot * 0.75)), # oscillate
+        (START, 0, duration, base), # end
+    ])
+
+def movement_plan(events: EventTable, fps: float, base: float, final: float):
+    duration = 1 # 1 frame
+
+    return plan_envelope(events, fps, [
+        (START, 0, -duration, base), # start
+        (START, 0, 0, base + final), # note played
+        (END, 0, 0, base + final), # hold final position until note ends
+        (END, 0, duration, base), # return to original after note ends
+    ])
+
+def light_plan(events: EventTable, fps: float, initial: float, final: float, fade_effect: bool = False):
+    duration = 1 # 1 frame
+    keys = [
+        (START, 0, -duration, initial), # start
+        (START, 0, 0, initial + final), # note played
+        (END, 0, 0, initial + final), # hold final position until note ends
+        (END, 0, duration, initial), # return to original after note ends
+    ]
+
+    if fade_effect:
+        del keys[2]
+
+    return plan_envelope(events, fps, keys)
+
+def effect_plan(events: EventTable, fps: float, effect: str, base: float, amount: float):
+    duration = 0.5 * fps # ~100ms
+
+    if effect == "bounce":
+        keys = [
+            (START, -duration * 0.1, 0, base),
+            (START, 0, 0, base + amount),
+            (START, duration * 0.15, 0, base - amount * 0.5),
+            (START, duration * 0.3, 0, base + amount * 0.25),
+            (START, duration * 0.45, 0, base),
+            (START, duration, 0, base),
+        ]
+    elif effect == "swing":
+        keys = [
+            (START, -duration * 0.1, 0, base),
+            (START, 0, 0, base + amount),
+            (START, duration * 0.2, 0, base - amount * 0.6),
+            (START, duration * 0.4, 0, base + amount * 0.3),
+            (START, duration * 0.6, 0, base),
+            (START, duration, 0, base),
+        ]
+    elif effect == "expand":
+        keys = [
+            (START, -duration * 0.1, 0, base),
+            (START, 0, 0, base + amount),
+            (START, duration * 0.2, 0, base - amount * 0.3),
+            (START, duration * 0.4, 0, base),
+            (START, duration, 0, base),
+        ]
+    else:
+        keys = []
+
+    return plan_envelope(events, fps, keys)
+
+def positional_plan(events: EventTable, fps: float, min_position: float, max_position: float):
+    frames = array("d")
+    values = array("d")
+    center = min_position + (63.5 / 127) * (max_position - min_position)
+
+    for i in range(len(events)):
+        start = events.start[i] * fps
+        duration = events.duration[i] * fps
+        velocity_scale = 1 + (1 - events.velocity[i]) * 1.5
+        position = min_position + (events.note[i] / 127) * (max_position - min_position)
+
+        if i == 0:
+            frames.append(start - (duration * velocity_scale))
+            values.append(center)
+
+        if i + 1 < len(events):
+            frames.append(start)
+            values.append(position)
+
+            # hold position ~until next event
+            frames.append((events.start[i + 1] * fps) - (duration * 0.5))
+            values.append(position)
+        else:
+            frames.append(start + (duration * velocity_scale))
+            values.append(center)
+
+    return frames, values
+
+def robotic_plan(
+    events: EventTable,
+    fps: float,
+    base: tuple[float, float, float],
+    targets: dict[int, tuple[float, float, float]],
+    pullback: float,
+    axis: str,
+):
+    """
+    Returns `(frames, (x_values, y_values, z_values))` for a control object moving between the `targets` of each note
+    """
+    frames = array("d")
+    values = (array("d"), array("d"), array("d"))
+    offset = tuple(pullback if a == axis else 0 for a in AXES)
+    location = tuple(base)
+
+    def key(frame, position):
+        nonlocal location
+        location = tuple(position)
+        frames.append(frame)
+        for i in range(3):
+            values[i].append(location[i])
+
+    def raised(position):
+        return tuple(p + o for p, o in zip(position, offset))
+
+    for i in range(len(events)):
+        has_next = i + 1 < len(events)
+        target = targets[events.note[i]]
+        start = events.start[i] * fps
+
+        if has_next:
+            duration = (events.start[i + 1] * fps) - start
+        else:
+            duration = events.duration[i] * fps
+
+        pullback_frames = duration * 0.2
+        strike_frames = duration * 0.3
+        rebound_frames = duration * 0.2
+        pullback_start = start - pullback_frames
+        strike_mid = start - (strike_frames * 0.5)
+        impact = start
+        rebound_end = start + rebound_frames
+
+        if i == 0:
+            key(pullback_start - duration, base) # initial
+
+        key(pullback_start, raised(location)) # move up
+        key(strike_mid, raised(target)) # across
+        key(impact, target) # hit
+
+        # look ahead for the next event and animate the transition (if no next event, return to base)
+        if has_next:
+            next_start = events.start[i + 1] * fps
+            next_pullback_start = next_start - (events.duration[i + 1] * fps) * 0.2
+
+            key(rebound_end, raised(target))
+            key(next_pullback_start, raised(targets[events.note[i + 1]]))
+        else:
+            key(rebound_end + (fps * 1.0), base) # final reset
+
+    return frames, values
+
+def _hammer(events, fps, prop, base, pullback, overshoot) -> KeyPlan:
+    plan = KeyPlan()
+    frames, values = hammer_plan(events, fps, base, pullback, overshoot)
+    plan_property(plan, "object", prop, frames, values)
+
+    return plan
+
+def _movement(events, fps, prop, base, final) -> KeyPlan:
+    plan = KeyPlan()
+    frames, values = movement_plan(events, fps, base, final)
+    plan_property(plan, "object", prop, frames, values)
+
+    return plan
+
+def _light(events, fps, target, data_path, initial, final, fade_effect) -> KeyPlan:
+    plan = KeyPlan()
+    frames, values = light_plan(events, fps, initial, final, fade_effect)
+    plan.add(target, data_path, 0, frames, values)
+
+    return plan
+
+def _effect(events, fps, effect, prop, base, amount) -> KeyPlan:
+    plan = KeyPlan()
+
+    if prop is not None:
+        frames, values = effect_plan(events, fps, effect, base, amount)
+        plan_property(plan, "object", prop, frames, values)
+
+    return plan
+
+def _positional(events, fps, prop, min_position, max_position) -> KeyPlan:
+    plan = KeyPlan()
+    frames, values = positional_plan(events, fps, min_position, max_position)
+    plan_property(plan, "object", prop, frames, values)
+
+    return plan
+
+def _robotic(events, fps, base, targets, pullback, axis) -> KeyPlan:
+    plan = KeyPlan()
+    frames, values = robotic_plan(events, fps, base, targets, pullback, axis)
+
+    for i in range(3):
+        plan.add("object", "location", i, frames, values[i])
+
+    return plan
+
+PLANNERS = {
+    "hammer": _hammer,
+    "movement": _movement,
+    "light": _light,
+    "effect": _effect,
+    "positional": _positional,
+    "robotic": _robotic,
+}
+
+def build_plan(
+    planner: str | None,
+    events: EventTable,
+    fps: float,
+    args: dict,
+    window: tuple[float, float] | None = None,
+) -> KeyPlan:
+    """
+    Builds the `KeyPlan` of an instrument from its `planner` name and `plan_args()`, which only hold plain,
+    picklable values so plans can be built in worker processes
+
+    Every channel is sorted and stripped of redundant keys (see `decimate_keys`). With a `window` (a `(start, end)` frame range)
+    only the events near the window are planned (every event for `SEQUENTIAL_PLANNERS`) and the plan is cropped to it
+    """
+    if planner is None:
+        return KeyPlan()
+
+    if window is None:
+        return PLANNERS[planner](events, fps, **args).decimate()
+
+    start, end = window
+
+    if planner not in SEQUENTIAL_PLANNERS:
+        events = events.window(start / fps - WINDOW_PADDING, end / fps + WINDOW_PADDING)
+
+    return PLANNERS[planner](events, fps, **args).decimate().crop(start, end)
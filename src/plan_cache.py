@@ -0,0 +1,210 @@
+import hashlib
+import os
+import struct
+import sys
+from array import array
+from src.plan import KeyPlan
+
+MAGIC = b"BMKP"
+VERSION = 2
+
+# megabytes the cache may use before entries are evicted, unless set by the panel or `--cache-size`
+DEFAULT_CACHE_MB = 256
+
+_HEADER = struct.Struct("<4sHI") # magic, version, plan count
+_COUNT = struct.Struct("<I")
+_CHANNEL = struct.Struct("<HHiI") # target length, data path length, index, key count
+
+
+def _doubles(values) -> bytes:
+    data = array("d", values)
+
+    if sys.byteorder == "big":
+        data.byteswap()
+
+    return data.tobytes()
+
+def _read_doubles(data: bytes, pos: int, count: int) -> array:
+    values = array("d")
+    values.frombytes(data[pos:pos + count * 8])
+
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    return values
+
+def pack_plans(plans: list[KeyPlan]) -> bytes:
+    """
+    Packs `plans` into the little-endian binary format of the cache
+    """
+    chunks = [_HEADER.pack(MAGIC, VERSION, len(plans))]
+
+    for plan in plans:
+        chunks.append(_COUNT.pack(len(plan.channels)))
+
+        for (target, data_path, index), (frames, values) in plan.channels.items():
+            target = target.encode()
+            data_path = data_path.encode()
+
+            chunks.append(_CHANNEL.pack(len(target), len(data_path), index, len(frames)))
+            chunks.append(target)
+            chunks.append(data_path)
+            chunks.append(_doubles(frames))
+            chunks.append(_doubles(values))
+
+    return b"".join(chunks)
+
+def unpack_plans(data: bytes) -> list[KeyPlan]:
+    """
+    Unpacks plans written by `pack_plans`, raising `ValueError` if `data` isn't a cache entry of this version
+    """
+    try:
+        magic, version, count = _HEADER.unpack_from(data, 0)
+    except struct.error:
+        raise ValueError("Truncated plan cache entry")
+
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a plan cache entry of this version")
+
+    plans = []
+    pos = _HEADER.size
+
+    try:
+        for _ in range(count):
+            plan = KeyPlan()
+            channels = _COUNT.unpack_from(data, pos)[0]
+            pos += _COUNT.size
+
+            for _ in range(channels):
+                target_length, path_length, index, keys = _CHANNEL.unpack_from(data, pos)
+                pos += _CHANNEL.size
+
+                target = data[pos:pos + target_length].decode()
+                pos += target_length
+                data_path = data[pos:pos + path_length].decode()
+                pos += path_length
+
+                frames = _read_doubles(data, pos, keys)
+                pos += keys * 8
+                values = _read_doubles(data, pos, keys)
+                pos += keys * 8
+
+                if len(frames) != keys or len(values) != keys:
+                    raise ValueError("Truncated plan cache entry")
+
+                plan.add(target, data_path, index, frames, values)
+
+            plans.append(plan)
+    except struct.error:
+        raise ValueError("Truncated plan cache entry")
+
+    return plans
+
+def plan_cache_key(fingerprint: str, window: tuple[float, float] | None = None) -> str:
+    return hashlib.sha1(f"{fingerprint}:{window}".encode()).hexdigest()
+
+
+class PlanCache:
+    """
+    An on-disk cache of the key plans of whole items, so regenerating an unchanged item (e.g. a nightly re-run, or
+    a re-opened .blend) skips planning and only writes the keys
+
+    Entries are keyed by `plan_cache_key`, built from the item's fingerprint (MIDI contents, item settings, fps and
+    base values, see `src.generate.item_fingerprint`). Reading an entry marks it as recently used, and the least recently
+    used entries are evicted once the cache is larger than `max_bytes`
+
+    `directory`: where entries are stored, created when the first entry is written
+    `max_bytes`: how large the cache may grow before entries are evicted
+
+    ## Example:
+
+    ```python
+    cache = PlanCache(bpy.path.abspath("//bmidi_cache")) # next to the .blend file
+    generate_items(items, "track.mid", 24, cache=cache)
+    ```
+    """
+    SUFFIX = ".bmkp"
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, key: str) -> list[KeyPlan] | None:
+        path = self.path(key)
+
+        try:
+            with open(path, "rb") as f:
+                plans = unpack_plans(f.read())
+
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # corrupt or from another version, it will be written again
+            self.remove(key)
+            return None
+
+        return plans
+
+    def put(self, key: str, plans: list[KeyPlan]) -> None:
+        path = self.path(key)
+        temporary = f"{path}.{os.getpid()}.tmp"
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+
+            with open(temporary, "wb") as f:
+                f.write(pack_plans(plans))
+
+            os.replace(temporary, path)
+        except OSError:
+            # a cache that can't be written (read-only drive, full disk, etc.) only costs time
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            return
+
+        self.evict()
+
+    def remove(self, key: str) -> None:
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def entries(self) -> list[os.DirEntry]:
+        try:
+            with os.scandir(self.directory) as it:
+                return [entry for entry in it if entry.name.endswith(self.SUFFIX) and entry.is_file()]
+        except OSError:
+            return []
+
+    def size(self) -> int:
+        return sum(entry.stat().st_size for entry in self.entries())
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries until the cache fits in `max_bytes`
+        """
+        entries = [(entry.stat(), entry.path) for entry in self.entries()]
+        total = sum(stat.st_size for stat, _ in entries)
+
+        for stat, path in sorted(entries, key=lambda entry: entry[0].st_mtime_ns):
+            if total <= self.max_bytes:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+            total -= stat.st_size
+
+    def clear(self) -> None:
+        for entry in self.entries():
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
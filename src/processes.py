@@ -0,0 +1,33 @@
+import sys
+import threading
+import types
+from contextlib import contextmanager
+
+# never import bpy here, this module is imported by the worker processes
+
+
+def on_main_thread() -> bool:
+    return threading.current_thread() is threading.main_thread()
+
+@contextmanager
+def detached_main():
+    """
+    Hides the parent's `__main__` while worker processes are spawned, since spawned workers re-run it (a Blender script
+    or text block, which would import bpy)
+
+    This swaps the process-wide `sys.modules["__main__"]`, so only start worker processes from the main thread (see `on_main_thread`)
+
+    ## Example:
+
+    ```python
+    with detached_main(), ProcessPoolExecutor(4, mp_context=get_context("spawn")) as pool:
+        futures = [pool.submit(work, chunk) for chunk in chunks]
+    ```
+    """
+    main = sys.modules.get("__main__")
+    sys.modules["__main__"] = types.ModuleType("__main__")
+
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
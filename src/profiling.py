@@ -0,0 +1,100 @@
+import cProfile
+import json
+import time
+from contextlib import contextmanager
+
+
+class Profiler:
+    """
+    Records where the time of a generation run goes: run-wide phases (MIDI parse, event pairing, object lookup, etc.),
+    plus the per-item phases, key counts and event counts returned by `generate_items`
+
+    `midi`: how the MIDI file was loaded, set by `src.midi.load_midi` as `{"cached": bool, "phases": {...}}`, so the decode
+    phases are still known when the file was already decoded before the run (e.g. for the panel's channel list)
+
+    `cprofile`: also run the generation under `cProfile`, so the whole call tree can be saved with `dump_stats`
+
+    ## Example:
+
+    ```python
+    profiler = Profiler()
+    with profiler.run():
+        generate_items(items, "track.mid", 24, profiler=profiler)
+
+    profiler.dump_json("profile.json")
+    ```
+    """
+    def __init__(self, cprofile: bool = False):
+        self.seconds = 0.0
+        self.phases: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.items: list[dict] = []
+        self.midi: dict = {}
+        self._profile = cProfile.Profile() if cprofile else None
+
+    @contextmanager
+    def run(self):
+        started = time.perf_counter()
+
+        if self._profile is not None:
+            self._profile.enable()
+
+        try:
+            yield self
+        finally:
+            if self._profile is not None:
+                self._profile.disable()
+
+            self.seconds += time.perf_counter() - started
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def count(self, name: str, amount: int) -> None:
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def slowest_items(self, limit: int = 5) -> list[dict]:
+        return sorted(self.items, key=lambda item: item["seconds"], reverse=True)[:limit]
+
+    def to_dict(self) -> dict:
+        return {
+            "seconds": self.seconds,
+            "phases": self.phases,
+            "counts": self.counts,
+            "midi": self.midi,
+            "items": self.items,
+        }
+
+    def dump_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    def dump_stats(self, path: str) -> None:
+        """
+        Saves the `cProfile` statistics for `pstats` or a viewer like snakeviz (needs `cprofile=True`)
+        """
+        if self._profile is None:
+            raise ValueError("The profiler was created without cprofile=True")
+
+        self._profile.dump_stats(path)
+
+    def dump(self, path: str) -> None:
+        """
+        Saves the timings as JSON if `path` ends with `.json`, otherwise the `cProfile` statistics
+        """
+        if path.lower().endswith(".json"):
+            self.dump_json(path)
+        else:
+            self.dump_stats(path)
+
+def profiler_for(path: str | None) -> "Profiler":
+    """
+    Returns a profiler able to `dump` to `path`, only running `cProfile` when statistics will be saved
+    """
+    return Profiler(cprofile=bool(path) and not path.lower().endswith(".json"))
@@ -0,0 +1,88 @@
+import uuid
+
+# `rename_type` -> (sort key of an object, whether to sort biggest first)
+RENAME_ORDERS = {
+    "location_smallest": (lambda obj: obj.location.length, False),
+    "location_biggest": (lambda obj: obj.location.length, True),
+    "scale_smallest": (lambda obj: (obj.scale.x, obj.scale.y, obj.location.z), False),
+    "scale_biggest": (lambda obj: (obj.scale.x, obj.scale.y, obj.location.z), True),
+}
+
+
+def projection_keys(objects, axis: tuple[float, float, float]) -> list[float]:
+    """
+    Returns how far along `axis` each object's location lies (its projection onto the axis), for ordering objects in space
+    """
+    ax, ay, az = axis
+
+    return [obj.location[0] * ax + obj.location[1] * ay + obj.location[2] * az for obj in objects]
+
+def order_objects(objects, rename_type: str, axis: tuple[float, float, float] = (1.0, 0.0, 0.0)) -> list:
+    """
+    Returns `objects` in the order they get their notes, computing every object's sort key once up front
+
+    `rename_type` is one of `RENAME_ORDERS` or `"axis_projection"` (along `axis`, flip the axis to reverse the order),
+    any other type keeps the objects in their given order
+    """
+    objects = list(objects)
+
+    if rename_type == "axis_projection":
+        keys = projection_keys(objects, axis)
+        reverse = False
+    elif rename_type in RENAME_ORDERS:
+        key, reverse = RENAME_ORDERS[rename_type]
+        keys = [key(obj) for obj in objects]
+    else:
+        return objects
+
+    order = sorted(range(len(objects)), key=keys.__getitem__, reverse=reverse)
+
+    return [objects[i] for i in order]
+
+def plan_renames(
+    objects,
+    prefix: str,
+    notes: list[int],
+    rename_type: str,
+    axis: tuple[float, float, float] = (1.0, 0.0, 0.0),
+) -> list[tuple[object, str]]:
+    """
+    Returns `(object, new name)` for every object that gets a note, pairing the ordered objects with `notes` in turn
+    """
+    return [(obj, f"{prefix}{note}") for note, obj in zip(notes, order_objects(objects, rename_type, axis))]
+
+def rename_conflicts(renames: list[tuple[object, str]], names) -> list[str]:
+    """
+    Returns the new names of `renames` that can't be given out as they are: names used twice, or taken by an object
+    of `names` (every object name in the scene) that isn't being renamed
+    """
+    renamed = {obj.name for obj, _ in renames}
+    taken = set(names) - renamed
+    seen = set()
+    conflicts = set()
+
+    for _, name in renames:
+        if name in seen or name in taken:
+            conflicts.add(name)
+
+        seen.add(name)
+
+    return sorted(conflicts)
+
+def apply_renames(renames: list[tuple[object, str]]) -> int:
+    """
+    Renames every object in two passes, first to unique temporary names and then to their new names, so no object is
+    ever renamed to a name still held by another object of the batch (which Blender would resolve with `.001` suffixes)
+
+    Check `rename_conflicts` first, returns how many objects were renamed
+    """
+    renames = [(obj, name) for obj, name in renames if obj.name != name]
+    token = uuid.uuid4().hex[:8]
+
+    for i, (obj, _) in enumerate(renames):
+        obj.name = f"bmidi_{token}_{i}"
+
+    for obj, name in renames:
+        obj.name = name
+
+    return len(renames)
@@ -0,0 +1,229 @@
+from types import SimpleNamespace
+from src.plan import KeyPlan
+
+
+class SceneAdapter:
+    """
+    The small slice of a scene the instruments and controllers need, so the timing engine can run with or without Blender
+
+    `BpyScene` (in `src.bpy_scene`) drives real Blender objects, while `MemoryScene` keeps everything in plain Python objects
+    for benchmarks and headless tooling
+    """
+    def fps(self) -> float:
+        raise NotImplementedError
+
+    def get_object(self, name: str):
+        """
+        Returns the object called `name`, raising `KeyError` if there is none
+        """
+        raise NotImplementedError
+
+    def has_object(self, name: str) -> bool:
+        raise NotImplementedError
+
+    def named_objects(self):
+        """
+        Yields `(name, object)` for every object in the scene
+        """
+        raise NotImplementedError
+
+    def resolve(self, obj):
+        """
+        Returns `obj`, looking it up with `get_object` if it's a name
+        """
+        return self.get_object(obj) if isinstance(obj, str) else obj
+
+    def clear_animation(self, owner, window: tuple[float, float] | None = None) -> None:
+        """
+        Removes all of the animation of `owner`, or with a `window` only its keys between those frames
+        """
+        raise NotImplementedError
+
+    def mute_animation(self, owner):
+        """
+        Stops the animation of `owner` from being evaluated without removing it, returning what `unmute_animation` needs to
+        bring it back
+        """
+        raise NotImplementedError
+
+    def unmute_animation(self, owner, muted) -> None:
+        raise NotImplementedError
+
+    def apply_plan(self, plan: KeyPlan, targets: dict[str, object]) -> None:
+        """
+        Writes every channel of `plan`, resolving each channel's target name through `targets` (e.g. `{"object": obj, "data": obj.data}`)
+        """
+        raise NotImplementedError
+
+_default_scene = None
+
+def default_scene() -> SceneAdapter:
+    """
+    Returns the adapter for the running Blender session (only available inside Blender)
+    """
+    global _default_scene
+
+    if _default_scene is None:
+        from src.bpy_scene import BpyScene
+        _default_scene = BpyScene()
+
+    return _default_scene
+
+
+class ObjectIndex:
+    """
+    Objects named `<prefix><note>` indexed by prefix and note, built with one pass over the objects of a scene
+    so items don't format and look up a name for every note
+
+    Names are split at their trailing integer (`Key25` is note 25 of `Key`), prefixes ending in a digit are matched
+    against the integers that start with those digits (prefix `Pad1` finds note 25 in `Pad125`)
+
+    ## Example:
+
+    ```python
+    objects = ObjectIndex(scene.named_objects())
+    objects.notes("Key") # {25: <Key25>, 26: <Key26>, ...}
+    objects.get("Key", 25) # <Key25>
+    ```
+    """
+    def __init__(self, named_objects):
+        self._stems: dict[str, dict[str, object]] = {}
+        self._notes: dict[str, dict[int, object]] = {}
+
+        for name, obj in named_objects:
+            stem = name.rstrip("0123456789")
+            digits = name[len(stem):]
+
+            if digits:
+                self._stems.setdefault(stem, {})[digits] = obj
+
+    def notes(self, prefix: str) -> dict[int, object]:
+        """
+        Returns `{note: object}` for every object named `<prefix><note>`
+        """
+        found = self._notes.get(prefix)
+
+        if found is not None:
+            return found
+
+        stem = prefix.rstrip("0123456789")
+        lead = prefix[len(stem):]
+        found = self._notes[prefix] = {}
+
+        for digits, obj in self._stems.get(stem, {}).items():
+            note = digits[len(lead):]
+
+            # only names `f"{prefix}{note}"` would produce (no leading zeros)
+            if digits.startswith(lead) and note and (note == "0" or note[0] != "0"):
+                found[int(note)] = obj
+
+        return found
+
+    def get(self, prefix: str, note: int):
+        return self.notes(prefix).get(note)
+
+class Vector3:
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x: float = 0.0, y: float = 0.0, z: float = 0.0):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.z))
+
+    def __len__(self) -> int:
+        return 3
+
+    def __getitem__(self, i: int) -> float:
+        return (self.x, self.y, self.z)[i]
+
+    def __setitem__(self, i: int, value: float) -> None:
+        setattr(self, self.__slots__[i], value)
+
+    def __repr__(self) -> str:
+        return f"Vector3({self.x}, {self.y}, {self.z})"
+
+class MemoryObject:
+    """
+    A stand-in for a Blender object with the properties instruments read and key
+    """
+    def __init__(
+        self,
+        name: str,
+        location: tuple[float, float, float] = (0, 0, 0),
+        rotation_euler: tuple[float, float, float] = (0, 0, 0),
+        scale: tuple[float, float, float] = (1, 1, 1),
+        energy: float = 10.0,
+        spot_size: float = 0.785398,
+    ):
+        self.name = name
+        self.location = Vector3(*location)
+        self.rotation_euler = Vector3(*rotation_euler)
+        self.scale = Vector3(*scale)
+        self.data = SimpleNamespace(name=name, energy=energy, spot_size=spot_size, materials=[])
+
+class MemoryScene(SceneAdapter):
+    """
+    An in-memory scene, keyframes are kept per `(owner, data_path, index)` instead of being written to F-Curves
+
+    ## Example:
+
+    ```python
+    scene = MemoryScene(fps=24)
+    scene.add_object("Snare_Hammer", rotation_euler=(0.1, 0, 0))
+
+    hammer = HammerInstrument("track.mid", "Snare_Hammer", "rotation_euler.x", 0.6, note=38, scene=scene)
+    hammer.generate_keyframes()
+    scene.keys(scene.get_object("Snare_Hammer"), "rotation_euler", 0) # [(frame, value), ...]
+    ```
+    """
+    def __init__(self, fps: float = 24):
+        self._fps = fps
+        self.objects: dict[str, MemoryObject] = {}
+        self.keyframes: dict[tuple[int, str, int], dict[float, float]] = {}
+
+    def add_object(self, name: str, **kwargs) -> MemoryObject:
+        obj = self.objects[name] = MemoryObject(name, **kwargs)
+
+        return obj
+
+    def fps(self) -> float:
+        return self._fps
+
+    def get_object(self, name: str) -> MemoryObject:
+        return self.objects[name]
+
+    def has_object(self, name: str) -> bool:
+        return name in self.objects
+
+    def named_objects(self):
+        return self.objects.items()
+
+    def clear_animation(self, owner, window: tuple[float, float] | None = None) -> None:
+        for key in [key for key in self.keyframes if key[0] == id(owner)]:
+            if window is None:
+                del self.keyframes[key]
+                continue
+
+            keys = self.keyframes[key]
+            for frame in [frame for frame in keys if window[0] <= frame <= window[1]]:
+                del keys[frame]
+
+    def mute_animation(self, owner) -> dict:
+        return {key: self.keyframes.pop(key) for key in [key for key in self.keyframes if key[0] == id(owner)]}
+
+    def unmute_animation(self, owner, muted: dict) -> None:
+        self.keyframes.update(muted)
+
+    def apply_plan(self, plan: KeyPlan, targets: dict[str, object]) -> None:
+        for (target, data_path, index), (frames, values) in plan.channels.items():
+            keys = self.keyframes.setdefault((id(targets[target]), data_path, index), {})
+            keys.update(zip(frames, values))
+
+    def keys(self, owner, data_path: str, index: int = 0) -> list[tuple[float, float]]:
+        return sorted(self.keyframes.get((id(owner), data_path, index), {}).items())
+
+    def key_count(self) -> int:
+        return sum(len(keys) for keys in self.keyframes.values())
@@ -0,0 +1,227 @@
+import heapq
+import mmap
+import os
+import struct
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from src.processes import detached_main, on_main_thread
+from src.tempo import TempoMap
+
+# `channel` of the tempo events yielded by `read_track`
+TEMPO = -1
+
+# files at least this large have their tracks decoded in worker processes (when more than one worker is allowed). Only
+# track decoding is spread out, roughly 0.18 s per MB, while the merge stays in this process, and starting 4 spawned
+# workers took 0.3-0.45 s (`python benchmarks/run.py --decode-workers 4`), so 4 workers break even around 2-3 MB
+PARALLEL_DECODE_BYTES = 2 * 1024 * 1024
+
+# data bytes following each status byte, for channel messages (by high nibble) and system common messages
+_CHANNEL_DATA = {0x8: 2, 0x9: 2, 0xA: 2, 0xB: 2, 0xC: 1, 0xD: 1, 0xE: 2}
+_SYSTEM_DATA = {0xF1: 1, 0xF2: 2, 0xF3: 1}
+
+
+def read_header(data) -> tuple[int, int, list[tuple[int, int]]]:
+    """
+    Returns `(format, ticks_per_beat, tracks)` for the Standard MIDI File in `data`, where `tracks` holds the
+    `(start, end)` byte span of every track chunk
+    """
+    if len(data) < 14 or data[0:4] != b"MThd":
+        raise ValueError("Not a MIDI file (no MThd header)")
+
+    size = struct.unpack_from(">I", data, 4)[0]
+    midi_format, _, division = struct.unpack_from(">hhh", data, 8)
+
+    if division < 0:
+        raise ValueError("SMPTE time division is not supported")
+
+    tracks = []
+    pos = 8 + size
+
+    while pos + 8 <= len(data):
+        name = data[pos:pos + 4]
+        size = struct.unpack_from(">I", data, pos + 4)[0]
+        start = pos + 8
+        end = min(start + size, len(data))
+
+        # unknown chunks are skipped, as the spec asks
+        if name == b"MTrk":
+            tracks.append((start, end))
+
+        pos = end
+
+    return midi_format, division, tracks
+
+def read_track(data, start: int, end: int):
+    """
+    Yields `(tick, channel, note, velocity)` for the note messages of the track chunk in `data[start:end]`, with `tick` counted
+    from the start of the track and a `velocity` of 0 marking the end of a note (a note on with no velocity, or a note off)
+
+    Tempo changes are yielded as `(tick, TEMPO, tempo, 0)` with the tempo in microseconds per beat, while every other event
+    (controllers, sysex, other meta events, etc.) is skipped without being decoded
+    """
+    pos = start
+    tick = 0
+    last_status = None
+
+    while pos < end:
+        # delta time
+        byte = data[pos]
+        pos += 1
+        delta = byte & 0x7F
+
+        while byte & 0x80:
+            byte = data[pos]
+            pos += 1
+            delta = (delta << 7) | (byte & 0x7F)
+
+        tick += delta
+        status = data[pos]
+
+        # running status
+        if status < 0x80:
+            if last_status is None:
+                raise ValueError("Running status without a previous status byte")
+            status = last_status
+        else:
+            pos += 1
+            if status < 0xF0: # only channel messages set running status
+                last_status = status
+            elif status != 0xFF: # sysex and system common messages cancel it, meta events leave it
+                last_status = None
+
+        kind = status >> 4
+
+        if kind == 0x9:
+            note = data[pos]
+            velocity = data[pos + 1]
+            pos += 2
+            yield (tick, status & 0x0F, note, velocity)
+        elif kind == 0x8:
+            note = data[pos]
+            velocity = data[pos + 1]
+            pos += 2
+
+            # a note off with a release velocity doesn't end the note
+            if velocity == 0:
+                yield (tick, status & 0x0F, note, 0)
+        elif kind < 0xF:
+            pos += _CHANNEL_DATA[kind]
+        elif status == 0xFF or status == 0xF0 or status == 0xF7:
+            meta_type = data[pos] if status == 0xFF else None
+            if status == 0xFF:
+                pos += 1
+
+            byte = data[pos]
+            pos += 1
+            length = byte & 0x7F
+
+            while byte & 0x80:
+                byte = data[pos]
+                pos += 1
+                length = (length << 7) | (byte & 0x7F)
+
+            if meta_type == 0x51 and length == 3:
+                yield (tick, TEMPO, (data[pos] << 16) | (data[pos + 1] << 8) | data[pos + 2], 0)
+
+            pos += length
+        else:
+            pos += _SYSTEM_DATA.get(status, 0)
+
+def decode_track(data, start: int, end: int) -> tuple[array, array, array, array]:
+    """
+    Decodes a whole track chunk into `(ticks, channels, notes, velocities)` arrays holding the events `read_track` yields
+    """
+    ticks = array("q")
+    channels = array("b")
+    notes = array("l") # also holds the tempo of tempo events
+    velocities = array("B")
+
+    for tick, channel, note, velocity in read_track(data, start, end):
+        ticks.append(tick)
+        channels.append(channel)
+        notes.append(note)
+        velocities.append(velocity)
+
+    return ticks, channels, notes, velocities
+
+def _decode_tracks(midi_file: str, tracks: list[tuple[int, int]]) -> list[tuple[array, array, array, array]]:
+    # runs in a worker process, which maps the file itself so only the decoded arrays are sent back
+    with open(midi_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return [decode_track(data, start, end) for start, end in tracks]
+
+def decode_tracks(midi_file: str, tracks: list[tuple[int, int]], workers: int = 1) -> list[tuple[array, array, array, array]]:
+    """
+    Decodes every track chunk of `midi_file` (the spans from `read_header`) with `decode_track`, spreading the tracks
+    over `workers` processes (all CPUs if `0`)
+
+    Falls back to decoding in this process when there is only one worker, when called from a background thread (e.g.
+    `src.midi.prefetch_midi`), or when the process pool can't be started
+    """
+    workers = min(workers or os.cpu_count() or 1, len(tracks))
+
+    if workers <= 1 or not on_main_thread():
+        return _decode_tracks(midi_file, tracks)
+
+    # the largest tracks first, each to the least loaded worker
+    chunks = [[] for _ in range(workers)]
+    loads = [0] * workers
+
+    for i in sorted(range(len(tracks)), key=lambda i: tracks[i][0] - tracks[i][1]):
+        worker = loads.index(min(loads))
+        chunks[worker].append(i)
+        loads[worker] += tracks[i][1] - tracks[i][0]
+
+    try:
+        with detached_main(), ProcessPoolExecutor(workers, mp_context=get_context("spawn")) as pool:
+            futures = [pool.submit(_decode_tracks, midi_file, [tracks[i] for i in chunk]) for chunk in chunks]
+
+        decoded = [None] * len(tracks)
+
+        for chunk, future in zip(chunks, futures):
+            for i, arrays in zip(chunk, future.result()):
+                decoded[i] = arrays
+
+        return decoded
+    except (BrokenProcessPool, OSError):
+        return _decode_tracks(midi_file, tracks)
+
+def read_messages(midi_file: str, tempo_map: TempoMap | None = None, workers: int = 1, parallel_bytes: int = PARALLEL_DECODE_BYTES):
+    """
+    Yields `(time, channel, note, velocity)` for every note message of `midi_file` in playback order, with `time` in seconds
+    and a `velocity` of 0 marking the end of a note
+
+    The file is memory-mapped and its tracks are decoded lazily, merged by tick with `heapq.merge` (events on the same tick
+    keep their track order). Times come from a `TempoMap` built as the tempo changes are read, pass `tempo_map` to keep it
+
+    Files of at least `parallel_bytes` with several tracks are decoded up front instead, one track per task over
+    `workers` processes (see `decode_tracks`), before being merged the same way
+    """
+    tempo_map = tempo_map if tempo_map is not None else TempoMap()
+
+    with open(midi_file, "rb") as f:
+        size = f.seek(0, 2)
+
+        if not size:
+            raise ValueError("Not a MIDI file (empty file)")
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            midi_format, ticks_per_beat, tracks = read_header(data)
+
+            if midi_format == 2:
+                raise ValueError("Type 2 (asynchronous) MIDI files are not supported")
+
+            tempo_map.clear(ticks_per_beat)
+            seconds = tempo_map.seconds
+
+            if workers != 1 and len(tracks) > 1 and size >= parallel_bytes:
+                streams = [zip(*arrays) for arrays in decode_tracks(midi_file, tracks, workers)]
+            else:
+                streams = [read_track(data, start, end) for start, end in tracks]
+
+            for tick, channel, note, velocity in heapq.merge(*streams, key=lambda event: event[0]):
+                if channel == TEMPO:
+                    tempo_map.add(tick, note)
+                else:
+                    yield (seconds(tick), channel, note, velocity)
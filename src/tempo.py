@@ -0,0 +1,78 @@
+from bisect import bisect_right
+
+DEFAULT_TEMPO = 500000 # microseconds per beat (120 bpm)
+
+
+class TempoMap:
+    """
+    Converts MIDI ticks to seconds (and back) from the tempo changes of a song, in O(log n) per conversion
+
+    Each tempo segment keeps the microsecond-ticks elapsed before it as an exact integer, so a time is only rounded once
+    no matter how many tempo changes come before it
+
+    `ticks_per_beat`: the time division of the MIDI file
+    `changes`: `(tick, tempo)` pairs with the tempo in microseconds per beat, in tick order (120 bpm until the first change)
+
+    ## Example:
+
+    ```python
+    tempo_map = load_midi("track.mid").tempo_map
+    tempo_map.seconds(1920) # when the 5th beat (at 480 ticks per beat) plays
+    tempo_map.tick(10.0) # the tick playing 10 seconds in
+    ```
+    """
+    def __init__(self, ticks_per_beat: int = 480, changes=()):
+        self.clear(ticks_per_beat)
+
+        for tick, tempo in changes:
+            self.add(tick, tempo)
+
+    def clear(self, ticks_per_beat: int) -> None:
+        self.ticks_per_beat = ticks_per_beat
+        self._ticks = [0]
+        self._tempos = [DEFAULT_TEMPO]
+        self._elapsed = [0] # microsecond-ticks before each segment
+
+    def add(self, tick: int, tempo: int) -> None:
+        """
+        Changes the tempo from `tick` onwards, ticks must be added in order
+        """
+        last = self._ticks[-1]
+
+        if tick < last:
+            raise ValueError(f"Tempo change at tick {tick} is before the previous change at tick {last}")
+
+        if tick == last:
+            self._tempos[-1] = tempo
+            return
+
+        self._elapsed.append(self._elapsed[-1] + (tick - last) * self._tempos[-1])
+        self._ticks.append(tick)
+        self._tempos.append(tempo)
+
+    def changes(self) -> list[tuple[int, int]]:
+        return list(zip(self._ticks, self._tempos))
+
+    def _segment(self, tick: float) -> int:
+        # songs are mostly read front to back, so check the last segment before searching
+        if tick >= self._ticks[-1]:
+            return len(self._ticks) - 1
+
+        return max(bisect_right(self._ticks, tick) - 1, 0)
+
+    def tempo_at(self, tick: float) -> int:
+        return self._tempos[self._segment(tick)]
+
+    def seconds(self, tick: float) -> float:
+        i = self._segment(tick)
+
+        return (self._elapsed[i] + (tick - self._ticks[i]) * self._tempos[i]) / (1_000_000 * self.ticks_per_beat)
+
+    def tick(self, seconds: float) -> float:
+        """
+        Returns the (fractional) tick playing at `seconds`
+        """
+        target = seconds * 1_000_000 * self.ticks_per_beat
+        i = max(bisect_right(self._elapsed, target) - 1, 0)
+
+        return self._ticks[i] + (target - self._elapsed[i]) / self._tempos[i]
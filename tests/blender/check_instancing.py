@@ -0,0 +1,158 @@
+"""
+Builds Geometry Nodes instancers (see `src.bpy_instancing`) in an empty Blender scene and checks that every instance is
+posed like its object would be by its keys baked to F-Curves with `apply_plan`, then that removing the instancer puts the objects back
+
+Blender isn't available to pytest, so run this headless after changing the instancing node tree:
+
+```sh
+blender -b --factory-startup --python-exit-code 1 --python tests/blender/check_instancing.py
+```
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import bpy
+from mathutils import Euler, Matrix, Vector
+from src.bpy_instancing import ORIGINAL_COLLECTIONS, build_instancer, instancer_name, remove_instancer
+from src.generate import create_item, item_from_dict
+from src.instancing import INSTANCED_PROPERTIES, instance_order_key
+from src.keyframes import apply_plan, owner_fcurves
+from src.plan import axis_index
+
+MIDI_FILE = os.path.join(ROOT, "examples", "drum_set", "track.mid")
+NOTES = (35, 38, 40, 50, 56) # 40 isn't played, so its instance rests
+FRAMES = range(-10, 440, 3)
+TOLERANCE = 1e-4
+
+ITEMS = [
+    {"type": "hammer_composition", "object_prefix": "Move", "object_property": "location.z", "pullback_amount": 0.5, "channel": 10},
+    {"type": "hammer_composition", "object_prefix": "Turn", "object_property": "rotation_euler.x", "pullback_amount": 20, "channel": 10},
+    {"type": "effect_composition", "object_prefix": "Grow", "effect": "expand", "axis": "y", "pullback_amount": 0.3, "channel": 10},
+]
+
+
+def add_objects(prefix: str, collection) -> list:
+    objects = []
+
+    for i, note in enumerate(NOTES):
+        obj = bpy.data.objects.new(f"{prefix}{note}", bpy.data.meshes.new(f"{prefix}{note}"))
+        obj.location = (i * 2.0, 1.0, 0.5)
+        obj.rotation_euler = (0.3, -0.2, 0.4) # already turned, so only the X component matches a local rotation
+        obj.scale = (1.0, 1.5, 0.5)
+        collection.objects.link(obj)
+        objects.append(obj)
+
+    return objects
+
+def baked_curves(composition, fps: float) -> dict[str, object]:
+    """
+    Writes the keys of every instrument of `composition` with `apply_plan` to a stand-in object (so the instanced objects
+    stay unkeyed), returning the F-Curve of every object's name
+    """
+    curves = {}
+
+    for instrument in composition.instruments:
+        obj = instrument.object
+        root, index = axis_index(instrument.plan_args()["prop"])
+        baked = bpy.data.objects.new(f"{obj.name} Baked", None)
+        apply_plan(instrument.plan_keyframes(fps), {"object": baked})
+        curves[obj.name] = next((fcurve for fcurve in owner_fcurves(baked) if fcurve.data_path == root and fcurve.array_index == index), None)
+
+    return curves
+
+def expected_matrices(composition, curves: dict[str, object], frame: float) -> dict[str, Matrix]:
+    """
+    Returns the world matrix of every object of `composition` at `frame`, as its baked F-Curve would pose it
+    """
+    matrices = {}
+
+    for instrument in composition.instruments:
+        obj = instrument.object
+        root, index = axis_index(instrument.plan_args()["prop"])
+        pose = {prop: list(getattr(obj, prop)) for prop in INSTANCED_PROPERTIES}
+
+        if curves[obj.name] is not None:
+            pose[root][index] = curves[obj.name].evaluate(frame)
+
+        matrices[obj.name] = Matrix.LocRotScale(Vector(pose["location"]), Euler(pose["rotation_euler"], obj.rotation_mode), Vector(pose["scale"]))
+
+    return matrices
+
+def instance_matrices(scene, name: str) -> dict[str, Matrix]:
+    matrices = {}
+
+    for instance in bpy.context.evaluated_depsgraph_get().object_instances:
+        if instance.is_instance and instance.parent is not None and instance.parent.original.name == name:
+            matrices[instance.object.original.name] = instance.matrix_world.copy()
+
+    return matrices
+
+def check_item(scene, data: dict) -> list[str]:
+    errors = []
+    item = item_from_dict({**data, "use_instancing": True})
+    name = instancer_name(item.object_prefix)
+    collection = bpy.data.collections.new(f"{item.object_prefix} Objects")
+    scene.collection.children.link(collection)
+    objects = add_objects(item.object_prefix, collection)
+
+    composition = create_item(item, MIDI_FILE)
+    curves = baked_curves(composition, scene.render.fps)
+    build_instancer(composition, name, scene)
+    tree = bpy.data.node_groups[name]
+    print(f"{name}: {len(tree.nodes)} nodes, {len(tree.links)} links")
+
+    if bpy.data.objects.get("bmidi Handles") is not None:
+        errors.append(f"{name}: the object the handles were read from was left behind")
+
+    order = [obj.name for obj in bpy.data.collections[f"{name} Sources"].objects]
+    if order != sorted(order, key=instance_order_key):
+        errors.append(f"{name}: sources linked as {order}")
+
+    for frame in FRAMES:
+        scene.frame_set(frame)
+        expected = expected_matrices(composition, curves, frame)
+        actual = instance_matrices(scene, name)
+
+        if set(actual) != set(expected):
+            errors.append(f"{name} at frame {frame}: instances {sorted(actual)}, expected {sorted(expected)}")
+            break
+
+        for obj_name, matrix in expected.items():
+            difference = max(abs(a - b) for row, other in zip(matrix, actual[obj_name]) for a, b in zip(row, other))
+
+            if difference > TOLERANCE:
+                errors.append(f"{name} at frame {frame}: {obj_name} is off by {difference:.6f}")
+
+    remove_instancer(name, scene)
+
+    for obj in objects:
+        if list(obj.users_collection) != [collection] or ORIGINAL_COLLECTIONS in obj:
+            errors.append(f"{name}: {obj.name} was restored to {[other.name for other in obj.users_collection]}")
+
+    if bpy.data.objects.get(name) is not None or bpy.data.collections.get(f"{name} Sources") is not None:
+        errors.append(f"{name}: the instancer or its sources collection was left behind")
+
+    return errors
+
+def main() -> None:
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    scene = bpy.context.scene
+    scene.render.fps = 24
+    errors = []
+
+    for data in ITEMS:
+        errors.extend(check_item(scene, data))
+
+    for error in errors:
+        print(error)
+
+    if errors:
+        raise SystemExit(f"{len(errors)} instancing checks failed")
+
+    print(f"bmidi: instancing matches the keys for {len(ITEMS)} items over {len(FRAMES)} frames")
+
+main()
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.events import EventTable
+from src.midi import load_midi
+from src.scene import MemoryScene
+
+DRUM_MIDI = os.path.join(ROOT, "examples", "drum_set", "track.mid")
+PIANO_MIDI = os.path.join(ROOT, "examples", "piano", "track.mid")
+DRUM_NOTES = (35, 38, 50, 56) # played on channel 10
+
+
+@pytest.fixture
+def drum_events() -> EventTable:
+    return load_midi(DRUM_MIDI).note_events()
+
+@pytest.fixture
+def piano_events() -> EventTable:
+    return load_midi(PIANO_MIDI).note_events()
+
+@pytest.fixture
+def drum_scene() -> MemoryScene:
+    """
+    An in-memory scene with a `Key<note>` and a `Pad<note>` object for every note of the drum example
+    """
+    scene = MemoryScene(fps=24)
+
+    for note in DRUM_NOTES:
+        scene.add_object(f"Key{note}", rotation_euler=(0.1, 0.0, 0.0))
+        scene.add_object(f"Pad{note}", location=(note, 0.0, 1.0))
+
+    return scene
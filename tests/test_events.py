@@ -0,0 +1,49 @@
+import random
+
+from src.events import EventTable, IntervalIndex
+
+
+def random_intervals(count: int, seed: int) -> tuple[list[float], list[float]]:
+    rng = random.Random(seed)
+    starts = [rng.choice((rng.uniform(0, 50), float(rng.randint(0, 50)))) for _ in range(count)]
+    ends = [start + rng.choice((0.0, rng.uniform(0, 5), float(rng.randint(0, 3)))) for start in starts]
+
+    return starts, ends
+
+def test_stabbing_queries_match_brute_force():
+    for seed in range(20):
+        starts, ends = random_intervals(300, seed)
+        index = IntervalIndex(starts, ends)
+
+        for time in [random.Random(seed).uniform(-1, 56) for _ in range(50)] + list(range(0, 56)):
+            expected = [i for i in range(len(starts)) if starts[i] <= time < ends[i]]
+            assert index.at(time) == expected, (seed, time)
+
+def test_range_queries_match_brute_force():
+    for seed in range(20):
+        starts, ends = random_intervals(300, seed)
+        index = IntervalIndex(starts, ends)
+        rng = random.Random(seed)
+
+        for _ in range(50):
+            start = rng.choice((rng.uniform(-1, 56), float(rng.randint(0, 55))))
+            end = start + rng.choice((0.0, rng.uniform(0, 10)))
+            expected = [i for i in range(len(starts)) if starts[i] <= end and ends[i] >= start]
+            assert index.overlapping(start, end) == expected, (seed, start, end)
+
+def test_empty_index():
+    index = IntervalIndex([], [])
+
+    assert index.at(1.0) == []
+    assert index.overlapping(0.0, 10.0) == []
+
+def test_event_table_index_is_rebuilt_after_appends():
+    events = EventTable()
+    events.append(60, 0, 1.0, 2.0, 1.0)
+
+    assert len(events.active(1.5)) == 1
+
+    events.append(62, 0, 1.2, 0.5, 1.0)
+
+    assert [event["note"] for event in events.active(1.5)] == [60, 62]
+    assert [event["note"] for event in events.window(3.0, 4.0)] == [60]
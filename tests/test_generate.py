@@ -0,0 +1,130 @@
+from conftest import DRUM_MIDI, DRUM_NOTES
+from src.generate import Generation, generate_items, item_from_dict
+from src.live import LivePlayer
+from src.plan_cache import PlanCache
+
+FPS = 24
+
+
+def drum_items():
+    return [
+        item_from_dict({"object_prefix": "Key", "object_property": "rotation_euler.x", "pullback_amount": 20, "channel": 10}),
+        item_from_dict({"type": "movement_composition", "object_prefix": "Pad", "object_property": "location.z", "pullback_amount": -0.2, "channel": 10}),
+    ]
+
+def scene_keys(scene) -> dict:
+    return {
+        (name, data_path, index): scene.keys(obj, data_path, index)
+        for name, obj in scene.objects.items()
+        for data_path in ("location", "rotation_euler")
+        for index in range(3)
+    }
+
+def test_items_are_keyed_through_the_memory_scene(drum_scene):
+    items = drum_items()
+    timings = generate_items(items, DRUM_MIDI, FPS, scene=drum_scene)
+
+    assert [timing["instruments"] for timing in timings] == [len(DRUM_NOTES), len(DRUM_NOTES)]
+    assert all(item.fingerprint for item in items)
+    assert drum_scene.keys(drum_scene.get_object("Key38"), "rotation_euler", 0)
+    assert drum_scene.keys(drum_scene.get_object("Pad38"), "location", 2)
+    assert not drum_scene.keys(drum_scene.get_object("Pad38"), "location", 0) # only the keyed component
+
+def test_unchanged_items_are_skipped(drum_scene):
+    items = drum_items()
+    generate_items(items, DRUM_MIDI, FPS, scene=drum_scene)
+    keys = scene_keys(drum_scene)
+
+    assert [timing["skipped"] for timing in generate_items(items, DRUM_MIDI, FPS, scene=drum_scene)] == [True, True]
+
+    items[1].pullback_amount = -0.3
+
+    assert [timing["skipped"] for timing in generate_items(items, DRUM_MIDI, FPS, scene=drum_scene)] == [True, False]
+    assert scene_keys(drum_scene) != keys
+    assert [timing["skipped"] for timing in generate_items(items, DRUM_MIDI, FPS, scene=drum_scene, force=True)] == [False, False]
+
+def test_cancelling_resets_the_fingerprints_of_unfinished_items(drum_scene):
+    items = drum_items()
+    generate_items(items, DRUM_MIDI, FPS, scene=drum_scene)
+    steps = Generation(items, DRUM_MIDI, FPS, scene=drum_scene, force=True).steps()
+
+    # the first progress comes before any work, then one per instrument: stop after the second item's first instrument
+    for _ in range(len(DRUM_NOTES) + 2):
+        next(steps)
+
+    steps.close()
+
+    assert items[0].fingerprint
+    assert items[1].fingerprint == "" # its objects were cleared, but only one of them was keyed again
+
+    timings = generate_items(items, DRUM_MIDI, FPS, scene=drum_scene)
+
+    assert [timing["skipped"] for timing in timings] == [True, False]
+
+def test_windows_only_replace_their_keys(drum_scene):
+    items = drum_items()
+    generate_items(items, DRUM_MIDI, FPS, scene=drum_scene)
+    full = scene_keys(drum_scene)
+
+    items[0].pullback_amount = 40
+    generate_items(items, DRUM_MIDI, FPS, scene=drum_scene, window=(100, 200))
+
+    assert items[0].fingerprint == "" # its keys outside the window are stale
+
+    for channel, keys in scene_keys(drum_scene).items():
+        outside = [(frame, value) for frame, value in keys if not 100 <= frame <= 200]
+        assert outside == [(frame, value) for frame, value in full[channel] if not 100 <= frame <= 200]
+
+def test_cached_plans_give_the_same_keys(drum_scene, tmp_path):
+    cache = PlanCache(str(tmp_path))
+    generate_items(drum_items(), DRUM_MIDI, FPS, scene=drum_scene, cache=cache)
+    keys = scene_keys(drum_scene)
+
+    timings = generate_items(drum_items(), DRUM_MIDI, FPS, scene=drum_scene, cache=cache)
+
+    assert [timing["cached"] for timing in timings] == [True, True]
+    assert scene_keys(drum_scene) == keys
+
+def test_objects_of_unplayed_notes_get_no_keys(drum_scene):
+    unplayed = drum_scene.add_object("Key40", rotation_euler=(0.1, 0.0, 0.0))
+    timings = generate_items(drum_items(), DRUM_MIDI, FPS, scene=drum_scene)
+
+    assert timings[0]["instruments"] == len(DRUM_NOTES) + 1
+    assert not drum_scene.keys(unplayed, "rotation_euler", 0)
+    assert drum_scene.keys(drum_scene.get_object("Key38"), "rotation_euler", 0)
+
+def test_live_preview_mutes_and_restores_the_keys(drum_scene):
+    items = drum_items()
+    generate_items(items, DRUM_MIDI, FPS, scene=drum_scene)
+    keys = scene_keys(drum_scene)
+    fingerprints = [item.fingerprint for item in items]
+
+    player = LivePlayer()
+    generate_items(items, DRUM_MIDI, FPS, scene=drum_scene, player=player)
+
+    assert drum_scene.key_count() == 0
+    assert [item.fingerprint for item in items] == fingerprints
+
+    hammer = drum_scene.get_object("Key38")
+    frames, values = zip(*keys[("Key38", "rotation_euler", 0)])
+    player.evaluate(frames[1])
+
+    assert hammer.rotation_euler.x == values[1]
+
+    player.restore()
+
+    assert scene_keys(drum_scene) == keys
+    assert hammer.rotation_euler.x == 0.1
+
+def test_controllers_key_their_objects(drum_scene):
+    arm, slider = drum_scene.add_object("Arm"), drum_scene.add_object("Slider")
+    items = [
+        item_from_dict({"type": "robotic_controller", "object_prefix": "Arm", "robot_target_object_name": "Pad", "pullback_amount": 0.2, "axis": "z", "channel": 10}),
+        item_from_dict({"type": "position_controller", "object_prefix": "Slider", "object_property": "location.x", "pullback_amount": -1, "overshoot_amount": 1, "channel": 10}),
+    ]
+    timings = generate_items(items, DRUM_MIDI, FPS, scene=drum_scene)
+
+    assert [timing["instruments"] for timing in timings] == [1, 1]
+    assert all(drum_scene.keys(arm, "location", index) for index in range(3))
+    assert drum_scene.keys(slider, "location", 0)
+    assert drum_scene.key_count() == sum(timing["keys"] for timing in timings)
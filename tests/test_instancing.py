@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from src.instancing import InstanceSegments
+from src.live import sample_keys
+from src.plan import KeyPlan
+
+
+def keyed(frames: list[float], values: list[float], root: str = "location", index: int = 2) -> KeyPlan:
+    plan = KeyPlan()
+    plan.add("object", root, index, frames, values)
+
+    return plan
+
+def random_keys(seed: int, count: int = 20) -> tuple[list[float], list[float]]:
+    rng = random.Random(seed)
+    frames = [0.0]
+
+    for _ in range(count - 1):
+        frames.append(frames[-1] + rng.choice((1.0, rng.uniform(1, 30))))
+
+    return frames, [rng.uniform(0.5, 2.0) for _ in frames]
+
+def bezier(p0: float, p1: float, p2: float, p3: float, t: float) -> float:
+    return (1 - t) ** 3 * p0 + 3 * (1 - t) ** 2 * t * p1 + 3 * (1 - t) * t * t * p2 + t ** 3 * p3
+
+def test_flat_handles_ease_like_the_live_keys():
+    frames, values = random_keys(0)
+    segments = InstanceSegments("location", 2)
+    segments.add(keyed(frames, values), 1.0)
+
+    for frame in [frames[0] - 5] + [frame + fraction for frame in frames for fraction in (0.0, 0.25, 0.5)]:
+        assert segments.offset_at(0, frame) == pytest.approx(sample_keys(frames, values, frame) - 1.0, abs=1e-9), frame
+
+@pytest.mark.parametrize("root, base", [("location", 1.0), ("scale", 2.0)])
+def test_segments_follow_the_bezier_curves_of_their_handles(root: str, base: float):
+    for seed in range(10):
+        rng = random.Random(seed)
+        frames, values = random_keys(seed)
+        left, right = [], []
+
+        # handles reaching unevenly into their segments, so the frame isn't linear in the curve parameter
+        for i, (frame, value) in enumerate(zip(frames, values)):
+            before = frame - frames[i - 1] if i else 1.0
+            after = frames[i + 1] - frame if i + 1 < len(frames) else 1.0
+            slope = rng.uniform(-0.2, 0.2)
+            left += [frame - rng.uniform(0.2, 0.45) * before, value - slope * before]
+            right += [frame + rng.uniform(0.2, 0.45) * after, value + slope * after]
+
+        segments = InstanceSegments(root, 0)
+        segments.add(keyed(frames, values, root, 0), base, (left, right))
+
+        for i in range(len(frames) - 1):
+            for t in (0.0, 0.1, 0.3, 0.5, 0.7, 0.9):
+                frame = bezier(frames[i], right[2 * i], left[2 * i + 2], frames[i + 1], t)
+                value = bezier(values[i], right[2 * i + 1], left[2 * i + 3], values[i + 1], t)
+                expected = value / base if root == "scale" else value - base
+
+                assert segments.offset_at(0, frame) == pytest.approx(expected, abs=1e-4), (seed, i, t)
+
+        assert segments.offset_at(0, frames[0] - 10) == pytest.approx(values[0] / base if root == "scale" else values[0] - base)
+        assert segments.offset_at(0, frames[-1] + 10) == pytest.approx(values[-1] / base if root == "scale" else values[-1] - base)
+
+def test_instances_without_keys_rest():
+    segments = InstanceSegments("scale", 1)
+    segments.add(KeyPlan(), 2.0)
+    segments.add(keyed([10.0, 20.0], [2.0, 4.0], "scale", 1), 2.0)
+
+    assert list(segments.first) == [0, 1]
+    assert segments.offset_at(0, 15.0) == 1.0
+    assert segments.offset_at(1, 20.0) == 2.0
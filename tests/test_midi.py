@@ -0,0 +1,22 @@
+from conftest import DRUM_MIDI
+from src.midi import clear_midi_cache, load_midi
+from src.profiling import Profiler
+
+
+def test_profilers_get_the_decode_phases_of_cached_files():
+    clear_midi_cache()
+    data = load_midi(DRUM_MIDI)
+
+    assert list(data.phases) == ["decode"]
+
+    profiler = Profiler()
+    assert load_midi(DRUM_MIDI, profiler) is data
+    assert profiler.midi == {"cached": True, "phases": data.phases}
+    assert "parse" not in profiler.phases
+
+    clear_midi_cache()
+    profiler = Profiler()
+    data = load_midi(DRUM_MIDI, profiler)
+
+    assert profiler.midi == {"cached": False, "phases": data.phases}
+    assert list(data.phases) == ["parse", "pair"] and list(profiler.phases) == ["parse", "pair"]
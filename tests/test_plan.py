@@ -0,0 +1,148 @@
+import random
+
+import pytest
+
+import src.plan
+from src.events import EventTable
+from src.live import sample_keys
+from src.plan import PLANNERS, build_plan, decimate_keys
+
+FPS = 24
+
+
+def planner_args(planner: str, events: EventTable) -> dict:
+    return {
+        "hammer": {"prop": "rotation_euler.x", "base": 0.1, "pullback": 0.6, "overshoot": 0.05},
+        "movement": {"prop": "location.z", "base": 1.0, "final": -0.1},
+        "light": {"target": "data", "data_path": "energy", "initial": 10.0, "final": 1000.0, "fade_effect": True},
+        "effect": {"effect": "bounce", "prop": "location.z", "base": 0.0, "amount": 0.1},
+        "positional": {"prop": "location.x", "min_position": -1.0, "max_position": 1.0},
+        "robotic": {"base": (0.0, 0.0, 0.0), "targets": {note: (note, 0.5, 0.0) for note in set(events.note)}, "pullback": 0.2, "axis": "z"},
+    }[planner]
+
+def spaced_events(count: int = 200, seed: int = 0) -> EventTable:
+    # notes far enough apart that their envelopes never overlap
+    rng = random.Random(seed)
+    events = EventTable()
+    time = 1.0
+
+    for _ in range(count):
+        duration = rng.uniform(0.05, 0.5)
+        events.append(rng.randint(30, 90), 0, time, duration, rng.uniform(0.1, 1.0))
+        time += duration + rng.uniform(0.6, 1.0)
+
+    return events
+
+def baseline_keys(events: EventTable, envelope) -> list[tuple[float, float]]:
+    # the keys as the original instruments inserted them, one event at a time, a later key replacing one on the same frame
+    keys = {}
+
+    for i in range(len(events)):
+        for frame, value in envelope(events[i]):
+            keys[frame] = value
+
+    return sorted(keys.items())
+
+def baseline_hammer(e, base=0.1, pullback=0.6, overshoot=0.05):
+    start = e["start"] * FPS
+    duration = 0.08 * FPS
+    velocity_scale = 1 + (1 - e["velocity"]) * 1.5
+
+    return [
+        (start - (duration * velocity_scale), base),
+        (start - duration, base + pullback),
+        (start, base + overshoot),
+        (start + duration, base - (overshoot * 0.75)),
+        (start + (duration * velocity_scale), base),
+    ]
+
+def baseline_movement(e, base=1.0, final=-0.1):
+    start = e["start"] * FPS
+    end = (e["start"] + e["duration"]) * FPS
+    velocity_scale = 1 + (1 - e["velocity"]) * 1.5
+
+    return [(start - velocity_scale, base), (start, base + final), (end, base + final), (end + velocity_scale, base)]
+
+def baseline_light(e, initial=10.0, final=1000.0):
+    # with the fade effect, so without the hold key
+    start = e["start"] * FPS
+    end = (e["start"] + e["duration"]) * FPS
+    velocity_scale = 1 + (1 - e["velocity"]) * 1.5
+
+    return [(start - velocity_scale, initial), (start, initial + final), (end + velocity_scale, initial)]
+
+# the channel keyed by each planner with `planner_args`
+CHANNELS = {
+    "hammer": ("object", "rotation_euler", 0),
+    "movement": ("object", "location", 2),
+    "light": ("data", "energy", 0),
+}
+
+@pytest.mark.parametrize("planner, envelope", [
+    ("hammer", baseline_hammer),
+    ("movement", baseline_movement),
+    ("light", baseline_light),
+])
+def test_envelopes_match_the_baseline(planner, envelope):
+    events = spaced_events()
+    frames, values = build_plan(planner, events, FPS, planner_args(planner, events)).channels[CHANNELS[planner]]
+    expected = baseline_keys(events, envelope)
+
+    # decimation only drops keys the curve passes through anyway
+    baseline = {round(frame, 6): value for frame, value in expected}
+    for frame, value in zip(frames, values):
+        assert baseline[round(frame, 6)] == pytest.approx(value)
+
+    for frame, value in expected:
+        assert sample_keys(frames, values, frame) == pytest.approx(value)
+
+@pytest.mark.parametrize("planner", sorted(PLANNERS))
+def test_numpy_and_pure_python_plans_match(planner, piano_events, monkeypatch):
+    pytest.importorskip("numpy")
+    args = planner_args(planner, piano_events)
+    with_numpy = build_plan(planner, piano_events, FPS, args)
+
+    monkeypatch.setattr(src.plan, "np", None)
+    without_numpy = build_plan(planner, piano_events, FPS, args)
+
+    assert with_numpy.channels.keys() == without_numpy.channels.keys()
+    for key, (frames, values) in with_numpy.channels.items():
+        assert list(frames) == pytest.approx(list(without_numpy.channels[key][0]))
+        assert list(values) == pytest.approx(list(without_numpy.channels[key][1]))
+
+@pytest.mark.parametrize("planner", sorted(PLANNERS))
+def test_windowed_plans_match_the_cropped_full_plan(planner, drum_events):
+    args = planner_args(planner, drum_events)
+    full = build_plan(planner, drum_events, FPS, args)
+    rng = random.Random(1)
+    # the first two used to give the controllers rest keys at the window's edges
+    windows = [(39, 79), (32, 72)] + [(start, start + rng.randint(1, 120)) for start in rng.sample(range(-20, 420), 20)]
+
+    for window in windows:
+        windowed = build_plan(planner, drum_events, FPS, args, window)
+        cropped = full.crop(*window)
+
+        assert windowed.channels.keys() == cropped.channels.keys(), window
+        for key, (frames, values) in cropped.channels.items():
+            assert list(windowed.channels[key][0]) == list(frames), window
+            assert list(windowed.channels[key][1]) == list(values), window
+
+def test_decimate_keeps_the_last_key_of_a_frame_and_drops_flat_runs():
+    frames, values = decimate_keys([4, 0, 1, 2, 3, 4, 5, 6], [9, 0, 0, 0, 2, 1, 1, 1])
+
+    assert list(frames) == [0, 2, 3, 4, 6]
+    assert list(values) == [0, 0, 2, 1, 1]
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_decimate_keeps_empty_channels_empty(numpy, monkeypatch):
+    if not numpy:
+        monkeypatch.setattr(src.plan, "np", None)
+
+    frames, values = decimate_keys([], [])
+
+    assert list(frames) == [] and list(values) == []
+
+def test_windows_without_events_give_empty_plans(drum_events):
+    plan = build_plan("hammer", drum_events, FPS, planner_args("hammer", drum_events), (100000, 100100))
+
+    assert plan.key_count() == 0
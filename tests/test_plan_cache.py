@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from src.plan import KeyPlan
+from src.plan_cache import PlanCache, pack_plans, plan_cache_key, unpack_plans
+
+
+def sample_plans() -> list[KeyPlan]:
+    first = KeyPlan()
+    first.add("object", "rotation_euler", 0, [0.0, 1.5, 3.25], [0.1, 0.7, 0.1])
+    first.add("data", "energy", 0, [10.0], [1000.0])
+
+    second = KeyPlan()
+    second.add("object", "location", 2, [], [])
+
+    return [first, second, KeyPlan()]
+
+def assert_same_plans(actual: list[KeyPlan], expected: list[KeyPlan]) -> None:
+    assert len(actual) == len(expected)
+
+    for plan, other in zip(actual, expected):
+        assert plan.channels.keys() == other.channels.keys()
+
+        for key, (frames, values) in other.channels.items():
+            assert list(plan.channels[key][0]) == list(frames)
+            assert list(plan.channels[key][1]) == list(values)
+
+def test_pack_round_trip():
+    assert_same_plans(unpack_plans(pack_plans(sample_plans())), sample_plans())
+
+def test_unpack_rejects_other_data():
+    with pytest.raises(ValueError):
+        unpack_plans(b"BM")
+
+    with pytest.raises(ValueError):
+        unpack_plans(b"XXXX" + pack_plans(sample_plans())[4:])
+
+    with pytest.raises(ValueError):
+        unpack_plans(pack_plans(sample_plans())[:-4])
+
+def test_cache_round_trip(tmp_path):
+    cache = PlanCache(str(tmp_path / "cache"))
+    key = plan_cache_key("fingerprint")
+
+    assert cache.get(key) is None
+
+    cache.put(key, sample_plans())
+
+    assert_same_plans(cache.get(key), sample_plans())
+    assert plan_cache_key("fingerprint", (0, 100)) != key
+
+def test_corrupt_entries_are_removed(tmp_path):
+    cache = PlanCache(str(tmp_path))
+    key = plan_cache_key("fingerprint")
+    cache.put(key, sample_plans())
+
+    with open(cache.path(key), "r+b") as f:
+        f.write(b"XXXX")
+
+    assert cache.get(key) is None
+    assert not os.path.exists(cache.path(key))
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    entry = len(pack_plans(sample_plans()))
+    cache = PlanCache(str(tmp_path), max_bytes=entry * 2)
+
+    for i, key in enumerate(("a", "b")):
+        cache.put(key, sample_plans())
+        os.utime(cache.path(key), ns=(i * 10**9, i * 10**9))
+
+    cache.get("a") # now the most recently used
+    cache.put("c", sample_plans())
+
+    assert sorted(entry.name for entry in cache.entries()) == ["a.bmkp", "c.bmkp"]
+    assert cache.size() <= cache.max_bytes
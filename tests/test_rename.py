@@ -0,0 +1,42 @@
+import random
+
+from src.rename import apply_renames, order_objects, plan_renames, rename_conflicts
+from src.scene import MemoryObject
+
+
+def test_conflicts_with_objects_outside_the_batch():
+    key, other = MemoryObject("Cube"), MemoryObject("Key60")
+    renames = plan_renames([key], "Key", [60], "none")
+
+    assert rename_conflicts(renames, [key.name, other.name]) == ["Key60"]
+
+def test_names_held_inside_the_batch_are_not_conflicts():
+    # the objects swap names, which the two phases of `apply_renames` allow
+    first, second = MemoryObject("Key61"), MemoryObject("Key60")
+    renames = plan_renames([first, second], "Key", [60, 61], "none")
+
+    assert rename_conflicts(renames, [first.name, second.name]) == []
+    assert apply_renames(renames) == 2
+    assert (first.name, second.name) == ("Key60", "Key61")
+
+def test_names_given_out_twice_are_conflicts():
+    objects = [MemoryObject("A"), MemoryObject("B")]
+
+    assert rename_conflicts([(objects[0], "Key60"), (objects[1], "Key60")], ["A", "B"]) == ["Key60"]
+
+def test_shuffled_objects_get_their_notes_along_the_axis():
+    objects = [MemoryObject(f"Key{note}", location=(note, 0, 0)) for note in range(200)]
+    random.Random(0).shuffle(objects)
+    renames = plan_renames(objects, "Key", list(range(200)), "axis_projection", (-1.0, 0.0, 0.0))
+
+    assert rename_conflicts(renames, [obj.name for obj in objects]) == []
+
+    apply_renames(renames)
+
+    assert all(obj.name == f"Key{199 - int(obj.location.x)}" for obj in objects)
+
+def test_objects_are_ordered_along_the_axis():
+    objects = [MemoryObject(name, location=location) for name, location in (("a", (0, 3, 0)), ("b", (0, 1, 0)), ("c", (0, 2, 0)))]
+
+    assert [obj.name for obj in order_objects(objects, "axis_projection", (0.0, 1.0, 0.0))] == ["b", "c", "a"]
+    assert [obj.name for obj in order_objects(objects, "axis_projection", (0.0, -1.0, 0.0))] == ["a", "c", "b"]
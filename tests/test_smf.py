@@ -0,0 +1,25 @@
+import pytest
+
+from src.smf import TEMPO, read_track
+
+
+def test_running_status_continues_channel_messages():
+    data = bytes([0, 0x90, 60, 100, 10, 61, 100, 0, 0x80, 60, 0, 0, 61, 0])
+
+    assert list(read_track(data, 0, len(data))) == [(0, 0, 60, 100), (10, 0, 61, 100), (10, 0, 60, 0), (10, 0, 61, 0)]
+
+def test_meta_events_keep_running_status():
+    data = bytes([0, 0x91, 60, 100, 0, 0xFF, 0x51, 3, 0x07, 0xA1, 0x20, 0, 61, 100])
+
+    assert list(read_track(data, 0, len(data))) == [(0, 1, 60, 100), (0, TEMPO, 500000, 0), (0, 1, 61, 100)]
+
+@pytest.mark.parametrize("message", [
+    [0xF0, 2, 0x7E, 0xF7], # sysex
+    [0xF7, 1, 0x00], # sysex escape
+    [0xF2, 0, 0], # song position, a system common message
+])
+def test_sysex_and_system_messages_cancel_running_status(message):
+    data = bytes([0, 0x90, 60, 100, 0, *message, 0, 61, 100])
+
+    with pytest.raises(ValueError, match="Running status"):
+        list(read_track(data, 0, len(data)))